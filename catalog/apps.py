@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        # تسجيل الـ receivers الخاصة بمسح كاش شرائح الأسعار
+        import catalog.signals  # noqa: F401
@@ -0,0 +1,60 @@
+# catalog/cache.py
+"""
+رقم إصدار الكتالوج (catalog version).
+
+أي تعديل في Category / SubCategory / Product / QuantityPrice بيزود الرقم (catalog/signals.py)،
+وأي حاجة متخزنة في الكاش ومفتاحها فيه الرقم ده بتبقى قديمة تلقائياً من غير ما نمسحها.
+الرقم نفسه في الـ DB (CatalogVersion، صف واحد) مش في الـ Django cache: الـ UPDATE بيحصل في نفس
+transaction الكتابة، فـ workers تانية و import_catalog و build_catalog_snapshot بيشوفوا نفس الرقم
+حتى مع LocMemCache (اللي كل process ليه نسخة منه).
+
+جوه الـ request الرقم بيتقرا مرة واحدة (ETag + كاش الـ response + الشجرة بيشوفوا نفس الإصدار)؛
+برة الـ requests (أوامر manage.py) كل نداء بيقرا من الـ DB.
+"""
+import threading
+
+from django.core.signals import request_finished, request_started
+from django.db.models import F
+
+from .models import CatalogVersion
+
+_request = threading.local()
+
+
+def _start_request(**kwargs):
+    _request.active, _request.version = True, None
+
+
+def _finish_request(**kwargs):
+    _request.active, _request.version = False, None
+
+
+request_started.connect(_start_request, dispatch_uid='catalog_version_request_started')
+request_finished.connect(_finish_request, dispatch_uid='catalog_version_request_finished')
+
+
+def _read_version():
+    # query واحدة على الـ pk
+    return CatalogVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def get_catalog_version():
+    if not getattr(_request, 'active', False):
+        return _read_version()
+    if _request.version is None:
+        _request.version = _read_version()
+    return _request.version
+
+
+def bump_catalog_version():
+    if not CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        # الصف اتمسح (flush في الـ tests مثلاً)
+        CatalogVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+    version = _read_version()
+    if getattr(_request, 'active', False):
+        _request.version = version
+    return version
+
+
+def versioned_key(*parts):
+    return ':'.join(['catalog', f'v{get_catalog_version()}', *map(str, parts)])
@@ -0,0 +1,113 @@
+# catalog/changes.py
+"""
+Delta feed للكتالوج: /api/catalog/changes/?since=<seq>.
+
+كل تعديل في منتج أو شرائحه بيضيف سطر CatalogChange (seq, product_id):
+- save()/delete() عن طريق catalog/signals.py
+- العمليات الجماعية (import_catalog، خصم المخزون في orders.fulfilment) بتنادي record_changes بنفسها.
+الـ feed بيرجع الحالة الحالية لكل منتج اتغير بعد since (مرة واحدة في الصفحة حتى لو اتغير كذا مرة)،
+والمنتج المحذوف أو غير النشط بيرجع tombstone {"deleted": true}.
+
+السجل بيتمسح بعد CATALOG_CHANGES_RETENTION_DAYS (prune_changes / manage.py prune_catalog_changes).
+الـ watermark (CatalogVersion.changes_pruned_through) بيتكتب قبل المسح، و since أقدم منه بيرمي CursorTooOld:
+العميل ياخد latest من الرد، يعمل sync كامل من /api/products/export.ndjson، ويكمل من latest.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import CatalogChange, CatalogVersion, Product
+from .serializers import ProductDetailSerializer
+from .snapshot import expire_snapshot_check
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+
+class CursorTooOld(Exception):
+    def __init__(self, since, pruned_through):
+        self.since = since
+        self.pruned_through = pruned_through
+        super().__init__(f"changes up to seq {pruned_through} were pruned (since={since})")
+
+
+def retention():
+    return timedelta(days=getattr(settings, 'CATALOG_CHANGES_RETENTION_DAYS', 30))
+
+
+def record_changes(product_ids):
+    CatalogChange.objects.bulk_create(
+        [CatalogChange(product_id=pid) for pid in product_ids if pid is not None], batch_size=500)
+    # الـ snapshot المفتوح في الـ process ده بقى قديم؛ الـ processes التانية بتعرف في خلال CATALOG_SNAPSHOT_CHECK_MS
+    expire_snapshot_check()
+
+
+def latest_seq():
+    return CatalogChange.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+
+
+def pruned_through():
+    return CatalogVersion.objects.filter(pk=1).values_list('changes_pruned_through', flat=True).first() or 0
+
+
+def prune_changes(now=None, batch_size=500):
+    """
+    يمسح سطور السجل الأقدم من retention() على دفعات ويرجع العدد. آخر سطر بيفضل دايماً علشان latest_seq.
+    """
+    cutoff = (now or timezone.now()) - retention()
+    # seq و created_at بيزيدوا مع بعض: آخر سطر قديم من الـ pk index من غير scan للجدول كله
+    boundary = (CatalogChange.objects.filter(created_at__lte=cutoff).order_by('-seq')
+                .values_list('seq', flat=True).first())
+    if boundary is None:
+        return 0
+    boundary = min(boundary, latest_seq() - 1)
+    if boundary <= 0:
+        return 0
+    # الـ watermark الأول: cursor قديم بياخد resync حتى لو المسح لسه ما خلصش
+    if not CatalogVersion.objects.filter(pk=1).update(
+            changes_pruned_through=Greatest(F('changes_pruned_through'), Value(boundary))):
+        CatalogVersion.objects.get_or_create(pk=1, defaults={'changes_pruned_through': boundary})
+    total = 0
+    while True:
+        seqs = list(CatalogChange.objects.filter(seq__lte=boundary).order_by('seq')
+                    .values_list('seq', flat=True)[:batch_size])
+        if not seqs:
+            return total
+        # مفيش FK ولا signals على CatalogChange، فـ delete() هنا DELETE واحد من غير collector
+        total += CatalogChange.objects.filter(seq__in=seqs).delete()[0]
+
+
+def changes_since(since, limit=DEFAULT_LIMIT):
+    """
+    يرجع (entries, next_since, has_more). next_since هو آخر seq اتقرا، والعميل يبعته في الطلب الجاي.
+    لو السجل اتمسح بعد since بيرمي CursorTooOld.
+    """
+    oldest = pruned_through()
+    if since < oldest:
+        raise CursorTooOld(since, oldest)
+    rows = list(CatalogChange.objects.filter(seq__gt=since).order_by('seq')
+                .values_list('seq', 'product_id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], since, False
+
+    # آخر seq لكل منتج جوه الصفحة
+    last_seq = {}
+    for seq, pid in rows:
+        last_seq[pid] = seq
+    products = {
+        p.pk: p for p in Product.objects.filter(pk__in=last_seq, active=True).prefetch_related('quantity_prices')
+    }
+    entries = []
+    for pid, seq in sorted(last_seq.items(), key=lambda item: item[1]):
+        product = products.get(pid)
+        if product is None:
+            entries.append({'seq': seq, 'id': pid, 'deleted': True})
+        else:
+            entries.append({'seq': seq, 'id': pid, 'deleted': False,
+                            'product': ProductDetailSerializer(product).data})
+    return entries, rows[-1][0], has_more
@@ -0,0 +1,108 @@
+# catalog/conditional.py
+"""
+Conditional GET (ETag / Last-Modified) لـ endpoints الكتالوج.
+
+- القوائم: الـ ETag مبني على catalog version + الـ URL بالـ query params + نوع الـ renderer،
+  فالتحقق من If-None-Match بيتم من غير أي query ولا serializer.
+- منتج واحد: الـ ETag و Last-Modified من Product.updated_at (query صغيرة على الـ pk
+  قبل get_object والـ serializer). مع ?expand= الـ response فيه بيانات من جداول تانية،
+  فالـ ETag بياخد catalog version كمان ومن غير Last-Modified.
+"""
+import hashlib
+from calendar import timegm
+
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import get_catalog_version
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def _strip_weak(tag):
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    tags = parse_etags(header)
+    # If-None-Match بيستخدم weak comparison
+    return '*' in tags or _strip_weak(etag) in {_strip_weak(t) for t in tags}
+
+
+def not_modified_since(request, last_modified):
+    # If-Modified-Since بيتجاهل لو فيه If-None-Match (RFC 9110)
+    if last_modified is None or request.headers.get('If-None-Match'):
+        return False
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+    return since is not None and int(timegm(last_modified.utctimetuple())) <= since
+
+
+def not_modified(etag, last_modified=None):
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(timegm(last_modified.utctimetuple()))
+    return response
+
+
+def _renderer_format(request):
+    renderer = getattr(request, 'accepted_renderer', None)
+    return getattr(renderer, 'format', '')
+
+
+class CatalogListETagMixin:
+    """
+    لـ list(): ETag من catalog version، و 304 قبل تشغيل الـ queryset.
+    """
+
+    def list_etag(self, request):
+        return make_etag('list', get_catalog_version(), request.get_full_path(), _renderer_format(request))
+
+    def list(self, request, *args, **kwargs):
+        etag = self.list_etag(request)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_validators(response, etag)
+        return response
+
+
+class ProductETagRetrieveMixin:
+    """
+    لـ retrieve(): ETag و Last-Modified من updated_at الخاص بالمنتج.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        stamp = (self.get_queryset()
+                 .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+                 .values_list('pk', 'updated_at').first())
+        if stamp is None:
+            # خليه يرجع 404 بالطريقة العادية
+            return super().retrieve(request, *args, **kwargs)
+
+        pk, updated_at = stamp
+        parts = ['product', pk, updated_at.isoformat(), _renderer_format(request), request.META.get('QUERY_STRING', '')]
+        if request.query_params.get('expand'):
+            parts.append(get_catalog_version())
+            updated_at = None
+        etag = make_etag(*parts)
+        if etag_matches(request, etag) or not_modified_since(request, updated_at):
+            return not_modified(etag, updated_at)
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_validators(response, etag, updated_at)
+        return response
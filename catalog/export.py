@@ -0,0 +1,83 @@
+# catalog/export.py
+"""
+تصدير الكتالوج النشط كامل (NDJSON / CSV) بذاكرة ثابتة.
+
+المنتجات بتتقري بـ values_list(...).iterator(chunk_size) والشرائح بـ query واحدة لكل chunk،
+وكل chunk بيتكتب نص واحد في الـ StreamingHttpResponse. من غير ProductDetailSerializer
+ومن غير ما نبني Product objects.
+subcategory بالـ slug و tiers بنفس صيغة import_catalog، فالملف المصدر ينفع يتستورد تاني.
+"""
+import csv
+import io
+import json
+
+from .importer import format_tiers
+from .models import Product, QuantityPrice
+
+EXPORT_FIELDS = ('id', 'sku', 'name', 'description', 'base_price', 'stock', 'active',
+                 'subcategory_id', 'subcategory__slug')
+CSV_HEADER = ('id', 'sku', 'name', 'description', 'base_price', 'stock', 'active', 'subcategory', 'tiers')
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def iter_product_chunks(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    generator بيرجع chunks من (product_row, tiers) — الشرائح متحملة مرة واحدة لكل chunk.
+    """
+    rows = (Product.objects.filter(active=True).order_by('id')
+            .values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size))
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield _attach_tiers(chunk)
+            chunk = []
+    if chunk:
+        yield _attach_tiers(chunk)
+
+
+def _attach_tiers(chunk):
+    tiers = {}
+    for product_id, min_qty, max_qty, price in (
+            QuantityPrice.objects.filter(product_id__in=[row[0] for row in chunk])
+            .order_by('product_id', 'min_qty').values_list('product_id', 'min_qty', 'max_qty', 'price')):
+        tiers.setdefault(product_id, []).append((min_qty, max_qty, price))
+    return [(row, tiers.get(row[0], [])) for row in chunk]
+
+
+def iter_ndjson(chunk_size=DEFAULT_CHUNK_SIZE):
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    for chunk in iter_product_chunks(chunk_size):
+        lines = []
+        for (pid, sku, name, description, base_price, stock, active, subcategory_id, slug), tiers in chunk:
+            lines.append(dumps({
+                'id': pid,
+                'sku': sku,
+                'name': name,
+                'description': description,
+                'base_price': str(base_price),
+                'stock': stock,
+                'active': active,
+                'subcategory': slug,
+                'subcategory_id': subcategory_id,
+                'quantity_prices': [
+                    {'min_qty': min_qty, 'max_qty': max_qty, 'price': str(price)}
+                    for min_qty, max_qty, price in tiers
+                ],
+            }))
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_csv(chunk_size=DEFAULT_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for chunk in iter_product_chunks(chunk_size):
+        for (pid, sku, name, description, base_price, stock, active, _, slug), tiers in chunk:
+            writer.writerow((pid, sku, name, description, base_price, stock, int(active),
+                             slug or '', format_tiers(tiers)))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,120 @@
+# catalog/fastlist.py
+"""
+list() سريع للـ endpoints اللي للقراءة بس: values_list + RowEncoder بدل ModelSerializer.
+
+الـ RowEncoder بيتبني مرة واحدة لكل (serializer, الحقول) من تعريف الـ serializer نفسه:
+ترتيب الحقول وأسماء الأعمدة والتحويلات (Decimal -> نص عن طريق to_representation بتاع الحقل)،
+فالـ JSON الناتج هو نفس الـ bytes بالظبط. أي حقل مش بسيط (nested، method، source فيه نقط)
+بيرجع للـ serializer العادي.
+"""
+from threading import Lock
+
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from utils.timing import serialize_timer
+
+# حقول to_representation بتاعتها ما بتغيرش القيمة اللي جاية من الداتابيز
+IDENTITY_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.BooleanField)
+# حقول بتاخد to_representation بتاعها كما هي (زي DecimalField -> '10.00')
+CONVERTED_FIELDS = (serializers.DecimalField, serializers.FloatField, serializers.DateTimeField,
+                    serializers.DateField)
+
+
+class RowEncoder:
+    """
+    يحول tuple من values_list(*columns) لـ dict بنفس شكل الـ serializer.
+    """
+
+    def __init__(self, names, columns, converters):
+        self.names = tuple(names)
+        self.columns = tuple(columns)
+        self.converters = tuple((i, convert) for i, convert in enumerate(converters) if convert is not None)
+
+    @classmethod
+    def for_serializer(cls, serializer_class, field_names=None):
+        """
+        يرجع None لو فيه حقل مش مدعوم.
+        """
+        names, columns, converters = [], [], []
+        for name, field in serializer_class().fields.items():
+            if field_names and name not in field_names:
+                continue
+            if field.source in ('*', None) or '.' in field.source:
+                return None
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                converters.append(None)  # values_list على الـ FK بيرجع الـ pk على طول
+            elif isinstance(field, CONVERTED_FIELDS):
+                converters.append(field.to_representation)
+            elif isinstance(field, IDENTITY_FIELDS):
+                converters.append(None)
+            else:
+                return None
+            names.append(name)
+            columns.append(field.source)
+        return cls(names, columns, converters)
+
+    def encode(self, rows):
+        names, converters = self.names, self.converters
+        if not converters:
+            return [dict(zip(names, row)) for row in rows]
+        out = []
+        for row in rows:
+            row = list(row)
+            for i, convert in converters:
+                if row[i] is not None:
+                    row[i] = convert(row[i])
+            out.append(dict(zip(names, row)))
+        return out
+
+
+_encoders = {}
+_encoders_lock = Lock()
+
+
+def get_row_encoder(serializer_class, field_names=None):
+    key = (serializer_class, frozenset(field_names or ()))
+    try:
+        return _encoders[key]
+    except KeyError:
+        pass
+    encoder = RowEncoder.for_serializer(serializer_class, field_names)
+    with _encoders_lock:
+        _encoders[key] = encoder
+    return encoder
+
+
+class FastListMixin:
+    """
+    list() من غير ModelSerializer. extra_list_columns: أعمدة لازمة للـ pagination
+    (الـ keyset بيقرا name و id من آخر صف) ومش لازم تبقى في الـ response.
+    """
+    extra_list_columns = ('id', 'name')
+
+    def get_row_encoder(self):
+        serializer_class = self.get_serializer_class()
+        wanted = set()
+        if hasattr(serializer_class, 'requested_fields'):
+            wanted, expand = serializer_class.requested_fields(self.request)
+            if expand:
+                return None
+        return get_row_encoder(serializer_class, wanted)
+
+    def list(self, request, *args, **kwargs):
+        encoder = self.get_row_encoder()
+        if encoder is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # الأعمدة الزيادة في الآخر: zip بيقف عند آخر اسم فمش بتظهر في الـ response
+        columns = encoder.columns + tuple(c for c in self.extra_list_columns if c not in encoder.columns)
+        rows = queryset.values_list(*columns, named=True)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            with serialize_timer():
+                data = encoder.encode(page)
+            return self.get_paginated_response(data)
+        rows = list(rows)
+        with serialize_timer():
+            data = encoder.encode(rows)
+        return Response(data)
@@ -0,0 +1,292 @@
+# catalog/importer.py
+"""
+استيراد كتالوج الموردين (CSV / JSONL) على دفعات بحجم ثابت.
+
+- المنتجات بتتعمل upsert بالـ sku: bulk_create للجديد و bulk_update للمتغير بس.
+- الشرائح (QuantityPrice) بتتبدل بالكامل للمنتج لو عمود tiers موجود واتغير.
+- تغيير stock بيتسجل كحركة تسوية (catalog.inventory)، والمنتج الجديد برصيد أول مدة.
+- الفئات الفرعية بتتحل من dict في الذاكرة (slug -> id) من غير save()/slugify لكل صف.
+- الذاكرة ثابتة مهما كان حجم الملف: بنقرا الصفوف stream وبنحتفظ بدفعة واحدة بس.
+
+شكل الصف:
+    sku, name, description, base_price, stock, active, subcategory (slug), tiers
+tiers في CSV نص بالشكل "10:9.50;50-99:8.00;100:7.00" (min[-max]:price)،
+وفي JSONL ممكن يبقى نفس النص أو list من {"min_qty", "max_qty", "price"}.
+"""
+import csv
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .changes import record_changes
+from .inventory import record_opening_stock, set_stock
+from .models import Product, QuantityPrice, SubCategory
+from .pricing import invalidate_product_tiers
+from .search import index_products
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_FIELDS = ('name', 'description', 'base_price', 'stock', 'active', 'subcategory_id')
+UPDATE_FIELDS = tuple(name for name in PRODUCT_FIELDS if name != 'stock')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+# DELETE الشرائح: pk لكل باراميتر، تحت حد SQLite (999)
+DELETE_CHUNK_SIZE = 500
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    tiers_replaced: int = 0
+    errors: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.perf_counter() - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+
+def read_rows(fp, fmt):
+    """
+    generator على صفوف الملف (dicts) من غير ما يحمّل الملف كله.
+    سطر JSONL بايظ بيطلع ImportRowError بدل الصف، فبيتعد error زي أي قيمة غلط ومن غير ما يوقف الاستيراد.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(fp)
+    elif fmt == 'jsonl':
+        for line in fp:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ImportRowError(f"invalid JSON: {e}")
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def _decimal(value, name):
+    try:
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise ImportRowError(f"invalid {name}: {value!r}")
+
+
+def _check_tier(tier):
+    # من غير الفحص ده القيمة السالبة بتوصل لقيد PositiveIntegerField والـ IntegrityError بيوقف الاستيراد كله
+    min_qty, max_qty, price = tier
+    if min_qty < 1 or (max_qty is not None and max_qty < min_qty) or price < 0:
+        raise ImportRowError(f"invalid tier: {min_qty}-{max_qty if max_qty is not None else ''}:{price}")
+    return tier
+
+
+def parse_tiers(value):
+    """
+    يرجع list مرتبة من (min_qty, max_qty, price).
+    """
+    if value in (None, ''):
+        return []
+    tiers = []
+    if isinstance(value, str):
+        for part in value.split(';'):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                qty_range, price = part.split(':')
+                min_qty, _, max_qty = qty_range.partition('-')
+                tier = (int(min_qty), int(max_qty) if max_qty else None, _decimal(price, 'tier price'))
+            except ValueError:
+                raise ImportRowError(f"invalid tier: {part!r}")
+            tiers.append(_check_tier(tier))
+    else:
+        try:
+            for t in value:
+                max_qty = t.get('max_qty')
+                tiers.append(_check_tier((int(t['min_qty']), int(max_qty) if max_qty not in (None, '') else None,
+                                          _decimal(t['price'], 'tier price'))))
+        except (KeyError, TypeError, ValueError):
+            raise ImportRowError(f"invalid tiers: {value!r}")
+    return sort_tiers(tiers)
+
+
+def delete_tiers(product_ids):
+    """
+    يمسح شرائح المنتجات دي بـ DELETE صريح (دفعات تحت حد باراميترات SQLite).
+    من غير delete() علشان ما يبعتش signals لكل شريحة؛ الكاش وسجل التغييرات بيتحدثوا بعد الدفعة.
+    """
+    table = connection.ops.quote_name(QuantityPrice._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(product_ids), DELETE_CHUNK_SIZE):
+            chunk = product_ids[start:start + DELETE_CHUNK_SIZE]
+            cursor.execute(f"DELETE FROM {table} WHERE product_id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+
+
+def sort_tiers(tiers):
+    return sorted(tiers, key=lambda t: (t[0], t[1] is None, t[1] or 0))
+
+
+def format_tiers(tiers):
+    """
+    عكس parse_tiers للنص: [(10, None, 9.5), (50, 99, 8)] -> "10:9.50;50-99:8.00".
+    """
+    parts = []
+    for min_qty, max_qty, price in sort_tiers(tiers):
+        qty_range = f"{min_qty}-{max_qty}" if max_qty is not None else str(min_qty)
+        parts.append(f"{qty_range}:{price}")
+    return ';'.join(parts)
+
+
+class CatalogImporter:
+    def __init__(self, batch_size=1000, dry_run=False, stdout=None, verbosity=1):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.stdout = stdout
+        self.verbosity = verbosity
+        self.stats = ImportStats()
+        # الفئات الفرعية قليلة: نحملها مرة واحدة
+        self.subcategory_ids = dict(SubCategory.objects.values_list('slug', 'id'))
+
+    def parse_row(self, raw):
+        if isinstance(raw, ImportRowError):
+            raise raw
+        if not isinstance(raw, dict):
+            raise ImportRowError(f"row is not an object: {raw!r}")
+        sku = (raw.get('sku') or '').strip()
+        if not sku:
+            raise ImportRowError("missing sku")
+        values = {}
+        if raw.get('name') not in (None, ''):
+            values['name'] = str(raw['name']).strip()
+        if 'description' in raw and raw['description'] is not None:
+            values['description'] = str(raw['description'])
+        if raw.get('base_price') not in (None, ''):
+            values['base_price'] = _decimal(raw['base_price'], 'base_price')
+        if raw.get('stock') not in (None, ''):
+            try:
+                values['stock'] = int(raw['stock'])
+            except (TypeError, ValueError):
+                raise ImportRowError(f"invalid stock: {raw['stock']!r}")
+        if raw.get('active') not in (None, ''):
+            active = raw['active']
+            values['active'] = active if isinstance(active, bool) else str(active).strip().lower() in TRUE_VALUES
+        if 'subcategory' in raw:
+            slug = str(raw['subcategory'] or '').strip()
+            if slug and slug not in self.subcategory_ids:
+                raise ImportRowError(f"unknown subcategory: {slug!r}")
+            values['subcategory_id'] = self.subcategory_ids.get(slug) if slug else None
+        tiers = parse_tiers(raw['tiers']) if 'tiers' in raw else None
+        return sku, values, tiers
+
+    def run(self, rows):
+        batch = []
+        for raw in rows:
+            batch.append(raw)
+            if len(batch) >= self.batch_size:
+                self.process_batch(batch)
+                batch = []
+        if batch:
+            self.process_batch(batch)
+        return self.stats
+
+    def report_diff(self, line):
+        if self.dry_run and self.stdout and self.verbosity > 1:
+            self.stdout.write(line)
+
+    def process_batch(self, raw_rows):
+        parsed = {}
+        for raw in raw_rows:
+            self.stats.rows += 1
+            try:
+                sku, values, tiers = self.parse_row(raw)
+            except ImportRowError as e:
+                self.stats.errors += 1
+                logger.warning("Skipping row %d: %s", self.stats.rows, e)
+                continue
+            # لو الـ sku اتكرر في نفس الدفعة، آخر صف هو اللي بيكسب
+            parsed[sku] = (values, tiers)
+        if not parsed:
+            return
+
+        existing = {p.sku: p for p in Product.objects.filter(sku__in=parsed.keys()).only('sku', *PRODUCT_FIELDS)}
+        current_tiers = {}
+        for pid, min_qty, max_qty, price in (QuantityPrice.objects.filter(product__sku__in=parsed.keys())
+                                             .values_list('product_id', 'min_qty', 'max_qty', 'price')):
+            current_tiers.setdefault(pid, []).append((min_qty, max_qty, price))
+
+        now = timezone.now()
+        to_create, to_update, tier_rows = [], [], {}
+        for sku, (values, tiers) in parsed.items():
+            product = existing.get(sku)
+            if product is None:
+                if 'name' not in values or 'base_price' not in values:
+                    self.stats.errors += 1
+                    logger.warning("Skipping new sku %s: name and base_price are required", sku)
+                    continue
+                product = Product(sku=sku, **values)
+                to_create.append(product)
+                self.report_diff(f"+ {sku}")
+                if tiers:
+                    tier_rows[sku] = tiers
+                continue
+
+            changed = [name for name, value in values.items() if getattr(product, name) != value]
+            tiers_changed = tiers is not None and tiers != sort_tiers(current_tiers.get(product.pk, []))
+            if not changed and not tiers_changed:
+                self.stats.unchanged += 1
+                continue
+            for name in changed:
+                self.report_diff(f"~ {sku}: {name} {getattr(product, name)!r} -> {values[name]!r}")
+                setattr(product, name, values[name])
+            if tiers_changed:
+                self.report_diff(f"~ {sku}: tiers replaced ({len(tiers)} tiers)")
+            product.updated_at = now
+            to_update.append(product)
+            if tiers_changed:
+                tier_rows[sku] = tiers
+
+        self.stats.created += len(to_create)
+        self.stats.updated += len(to_update)
+        self.stats.tiers_replaced += len(tier_rows)
+        if self.dry_run or not (to_create or to_update):
+            return
+
+        with transaction.atomic():
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            record_opening_stock(to_create)
+            if to_update:
+                # stock بيتحدث كحركة تسوية في سجل المخزون مش بالكتابة فوقه
+                Product.objects.bulk_update(to_update, [*UPDATE_FIELDS, 'updated_at'], batch_size=self.batch_size)
+                set_stock({p.pk: p.stock for p in to_update if p.stock != p._loaded_stock}, reference='import')
+            by_sku = {p.sku: p for p in (*to_create, *to_update)}
+            replaced_ids = [by_sku[sku].pk for sku in tier_rows]
+            delete_tiers(replaced_ids)
+            QuantityPrice.objects.bulk_create([
+                QuantityPrice(product_id=by_sku[sku].pk, min_qty=a, max_qty=b, price=c)
+                for sku, tiers in tier_rows.items() for a, b, c in tiers
+            ], batch_size=self.batch_size)
+            # bulk_* ما بيبعتش signals: نحدث البحث وسجل التغييرات وكاش الأسعار بنفسنا
+            index_products(by_sku.values())
+            record_changes(p.pk for p in by_sku.values())
+            # مع كل دفعة مش في الآخر: الدفعات اللي اتعملها commit تبان حتى لو الاستيراد وقف في النص
+            bump_catalog_version()
+
+        for product in by_sku.values():
+            invalidate_product_tiers(product.pk)
+
+        if self.stdout:
+            self.stdout.write(f"  {self.stats.rows} rows, {self.stats.rows_per_second:,.0f} rows/s")
@@ -0,0 +1,378 @@
+# catalog/inventory.py
+"""
+سجل المخزون: StockMovement (append-only) + StockSnapshot، و Product.stock كاش مشتق منهم.
+
+- أي تغيير في المخزون حركة: استلام (receive_stock)، تسوية لرقم جديد (set_stock: الـ admin والاستيراد)،
+  خروج لطلب (orders.fulfilment). الحركات بتتكتب بـ bulk_create وكاش stock بيتحدث بـ UPDATE واحد
+  لكل دفعة منتجات في نفس الـ transaction، فالكاش ما يبعدش عن السجل.
+- compact_stock_ledger بيضم الحركات القديمة في snapshot لكل منتج اتحرك، فحساب الرصيد من السجل
+  (ledger_stock) = snapshot واحد + الحركات اللي بعد آخر watermark بس، مش كل التاريخ.
+- stock_as_of(ids, when): آخر snapshot قبل when + الحركات اللي بعده لحد when.
+  الـ snapshots القديمة ما بتتمسحش، فأي تاريخ بيتجاوب بنفس التكلفة.
+- المخزون متوزع على مخازن (WarehouseStock) وكل حركة ليها مخزن. نفس الـ transaction بيحدث صف المخزن
+  و Product.stock بنفس الفرق، فـ Product.stock هو مجموع المخازن محسوب مقدماً: الـ serializers
+  وحجز الطلبات بيقروا رقم واحد من غير SUM. pick_locations بيختار المخزن لكل سطر وقت التنفيذ.
+
+الحجز (Product.reserved) مش جزء من السجل: المخزون الفعلي ما بيتغيرش غير لما الطلب يتنفذ،
+والحجوزات نفسها متسجلة في Order.stock_status.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Now
+from django.utils import timezone
+
+from utils.db import read_only_atomic
+from .models import Product, StockMovement, StockSnapshot, Warehouse, WarehouseStock
+
+# كل منتج = WHEN (باراميترين) + pk في الـ IN، تحت حد SQLite (999)
+UPDATE_CHUNK_SIZE = 300
+READ_CHUNK_SIZE = 500
+INSERT_BATCH_SIZE = 500
+COMPACTION_LAG = timedelta(seconds=60)
+DEFAULT_WAREHOUSE_CODE = 'MAIN'
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _case(quantities, product_ids, field='pk'):
+    return Case(*[When(**{field: pid, 'then': Value(quantities[pid])}) for pid in product_ids],
+                default=Value(0), output_field=IntegerField())
+
+
+def default_warehouse_id():
+    pk = Warehouse.objects.filter(is_default=True).values_list('pk', flat=True).first()
+    if pk is None:
+        pk = Warehouse.objects.get_or_create(code=DEFAULT_WAREHOUSE_CODE, defaults={
+            'name': 'Main warehouse', 'is_default': True, 'priority': 0})[0].pk
+    return pk
+
+
+def active_warehouses():
+    """
+    {warehouse_id: (city بحروف صغيرة، priority)} للمخازن النشطة (لـ pick_locations).
+    """
+    return {pk: (city.strip().casefold(), priority)
+            for pk, city, priority in Warehouse.objects.filter(active=True).values_list('pk', 'city', 'priority')}
+
+
+def locked_locations(product_ids):
+    """
+    {product_id: {warehouse_id: quantity}} مقفولة لحد آخر الـ transaction.
+    """
+    on_hand = {}
+    for chunk in _chunks(list(product_ids), READ_CHUNK_SIZE):
+        rows = (WarehouseStock.objects.filter(product_id__in=chunk).select_for_update()
+                .values_list('product_id', 'warehouse_id', 'quantity'))
+        for pid, wid, qty in rows:
+            on_hand.setdefault(pid, {})[wid] = qty
+    return on_hand
+
+
+def pick_locations(quantity, on_hand, warehouses, city=None):
+    """
+    يوزع quantity من منتج على المخازن: on_hand {warehouse_id: qty} للمنتج، warehouses من active_warehouses().
+    الترتيب: مخازن مدينة العميل الأول، بعدين priority، بعدين الأكتر مخزون. أول مخزن يكفي السطر كله بياخده
+    (شحنة واحدة)؛ لو مفيش، السطر بيتقسم بنفس الترتيب. يرجع [(warehouse_id, qty)] ومجموعها ممكن يبقى
+    أقل من quantity لو المخزون كله ما يكفيش.
+    """
+    city = (city or '').strip().casefold()
+    order = sorted((wid for wid, qty in on_hand.items() if wid in warehouses and qty > 0),
+                   key=lambda wid: (not city or warehouses[wid][0] != city, warehouses[wid][1], -on_hand[wid], wid))
+    for wid in order:
+        if on_hand[wid] >= quantity:
+            return [(wid, quantity)]
+    picks, left = [], quantity
+    for wid in order:
+        if not left:
+            break
+        take = min(left, on_hand[wid])
+        picks.append((wid, take))
+        left -= take
+    return picks
+
+
+def apply_movements(movements, reserved=None):
+    """
+    يكتب الحركات ويحدث صفوف المخازن وكاش stock بمجموع الفروق. الحركة من غير مخزن بتروح للافتراضي.
+    reserved: {product_id: qty} اختياري بيتشال من Product.reserved في نفس الـ UPDATE (حجز اتحول لخصم).
+    لازم يتنادي جوه transaction. يرجع {product_id: مجموع الفرق}.
+    """
+    movements = [m for m in movements if m.quantity]
+    reserved = {pid: qty for pid, qty in (reserved or {}).items() if qty}
+    if any(m.warehouse_id is None for m in movements):
+        default = default_warehouse_id()
+        for m in movements:
+            if m.warehouse_id is None:
+                m.warehouse_id = default
+    StockMovement.objects.bulk_create(movements, batch_size=INSERT_BATCH_SIZE)
+
+    deltas, located = {}, {}
+    for m in movements:
+        deltas[m.product_id] = deltas.get(m.product_id, 0) + m.quantity
+        by_product = located.setdefault(m.warehouse_id, {})
+        by_product[m.product_id] = by_product.get(m.product_id, 0) + m.quantity
+    deltas = {pid: qty for pid, qty in deltas.items() if qty}
+    _apply_deltas(deltas, located, reserved)
+    return deltas
+
+
+def _apply_deltas(deltas, located, reserved=None):
+    """
+    يزود صفوف المخازن (located {warehouse_id: {product_id: qty}}) وكاش stock (deltas {product_id: qty})
+    بفروق نسبية، من غير ما يكتب حركات.
+    """
+    reserved = reserved or {}
+    # صف المخزن ممكن ما يكونش موجود (أول استلام للمنتج في المخزن ده)
+    WarehouseStock.objects.bulk_create([
+        WarehouseStock(warehouse_id=wid, product_id=pid) for wid, by_product in located.items() for pid in by_product
+    ], ignore_conflicts=True, batch_size=INSERT_BATCH_SIZE)
+    for wid, by_product in located.items():
+        for chunk in _chunks(sorted(by_product), UPDATE_CHUNK_SIZE):
+            WarehouseStock.objects.filter(warehouse_id=wid, product_id__in=chunk).update(
+                quantity=F('quantity') + _case(by_product, chunk, 'product_id'))
+
+    for chunk in _chunks(sorted(deltas.keys() | reserved.keys()), UPDATE_CHUNK_SIZE):
+        changes = {'updated_at': Now()}
+        moved = [pid for pid in chunk if pid in deltas]
+        if moved:
+            changes['stock'] = F('stock') + _case(deltas, moved)
+        held = [pid for pid in chunk if pid in reserved]
+        if held:
+            changes['reserved'] = Greatest(F('reserved') - _case(reserved, held), Value(0))
+        Product.objects.filter(pk__in=chunk).update(**changes)
+
+
+def record_opening_stock(products, warehouse_id=None):
+    """
+    رصيد أول مدة لمنتجات لسه متعملة (save أو bulk_create) وكاش stock فيها صح خلاص:
+    الحركة وصف المخزن بس.
+    """
+    products = [p for p in products if p.stock]
+    if not products:
+        return
+    warehouse_id = warehouse_id or default_warehouse_id()
+    StockMovement.objects.bulk_create([
+        StockMovement(product_id=p.pk, warehouse_id=warehouse_id, kind=StockMovement.OPENING, quantity=p.stock)
+        for p in products
+    ], batch_size=INSERT_BATCH_SIZE)
+    WarehouseStock.objects.bulk_create([
+        WarehouseStock(warehouse_id=warehouse_id, product_id=p.pk, quantity=p.stock) for p in products
+    ], batch_size=INSERT_BATCH_SIZE)
+
+
+@transaction.atomic
+def receive_stock(quantities, warehouse_id=None, reference=''):
+    """
+    استلام {product_id: qty} في مخزن (الافتراضي لو مش متحدد). يرجع {product_id: الفرق}.
+    """
+    return apply_movements([
+        StockMovement(product_id=pid, warehouse_id=warehouse_id, kind=StockMovement.RECEIPT, quantity=qty,
+                      reference=reference)
+        for pid, qty in quantities.items()
+    ])
+
+
+@transaction.atomic
+def set_stock(levels, warehouse_id=None, kind=StockMovement.ADJUSTMENT, reference=''):
+    """
+    يخلي مخزون {product_id: الرقم الجديد} بالظبط كده (جرد / استيراد) بحركة فرق عن القيمة الحالية.
+    مع warehouse_id الرقم ده لمخزن واحد؛ من غيره ده الإجمالي: الزيادة بتروح للمخزن الافتراضي
+    والنقص بيتوزع على المخازن زي التنفيذ. القيم الحالية بتتقرا مقفولة، فتعديل متزامن ما يضيعش.
+    يرجع {product_id: الرقم الجديد}.
+    """
+    movements = []
+    if warehouse_id is not None:
+        on_hand = locked_locations(levels)
+        for pid, target in levels.items():
+            current = on_hand.get(pid, {}).get(warehouse_id, 0)
+            movements.append(StockMovement(product_id=pid, warehouse_id=warehouse_id, kind=kind,
+                                           quantity=target - current, reference=reference))
+        apply_movements(movements)
+        return dict(levels)
+
+    deltas = {}
+    for chunk in _chunks(list(levels), READ_CHUNK_SIZE):
+        current = Product.objects.filter(pk__in=chunk).select_for_update().values_list('pk', 'stock')
+        deltas.update((pid, levels[pid] - stock) for pid, stock in current if levels[pid] != stock)
+    default = default_warehouse_id() if deltas else None
+    on_hand = locked_locations([pid for pid, delta in deltas.items() if delta < 0])
+    warehouses = active_warehouses()
+    for pid, delta in deltas.items():
+        movements.extend(StockMovement(product_id=pid, warehouse_id=wid, kind=kind, quantity=qty,
+                                       reference=reference)
+                         for wid, qty in _spread(delta, on_hand.get(pid, {}), warehouses, default))
+    apply_movements(movements)
+    return dict(levels)
+
+
+def _spread(delta, on_hand, warehouses, default):
+    """
+    [(warehouse_id, qty)] لفرق في إجمالي منتج: الزيادة للمخزن الافتراضي والنقص بيتوزع زي التنفيذ.
+    """
+    picks = [(default, delta)] if delta > 0 else [(wid, -qty) for wid, qty in
+                                                  pick_locations(-delta, on_hand, warehouses)]
+    # لو المخازن ما تغطيش النقص (بيانات قديمة) الباقي من الافتراضي علشان الإجمالي يطلع مظبوط
+    rest = delta - sum(qty for _, qty in picks)
+    if rest:
+        picks.append((default, rest))
+    return picks
+
+
+def watermark():
+    """
+    آخر StockMovement.id اتضم في snapshots (0 لو مفيش compaction حصل).
+    """
+    return StockSnapshot.objects.aggregate(seq=Max('seq'))['seq'] or 0
+
+
+def _latest_snapshots(product_ids, when=None):
+    """
+    {product_id: (quantity, seq)} لآخر snapshot لكل منتج (قبل when لو متحدد).
+    """
+    latest = StockSnapshot.objects.filter(product_id=OuterRef('product_id'))
+    if when is not None:
+        latest = latest.filter(as_of__lte=when)
+    rows = StockSnapshot.objects.filter(product_id__in=product_ids, seq=Subquery(
+        latest.order_by('-seq').values('seq')[:1]))
+    return {pid: (qty, seq) for pid, qty, seq in rows.values_list('product_id', 'quantity', 'seq')}
+
+
+def stock_as_of(product_ids, when):
+    """
+    {product_id: المخزون وقت when} من السجل: snapshot + الحركات اللي بعده لحد when.
+    """
+    result = {}
+    for chunk in _chunks(list(product_ids), READ_CHUNK_SIZE):
+        snapshots = _latest_snapshots(chunk, when)
+        since = Coalesce(Subquery(
+            StockSnapshot.objects.filter(product_id=OuterRef('product_id'), as_of__lte=when)
+            .order_by('-seq').values('seq')[:1]), Value(0))
+        tail = dict(StockMovement.objects.filter(product_id__in=chunk, created_at__lte=when, id__gt=since)
+                    .values('product_id').annotate(qty=Sum('quantity')).order_by()
+                    .values_list('product_id', 'qty'))
+        for pid in chunk:
+            result[pid] = snapshots.get(pid, (0, 0))[0] + (tail.get(pid) or 0)
+    return result
+
+
+def ledger_stock(product_ids):
+    """
+    {product_id: المخزون الحالي} محسوب من السجل (للتحقق من الكاش). كل الحركات بعد الـ watermark
+    لمنتجات ما اتضمتش، فالـ tail واحد للكل.
+    """
+    since = watermark()
+    result = {}
+    for chunk in _chunks(list(product_ids), READ_CHUNK_SIZE):
+        snapshots = _latest_snapshots(chunk)
+        tail = dict(StockMovement.objects.filter(product_id__in=chunk, id__gt=since)
+                    .values('product_id').annotate(qty=Sum('quantity')).order_by()
+                    .values_list('product_id', 'qty'))
+        for pid in chunk:
+            result[pid] = snapshots.get(pid, (0, 0))[0] + (tail.get(pid) or 0)
+    return result
+
+
+def compact(lag=COMPACTION_LAG, now=None):
+    """
+    يضم الحركات من بعد آخر watermark لحد آخر حركة أقدم من lag في snapshot جديد لكل منتج اتحرك.
+    الـ lag علشان transaction لسه ما عملتش commit (على Postgres) ما تاخدش id أقل من الـ watermark
+    وتفضل برا السجل. يرجع عدد الـ snapshots.
+    القراية (التجميع والـ snapshots القديمة) في transaction قراية بس، والكتابة في transaction قصيرة
+    في الآخر، فالـ checkouts ما بتستناش قفل الكتابة طول الحساب.
+    """
+    cutoff = (now or timezone.now()) - lag
+    with read_only_atomic():
+        start = watermark()
+        end = (StockMovement.objects.filter(id__gt=start, created_at__lt=cutoff)
+               .aggregate(end=Max('id'))['end'])
+        if end is None:
+            return 0
+        rows = list(StockMovement.objects.filter(id__gt=start, id__lte=end)
+                    .values('product_id').annotate(qty=Sum('quantity'), as_of=Max('created_at')).order_by()
+                    .values_list('product_id', 'qty', 'as_of'))
+        snapshots = []
+        for chunk in _chunks(rows, READ_CHUNK_SIZE):
+            previous = _latest_snapshots([pid for pid, _, _ in chunk])
+            snapshots.extend(
+                StockSnapshot(product_id=pid, seq=end, quantity=previous.get(pid, (0, 0))[0] + qty, as_of=as_of)
+                for pid, qty, as_of in chunk)
+
+    with transaction.atomic():
+        # compaction تانية سبقتنا: الحساب مبني على watermark قديم
+        if watermark() != start:
+            return 0
+        StockSnapshot.objects.bulk_create(snapshots, batch_size=INSERT_BATCH_SIZE)
+    return len(snapshots)
+
+
+def stock_cache_drift(product_ids=None):
+    """
+    {product_id: (الكاش، السجل)} للمنتجات اللي Product.stock فيها مختلف عن السجل.
+    """
+    queryset = Product.objects.order_by('pk')
+    if product_ids is not None:
+        queryset = queryset.filter(pk__in=list(product_ids))
+    drift = {}
+    cached = queryset.values_list('pk', 'stock').iterator(chunk_size=READ_CHUNK_SIZE)
+    batch = []
+    for row in cached:
+        batch.append(row)
+        if len(batch) == READ_CHUNK_SIZE:
+            drift.update(_drift(batch))
+            batch = []
+    drift.update(_drift(batch))
+    return drift
+
+
+def _drift(rows):
+    if not rows:
+        return {}
+    ledger = ledger_stock([pid for pid, _ in rows])
+    return {pid: (stock, ledger[pid]) for pid, stock in rows if stock != ledger[pid]}
+
+
+def location_drift(product_ids=None):
+    """
+    {product_id: (Product.stock، مجموع المخازن)} للمنتجات اللي الكاش فيها مختلف عن مجموع WarehouseStock.
+    """
+    queryset = (Product.objects.annotate(located=Coalesce(Sum('warehouse_stock__quantity'), Value(0)))
+                .exclude(stock=F('located')).order_by().values_list('pk', 'stock', 'located'))
+    if product_ids is None:
+        return {pid: (stock, located) for pid, stock, located in queryset}
+    drift = {}
+    for chunk in _chunks(list(product_ids), READ_CHUNK_SIZE):
+        drift.update((pid, (stock, located)) for pid, stock, located in queryset.filter(pk__in=chunk))
+    return drift
+
+
+@transaction.atomic
+def repair_stock_cache(drift):
+    """
+    يرجع كاش stock وصفوف المخازن لقيمة السجل للمنتجات اللي في drift (من stock_cache_drift).
+    الصفوف بتتقفل والسجل بيتحسب تاني جوه الـ transaction، فحركة اتعملت commit بعد حساب drift
+    ما تضيعش، والتصليح فرق نسبي. مفيش حركة جديدة: السجل هو الصح والكاش هو اللي بيتظبط عليه.
+    يرجع عدد المنتجات اللي اتصلحت.
+    """
+    cached = {}
+    for chunk in _chunks(sorted(drift), READ_CHUNK_SIZE):
+        cached.update(Product.objects.filter(pk__in=chunk).select_for_update().values_list('pk', 'stock'))
+    ledger = ledger_stock(list(cached))
+    on_hand = locked_locations(cached)
+    default = default_warehouse_id() if cached else None
+    warehouses = active_warehouses()
+    deltas, located = {}, {}
+    for pid, stock in cached.items():
+        if stock != ledger[pid]:
+            deltas[pid] = ledger[pid] - stock
+        # المخازن بتتظبط على السجل مش على الكاش القديم
+        shortfall = ledger[pid] - sum(on_hand.get(pid, {}).values())
+        for wid, qty in (_spread(shortfall, on_hand.get(pid, {}), warehouses, default) if shortfall else []):
+            by_product = located.setdefault(wid, {})
+            by_product[pid] = by_product.get(pid, 0) + qty
+    _apply_deltas(deltas, located)
+    return len(deltas.keys() | {pid for by_product in located.values() for pid in by_product})
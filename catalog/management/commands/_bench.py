@@ -0,0 +1,69 @@
+# catalog/management/commands/_bench.py
+"""
+أدوات مشتركة لأوامر الـ benchmark (bench_*).
+الملف يبدأ بـ _ فـ Django مش بيعتبره أمر.
+"""
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+
+from catalog.inventory import record_opening_stock
+from catalog.models import Product, QuantityPrice
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """
+    يشغل الـ benchmark جوه transaction ويرجعها في الآخر، فالبيانات المؤقتة ما تتحفظش.
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def seed_catalog(products, min_tiers=5, max_tiers=20, batch_size=2000, seed=42, subcategory=None):
+    """
+    ينشئ منتجات وهمية بشرائح أسعار عشوائية بـ bulk_create ويرجع قائمة الـ ids.
+    """
+    rnd = random.Random(seed)
+    ids = []
+    for start in range(0, products, batch_size):
+        batch = []
+        for n in range(start, min(start + batch_size, products)):
+            batch.append(Product(
+                sku=f'BENCH-{n:08d}',
+                name=f'Bench product {rnd.randrange(products):08d}',
+                base_price=Decimal(rnd.randrange(100, 100000)) / 100,
+                stock=rnd.randrange(0, 1000),
+                subcategory=subcategory,
+            ))
+        created = Product.objects.bulk_create(batch)
+        record_opening_stock(created)
+        ids.extend(p.pk for p in created)
+
+        tiers = []
+        for p in created:
+            min_qty = 1
+            price = p.base_price
+            for _ in range(rnd.randint(min_tiers, max_tiers)):
+                min_qty += rnd.randint(5, 50)
+                price = max(Decimal('0.01'), price - Decimal(rnd.randrange(1, 50)) / 100)
+                tiers.append(QuantityPrice(product=p, min_qty=min_qty, price=price))
+        QuantityPrice.objects.bulk_create(tiers, batch_size=batch_size)
+    return ids
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -0,0 +1,50 @@
+# catalog/management/commands/bench_catalog_export.py
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from ._bench import rolled_back, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Stream the full catalog export and report rows/s and peak Python memory per catalog size."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, nargs='+', default=[20_000, 100_000])
+        parser.add_argument('--seed', type=int, default=42)
+
+    def export(self, client, fmt):
+        start = time.perf_counter()
+        resp = client.get(f'/api/products/export.{fmt}')
+        size = 0
+        rows = 0
+        for part in resp.streaming_content:
+            size += len(part)
+            rows += part.count(b'\n')
+        elapsed = time.perf_counter() - start
+        if fmt == 'csv':
+            rows -= 1  # الـ header
+        return rows, elapsed, size
+
+    def peak_memory(self, client, fmt):
+        # tracemalloc بيبطأ جامد، فبنقيس الذاكرة في لفة منفصلة عن السرعة
+        tracemalloc.start()
+        for _ in client.get(f'/api/products/export.{fmt}').streaming_content:
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+
+    def handle(self, *args, **opts):
+        client = Client(SERVER_NAME='localhost')
+        for products in opts['products']:
+            with rolled_back():
+                seed_catalog(products, min_tiers=1, max_tiers=10, seed=opts['seed'])
+                for fmt in ('ndjson', 'csv'):
+                    rows, elapsed, size = self.export(client, fmt)
+                    peak = self.peak_memory(client, fmt)
+                    self.stdout.write(
+                        f"{rows:>8} rows {fmt:<6}: {rows / elapsed:10,.0f} rows/s, "
+                        f"{size / 1024 / 1024:7.1f} MiB in {elapsed:6.2f}s, peak {peak / 1024 / 1024:6.1f} MiB")
@@ -0,0 +1,52 @@
+# catalog/management/commands/bench_catalog_pagination.py
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from catalog.models import Product
+from catalog.pagination import KeysetPagination
+
+from ._bench import rolled_back, seed_catalog, timed
+
+
+class Command(BaseCommand):
+    help = "Benchmark /api/products/ latency at page 1 vs a deep page: page numbers vs keyset cursor."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200_000)
+        parser.add_argument('--page', type=int, default=5_000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def measure(self, client, url):
+        samples = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            resp = client.get(url)
+            samples.append((time.perf_counter() - start) * 1000)
+            assert resp.status_code == 200, (url, resp.status_code)
+        return statistics.median(samples)
+
+    def handle(self, *args, **opts):
+        self.repeat = opts['repeat']
+        page_size = 20
+        with rolled_back():
+            self.stdout.write(f"Seeding {opts['products']} products...")
+            _, seconds = timed(seed_catalog, opts['products'], min_tiers=0, max_tiers=0)
+            self.stdout.write(f"  seeded in {seconds:.1f}s")
+
+            offset = (opts['page'] - 1) * page_size
+            last = (Product.objects.filter(active=True).order_by('name', 'id')
+                    .values_list('name', 'id')[offset - 1])
+            cursor = KeysetPagination.encode_cursor(*last)
+
+            client = Client(SERVER_NAME='localhost')
+            rows = [
+                ('page numbers, page 1', '/api/products/'),
+                (f"page numbers, page {opts['page']}", f"/api/products/?page={opts['page']}"),
+                ('cursor, page 1', '/api/products/?pagination=cursor'),
+                (f"cursor, page {opts['page']}", f'/api/products/?cursor={cursor}'),
+            ]
+            for label, url in rows:
+                self.stdout.write(f"{label:<28}: {self.measure(client, url):8.2f} ms (median)")
@@ -0,0 +1,107 @@
+# catalog/management/commands/bench_catalog_snapshot.py
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from catalog.pricing import TierTable, clear_tier_cache, get_tier_tables
+from catalog.snapshot import CatalogSnapshot, build_snapshot, get_snapshot, reset_snapshot
+
+from ._bench import rolled_back, seed_catalog
+
+
+def _pss_kib():
+    with open('/proc/self/smaps_rollup') as fp:
+        for line in fp:
+            if line.startswith('Pss:'):
+                return int(line.split()[1])
+    return 0
+
+
+def _worker(mode, path, lookups, seed, start_barrier, done_barrier, results):
+    # الـ worker ما بيلمسش الداتابيز: lru = كل worker عنده نسخة كاملة من الشرايح (كاش دافي)،
+    # snapshot = كل الـ workers بيقروا نفس الملف بـ mmap
+    before = _pss_kib()
+    snapshot = CatalogSnapshot(path)
+    ids = list(snapshot.ids)
+    if mode == 'lru':
+        tables = {}
+        for pid in ids:
+            t = snapshot.tier_table(pid)
+            tables[pid] = TierTable([(None, a, None if b == -1 else b, p)
+                                     for a, b, p in zip(t.breakpoints, t.max_qtys, t.prices)])
+        del snapshot
+        lookup = tables.__getitem__
+    else:
+        lookup = snapshot.tier_table
+        for pid in ids:  # نلمس كل الصفحات زي الكاش الدافي
+            lookup(pid).price_for(1, None)
+    start_barrier.wait()
+    rnd = random.Random(seed)
+    start = time.perf_counter()
+    for _ in range(lookups):
+        lookup(rnd.choice(ids)).price_for(rnd.randrange(1, 500), None)
+    elapsed = time.perf_counter() - start
+    results.put((_pss_kib() - before, lookups / elapsed))
+    done_barrier.wait()
+
+
+class Command(BaseCommand):
+    help = "Compare per-worker memory and lookup speed of the mmap catalog snapshot vs per-process tier caches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+        parser.add_argument('--lookups', type=int, default=100_000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def run_workers(self, mode, path, workers, lookups):
+        ctx = multiprocessing.get_context('fork')
+        start_barrier, done_barrier = ctx.Barrier(workers), ctx.Barrier(workers + 1)
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_worker, args=(mode, path, lookups, n, start_barrier, done_barrier, results))
+                 for n in range(workers)]
+        for p in procs:
+            p.start()
+        stats = [results.get() for _ in procs]
+        done_barrier.wait()
+        for p in procs:
+            p.join()
+        pss = sum(s[0] for s in stats) / workers
+        speed = sum(s[1] for s in stats) / workers
+        return pss, speed
+
+    def handle(self, *args, **opts):
+        with tempfile.TemporaryDirectory() as tmp, rolled_back():
+            path = os.path.join(tmp, 'catalog.snap')
+            ids = seed_catalog(opts['products'], seed=opts['seed'])
+            with override_settings(CATALOG_SNAPSHOT_PATH=path):
+                reset_snapshot()
+                start = time.perf_counter()
+                _, products, tiers = build_snapshot()
+                self.stdout.write(f"built snapshot: {products} products, {tiers} tiers, "
+                                  f"{os.path.getsize(path) / 1024 / 1024:.1f} MiB in {time.perf_counter() - start:.2f}s")
+
+                rnd = random.Random(opts['seed'])
+                sample = [rnd.choice(ids) for _ in range(2_000)]
+                for label, enabled in (('db + LRU (cold)', False), ('snapshot', True)):
+                    clear_tier_cache()
+                    with override_settings(CATALOG_SNAPSHOT_PATH=path if enabled else ''):
+                        reset_snapshot()
+                        get_snapshot()
+                        start = time.perf_counter()
+                        for n in range(0, len(sample), 50):
+                            get_tier_tables(sample[n:n + 50])
+                        elapsed = time.perf_counter() - start
+                    self.stdout.write(f"{label:<16}: {len(sample) / elapsed:10,.0f} products/s via get_tier_tables")
+                reset_snapshot()
+
+            for workers in opts['workers']:
+                for mode in ('lru', 'snapshot'):
+                    pss, speed = self.run_workers(mode, path, workers, opts['lookups'])
+                    self.stdout.write(f"{workers:>2} workers {mode:<8}: {pss / 1024:8.1f} MiB Pss/worker, "
+                                      f"{speed:10,.0f} lookups/s/worker")
@@ -0,0 +1,66 @@
+# catalog/management/commands/bench_conditional_get.py
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from catalog.models import Product
+
+from ._bench import rolled_back, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Replay catalog polling traffic with and without If-None-Match and compare CPU time and bytes sent."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5_000)
+        parser.add_argument('--polls', type=int, default=2_000)
+        parser.add_argument('--changes', type=int, default=12,
+                            help='Catalog edits spread over the replay (about a day of changes).')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def replay(self, traffic, conditional):
+        client = Client(SERVER_NAME='localhost')
+        etags = {}
+        sent = 0
+        not_modified = 0
+        cpu = 0.0
+        for kind, value in traffic:
+            if kind == 'change':
+                product = Product.objects.get(pk=value)
+                product.stock += 1
+                product.save()
+                continue
+            headers = {}
+            if conditional and value in etags:
+                headers['HTTP_IF_NONE_MATCH'] = etags[value]
+            start = time.process_time()
+            resp = client.get(value, **headers)
+            cpu += time.process_time() - start
+            sent += len(resp.content)
+            if resp.status_code == 304:
+                not_modified += 1
+            elif 'ETag' in resp:
+                etags[value] = resp['ETag']
+        return cpu, sent, not_modified
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts['seed'])
+        with rolled_back():
+            ids = seed_catalog(opts['products'], min_tiers=1, max_tiers=5, seed=opts['seed'])
+            hot = rnd.sample(ids, 50)
+            traffic = []
+            change_every = max(1, opts['polls'] // max(opts['changes'], 1))
+            for n in range(opts['polls']):
+                traffic.append(('get', '/api/products/'))
+                traffic.append(('get', f'/api/products/{rnd.choice(hot)}/'))
+                if n and n % change_every == 0:
+                    traffic.append(('change', rnd.choice(hot)))
+
+            requests = sum(1 for kind, _ in traffic if kind == 'get')
+            for label, conditional in (('unconditional', False), ('If-None-Match', True)):
+                cpu, sent, not_modified = self.replay(traffic, conditional)
+                self.stdout.write(
+                    f"{label:<14}: {requests} requests, cpu {cpu:7.2f}s, "
+                    f"{sent / 1024:9.1f} KiB sent, {not_modified} x 304")
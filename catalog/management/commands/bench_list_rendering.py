@@ -0,0 +1,58 @@
+# catalog/management/commands/bench_list_rendering.py
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from catalog.fastlist import get_row_encoder
+from catalog.models import Product
+from catalog.serializers import ProductListSerializer
+from utils.renderers import FastJSONRenderer
+
+from ._bench import rolled_back, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Rows/s for product list rendering (query + serialize + JSON) at several page sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10_000)
+        parser.add_argument('--sizes', type=int, nargs='+', default=[20, 200, 2000])
+        parser.add_argument('--rows', type=int, default=40_000, help='Rows rendered per variant and page size.')
+
+    def serializer_page(self, size):
+        rows = Product.objects.filter(active=True).order_by('name', 'id')[:size]
+        return ProductListSerializer(rows, many=True).data
+
+    def fast_page(self, size):
+        encoder = get_row_encoder(ProductListSerializer)
+        rows = Product.objects.filter(active=True).order_by('name', 'id').values_list(*encoder.columns)[:size]
+        return encoder.encode(rows)
+
+    def measure(self, build, renderer, size, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = renderer.render(build(size))
+            samples.append(time.perf_counter() - start)
+        return size / statistics.median(samples), body
+
+    def handle(self, *args, **opts):
+        with rolled_back():
+            seed_catalog(opts['products'], min_tiers=0, max_tiers=0)
+            Product.objects.update(description='وصف المنتج بالتفصيل ' * 10)
+            variants = (
+                ('ModelSerializer + JSONRenderer', self.serializer_page, JSONRenderer()),
+                ('ModelSerializer + orjson', self.serializer_page, FastJSONRenderer()),
+                ('values_list encoder + JSONRenderer', self.fast_page, JSONRenderer()),
+                ('values_list encoder + orjson', self.fast_page, FastJSONRenderer()),
+            )
+            for size in opts['sizes']:
+                repeat = max(5, opts['rows'] // size)
+                bodies = set()
+                for label, build, renderer in variants:
+                    rate, body = self.measure(build, renderer, size, repeat)
+                    bodies.add(body)
+                    self.stdout.write(f"page {size:>5} {label:<36}: {rate:12,.0f} rows/s")
+                self.stdout.write(f"page {size:>5} identical output: {len(bodies) == 1}")
@@ -0,0 +1,56 @@
+# catalog/management/commands/bench_pricing.py
+import random
+
+from django.core.management.base import BaseCommand
+
+from catalog.models import Product
+from catalog.pricing import clear_tier_cache
+
+from ._bench import rolled_back, seed_catalog, timed
+
+
+def _legacy_price(product, qty):
+    # المنطق القديم: query + مشي خطي على الشرائح مع كل سطر
+    for t in product.quantity_prices.order_by('-min_qty'):
+        if qty >= t.min_qty and (t.max_qty is None or qty <= t.max_qty):
+            return t.price
+    return product.base_price
+
+
+class Command(BaseCommand):
+    help = "Benchmark priced order lines per second: legacy tier scan vs compiled tier cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50_000)
+        parser.add_argument('--lines', type=int, default=20_000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **opts):
+        with rolled_back():
+            self.stdout.write(f"Seeding {opts['products']} products with 5-20 tiers each...")
+            ids, seconds = timed(seed_catalog, opts['products'], seed=opts['seed'])
+            self.stdout.write(f"  seeded in {seconds:.1f}s")
+
+            rnd = random.Random(opts['seed'])
+            products = Product.objects.in_bulk(ids)
+            lines = [(products[rnd.choice(ids)], rnd.randint(1, 600)) for _ in range(opts['lines'])]
+
+            def legacy():
+                for product, qty in lines:
+                    _legacy_price(product, qty)
+
+            def compiled():
+                for product, qty in lines:
+                    product.get_price_for_quantity(qty)
+
+            clear_tier_cache()
+            _, legacy_s = timed(legacy)
+            clear_tier_cache()
+            _, cold_s = timed(compiled)
+            _, warm_s = timed(compiled)
+
+            n = len(lines)
+            self.stdout.write(f"legacy scan      : {n / legacy_s:12,.0f} lines/s")
+            self.stdout.write(f"compiled (cold)  : {n / cold_s:12,.0f} lines/s")
+            self.stdout.write(f"compiled (warm)  : {n / warm_s:12,.0f} lines/s")
+            self.stdout.write(f"speedup (warm)   : {legacy_s / warm_s:12.1f}x")
@@ -0,0 +1,82 @@
+# catalog/management/commands/bench_request_timing.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+from django.urls import resolve
+
+from utils.timing import RequestTimingMiddleware
+
+from ._bench import rolled_back, seed_catalog
+
+TIMING_MIDDLEWARE = 'utils.timing.RequestTimingMiddleware'
+
+
+class Command(BaseCommand):
+    help = "Cost of RequestTimingMiddleware: absent vs sampling off vs every request sampled."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2_000)
+        parser.add_argument('--requests', type=int, default=3_000)
+        parser.add_argument('--rounds', type=int, default=3)
+        parser.add_argument('--calls', type=int, default=200_000,
+                            help='Calls for the isolated middleware measurement.')
+
+    def isolated(self, calls, sample_rate):
+        """
+        الـ middleware لوحده حوالين view فاضي: الفرق ده هو الـ overhead الحقيقي من غير ضوضاء الـ view.
+        """
+        request = RequestFactory().get('/api/products/')
+        request.resolver_match = resolve('/api/products/')
+        response = HttpResponse(b'{}')
+        if sample_rate is None:
+            handler = lambda r: response  # noqa: E731
+        else:
+            with override_settings(REQUEST_TIMING_SAMPLE_RATE=sample_rate, REQUEST_TIMING_SLOW_MS=60_000):
+                handler = RequestTimingMiddleware(lambda r: response)
+        start = time.perf_counter()
+        for _ in range(calls):
+            handler(request)
+        return (time.perf_counter() - start) / calls
+
+    def run(self, urls, **overrides):
+        with override_settings(CATALOG_RESPONSE_CACHE_ENABLED=False, REQUEST_TIMING_SLOW_MS=60_000, **overrides):
+            # Client جديد علشان الـ middleware يتحمل بالإعدادات دي
+            client = Client(SERVER_NAME='localhost')
+            client.get(urls[0])
+            start = time.perf_counter()
+            for url in urls:
+                client.get(url)
+            return (time.perf_counter() - start) / len(urls)
+
+    def handle(self, *args, **opts):
+        without = [m for m in settings.MIDDLEWARE if m != TIMING_MIDDLEWARE]
+        configs = (
+            ('no middleware', {'MIDDLEWARE': without}),
+            ('sampling off', {'MIDDLEWARE': [TIMING_MIDDLEWARE, *without], 'REQUEST_TIMING_SAMPLE_RATE': 0.0}),
+            ('sampling 100%', {'MIDDLEWARE': [TIMING_MIDDLEWARE, *without], 'REQUEST_TIMING_SAMPLE_RATE': 1.0}),
+        )
+        with rolled_back():
+            ids = seed_catalog(opts['products'], min_tiers=1, max_tiers=5)
+            urls = [f'/api/products/{ids[n % len(ids)]}/' if n % 2 else '/api/products/'
+                    for n in range(opts['requests'])]
+            best = {}
+            # كذا لفة بالتبادل وناخد الأحسن علشان الضوضاء
+            for _ in range(opts['rounds']):
+                for label, overrides in configs:
+                    per_request = self.run(urls, **overrides)
+                    best[label] = min(best.get(label, per_request), per_request)
+
+        base = best['no middleware']
+        self.stdout.write("full requests (product list + detail):")
+        for label, _ in configs:
+            self.stdout.write(f"  {label:<14}: {best[label] * 1e6:8.1f} us/request "
+                              f"({(best[label] - base) * 1e6:+7.1f} us)")
+
+        self.stdout.write("middleware alone around an empty view:")
+        base = self.isolated(opts['calls'], None)
+        for label, rate in (('sampling off', 0.0), ('sampling 100%', 1.0)):
+            per_call = self.isolated(opts['calls'], rate)
+            self.stdout.write(f"  {label:<14}: {(per_call - base) * 1e6:+7.2f} us/request")
@@ -0,0 +1,79 @@
+# catalog/management/commands/bench_response_cache.py
+import random
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+
+from catalog.models import Product
+from catalog.response_cache import serve
+
+from ._bench import rolled_back, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Anonymous catalog traffic with and without the response cache, plus a cache-miss stampede."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=20_000)
+        parser.add_argument('--requests', type=int, default=3_000)
+        parser.add_argument('--changes', type=int, default=10)
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def replay(self, traffic):
+        client = Client(SERVER_NAME='localhost')
+        states = {}
+        start = time.perf_counter()
+        for kind, value in traffic:
+            if kind == 'change':
+                Product.objects.filter(pk=value).first().save()
+                continue
+            resp = client.get(value)
+            state = resp.get('X-Cache', 'off')
+            states[state] = states.get(state, 0) + 1
+        return time.perf_counter() - start, states
+
+    def stampede(self, threads):
+        computes = []
+
+        def compute():
+            computes.append(1)
+            time.sleep(0.25)  # rebuild بطيء
+            return HttpResponse(b'{}', content_type='application/json')
+
+        request = RequestFactory().get('/api/catalog/tree/', {'stampede': time.time()})
+        workers = [threading.Thread(target=serve, args=(request, compute)) for _ in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        return len(computes)
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts['seed'])
+        with rolled_back():
+            ids = seed_catalog(opts['products'], min_tiers=1, max_tiers=5, seed=opts['seed'])
+            hot = rnd.sample(ids, 200)
+            urls = ['/api/products/', '/api/categories/', '/api/catalog/tree/', '/api/products/?page=2']
+            traffic = []
+            change_every = max(1, opts['requests'] // max(opts['changes'], 1))
+            for n in range(opts['requests']):
+                if rnd.random() < 0.5:
+                    traffic.append(('get', rnd.choice(urls)))
+                else:
+                    traffic.append(('get', f'/api/products/{rnd.choice(hot)}/'))
+                if n and n % change_every == 0:
+                    traffic.append(('change', rnd.choice(hot)))
+
+            for label, enabled in (('no response cache', False), ('response cache', True)):
+                caches['catalog'].clear()
+                with override_settings(CATALOG_RESPONSE_CACHE_ENABLED=enabled):
+                    elapsed, states = self.replay(traffic)
+                self.stdout.write(f"{label:<18}: {opts['requests'] / elapsed:8,.0f} req/s  {states}")
+
+        computes = self.stampede(opts['threads'])
+        self.stdout.write(f"stampede: {opts['threads']} concurrent misses -> {computes} rebuild(s)")
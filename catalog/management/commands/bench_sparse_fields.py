@@ -0,0 +1,59 @@
+# catalog/management/commands/bench_sparse_fields.py
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from catalog.models import Category, Product, SubCategory
+
+from ._bench import rolled_back, seed_catalog
+
+# وصف عربي بحجم قريب من الكتالوج الحقيقي (~3 KB)
+DESCRIPTION = 'منتج جملة بمواصفات كاملة وتعبئة كرتونة ' * 80
+
+
+class Command(BaseCommand):
+    help = "Payload size and median latency of a 100-row product listing with ?fields= / ?expand= variants."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5_000)
+        parser.add_argument('--repeat', type=int, default=30)
+
+    def measure(self, client, urls):
+        samples = []
+        size = 0
+        for _ in range(self.repeat):
+            size = 0
+            start = time.perf_counter()
+            for url in urls:
+                resp = client.get(url)
+                assert resp.status_code == 200, (url, resp.status_code)
+                size += len(resp.content)
+            samples.append((time.perf_counter() - start) * 1000)
+        return size, statistics.median(samples)
+
+    def handle(self, *args, **opts):
+        self.repeat = opts['repeat']
+        client = Client(SERVER_NAME='localhost')
+        with rolled_back():
+            category = Category.objects.create(name='Bench category')
+            subcategory = SubCategory.objects.create(category=category, name='Bench subcategory')
+            seed_catalog(opts['products'], min_tiers=3, max_tiers=8, subcategory=subcategory)
+            Product.objects.update(description=DESCRIPTION)
+
+            base = '/api/products/?pagination=cursor&page_size=100'
+            page = client.get(base).json()['results']
+            # من غير expand: الـ client بيجيب الشرائح لكل منتج من صفحة التفاصيل + قائمة الفئات الفرعية
+            follow_ups = [f'/api/products/{row["id"]}/' for row in page] + ['/api/subcategories/']
+            variants = (
+                ('full rows', [base]),
+                ('fields=id,name,base_price', [base + '&fields=id,name,base_price']),
+                ('full rows + follow-up calls', [base] + follow_ups),
+                ('expand=subcategory,quantity_prices', [base + '&expand=subcategory,quantity_prices']),
+                ('grid: fields + expand', [base + '&fields=id,name,base_price,quantity_prices'
+                                                  '&expand=quantity_prices']),
+            )
+            for label, urls in variants:
+                size, ms = self.measure(client, urls)
+                self.stdout.write(f"{label:<36}: {len(urls):>3} requests, {size / 1024:8.1f} KiB, {ms:8.2f} ms")
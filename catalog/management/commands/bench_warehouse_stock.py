@@ -0,0 +1,160 @@
+# catalog/management/commands/bench_warehouse_stock.py
+import logging
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from catalog.inventory import INSERT_BATCH_SIZE, location_drift, receive_stock
+from catalog.models import Product, StockMovement, Warehouse, WarehouseStock
+from orders.fulfilment import fulfil_orders
+from orders.models import Order, OrderItem
+from orders.reservations import InsufficientStock, reserve_stock
+
+from ._bench import rolled_back, seed_catalog, timed
+
+CITIES = ('Cairo', 'Giza', 'Alexandria', 'Mansoura', 'Tanta', 'Asyut', 'Aswan', 'Suez', 'Luxor', 'Ismailia')
+
+
+class Command(BaseCommand):
+    help = "Per-warehouse stock at scale: precomputed Product.stock vs SUM over locations, plus fulfilment."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200_000)
+        parser.add_argument('--locations', type=int, default=10)
+        parser.add_argument('--pages', type=int, default=300)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--carts', type=int, default=2_000)
+        parser.add_argument('--orders', type=int, default=2_000)
+        parser.add_argument('--batch', type=int, default=20, help='Orders per fulfilment call.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts['seed'])
+        logging.getLogger('orders.fulfilment').setLevel(logging.ERROR)
+        with rolled_back():
+            ids, seconds = timed(seed_catalog, opts['products'], min_tiers=0, max_tiers=0, seed=opts['seed'])
+            self.stdout.write(f"seeded {len(ids):,} products in {seconds:.1f}s")
+            warehouses, seconds = timed(self.seed_locations, ids, opts['locations'], rnd)
+            rows = WarehouseStock.objects.count()
+            self.stdout.write(f"seeded {rows:,} location rows ({len(warehouses)} warehouses) in {seconds:.1f}s")
+
+            self.bench_pages(ids, opts['pages'], opts['page_size'], rnd)
+            self.bench_validation(ids, opts['carts'], rnd)
+            self.bench_receipts(ids, warehouses, rnd)
+            touched = self.bench_fulfilment(ids, opts['orders'], opts['batch'], rnd)
+
+            drift, seconds = timed(location_drift, touched)
+            self.stdout.write(f"verified {len(touched):,} touched products against location sums in {seconds:.2f}s")
+            if drift:
+                raise CommandError(f"{len(drift)} products drifted from their warehouse totals")
+
+    def seed_locations(self, ids, locations, rnd):
+        """
+        seed_catalog حط كل المخزون في المخزن الافتراضي؛ الباقي بياخد كميات عشوائية ونظبط الكاش مرة واحدة في الآخر.
+        """
+        warehouses = list(Warehouse.objects.filter(is_default=True)) + Warehouse.objects.bulk_create([
+            Warehouse(code=f'BENCH-{n}', name=f'Bench {CITIES[n % len(CITIES)]}', city=CITIES[n % len(CITIES)],
+                      priority=n + 1)
+            for n in range(locations - 1)
+        ])
+        for wh in warehouses[1:]:
+            for start in range(0, len(ids), 5_000):
+                quantities = [(pid, rnd.randrange(0, 500)) for pid in ids[start:start + 5_000]]
+                WarehouseStock.objects.bulk_create([
+                    WarehouseStock(warehouse_id=wh.pk, product_id=pid, quantity=qty) for pid, qty in quantities
+                ], batch_size=INSERT_BATCH_SIZE)
+                StockMovement.objects.bulk_create([
+                    StockMovement(product_id=pid, warehouse_id=wh.pk, kind=StockMovement.OPENING, quantity=qty)
+                    for pid, qty in quantities if qty
+                ], batch_size=INSERT_BATCH_SIZE)
+        Product.objects.filter(pk__in=Subquery(WarehouseStock.objects.values('product_id'))).update(
+            stock=Subquery(WarehouseStock.objects.filter(product_id=OuterRef('pk')).values('product_id')
+                           .annotate(total=Sum('quantity')).values('total')))
+        return warehouses
+
+    def bench_pages(self, ids, pages, page_size, rnd):
+        starts = [rnd.randrange(0, max(len(ids) - page_size, 1)) for _ in range(pages)]
+        page_ids = [ids[s:s + page_size] for s in starts]
+
+        def precomputed():
+            for page in page_ids:
+                list(Product.objects.filter(pk__in=page).values_list('pk', 'stock'))
+
+        def summed():
+            for page in page_ids:
+                list(Product.objects.filter(pk__in=page)
+                     .annotate(total=Coalesce(Sum('warehouse_stock__quantity'), Value(0)))
+                     .values_list('pk', 'total'))
+
+        _, pre_s = timed(precomputed)
+        _, sum_s = timed(summed)
+        self.stdout.write(f"list page stock ({page_size}/page): precomputed {pre_s / pages * 1000:.2f}ms, "
+                          f"SUM over locations {sum_s / pages * 1000:.2f}ms ({sum_s / pre_s:.1f}x)")
+
+    def bench_validation(self, ids, carts, rnd):
+        baskets = [{pid: rnd.randint(1, 5) for pid in rnd.sample(ids, 5)} for _ in range(carts)]
+
+        def reserve():
+            short = 0
+            for basket in baskets:
+                try:
+                    reserve_stock(basket)
+                except InsufficientStock:
+                    short += 1
+            return short
+
+        def precomputed_check():
+            for basket in baskets:
+                rows = Product.objects.filter(pk__in=list(basket)).values_list('pk', 'stock', 'reserved')
+                all(stock - reserved >= basket[pid] for pid, stock, reserved in rows)
+
+        def summed_check():
+            for basket in baskets:
+                totals = dict(WarehouseStock.objects.filter(product_id__in=list(basket))
+                              .values('product_id').annotate(total=Sum('quantity')).order_by()
+                              .values_list('product_id', 'total'))
+                reserved = dict(Product.objects.filter(pk__in=list(basket)).values_list('pk', 'reserved'))
+                all(totals.get(pid, 0) - reserved[pid] >= qty for pid, qty in basket.items())
+
+        _, pre_s = timed(precomputed_check)
+        _, sum_s = timed(summed_check)
+        short, reserve_s = timed(reserve)
+        self.stdout.write(f"availability check (5 lines): precomputed {carts / pre_s:,.0f} carts/s, "
+                          f"SUM over locations {carts / sum_s:,.0f} carts/s")
+        self.stdout.write(f"reserve_stock (conditional UPDATE on precomputed stock): "
+                          f"{carts / reserve_s:,.0f} carts/s ({short} short)")
+
+    def bench_receipts(self, ids, warehouses, rnd):
+        batches = [({pid: rnd.randint(1, 20) for pid in rnd.sample(ids, 100)}, rnd.choice(warehouses).pk)
+                   for _ in range(50)]
+
+        def receive():
+            for quantities, warehouse_id in batches:
+                receive_stock(quantities, warehouse_id=warehouse_id, reference='bench')
+
+        _, seconds = timed(receive)
+        self.stdout.write(f"receipts (movement + location + product cache): {len(batches) * 100 / seconds:,.0f} lines/s")
+
+    def bench_fulfilment(self, ids, orders, batch, rnd):
+        hot = rnd.sample(ids, min(len(ids), 5_000))
+        created = Order.objects.bulk_create([
+            Order(customer_name='Bench', customer_city=rnd.choice(CITIES), total=Decimal('0.00'))
+            for _ in range(orders)
+        ])
+        items = [OrderItem(order_id=o.pk, product_id=pid, quantity=rnd.randint(1, 20), unit_price=Decimal('1.00'))
+                 for o in created for pid in rnd.sample(hot, 3)]
+        OrderItem.objects.bulk_create(items, batch_size=INSERT_BATCH_SIZE)
+        order_ids = [o.pk for o in created]
+
+        def fulfil():
+            for start in range(0, len(order_ids), batch):
+                fulfil_orders(Order.objects.filter(pk__in=order_ids[start:start + batch]))
+
+        _, seconds = timed(fulfil)
+        moves = StockMovement.objects.filter(kind=StockMovement.FULFILMENT).count()
+        self.stdout.write(f"fulfilment ({batch} orders/call, location per line by city): "
+                          f"{orders / seconds:,.0f} orders/s, {moves:,} movements")
+        return sorted({item.product_id for item in items})
@@ -0,0 +1,36 @@
+# catalog/management/commands/build_catalog_snapshot.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.changes import latest_seq
+from catalog.snapshot import SnapshotError, build_snapshot
+
+
+class Command(BaseCommand):
+    help = ("Build the shared memory-mapped catalog snapshot (CATALOG_SNAPSHOT_PATH). "
+            "With --watch, keep rebuilding whenever a product or tier change is recorded.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Override CATALOG_SNAPSHOT_PATH.')
+        parser.add_argument('--watch', type=float, metavar='SECONDS',
+                            help='Poll the latest catalog change every SECONDS and rebuild when it moves.')
+
+    def build(self, path):
+        start = time.perf_counter()
+        try:
+            change_seq, products, tiers = build_snapshot(path)
+        except SnapshotError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Snapshot @change {change_seq}: {products} products, {tiers} tiers "
+                          f"in {time.perf_counter() - start:.2f}s.")
+        return change_seq
+
+    def handle(self, *args, **opts):
+        built = self.build(opts['path'])
+        if not opts['watch']:
+            return
+        while True:
+            time.sleep(opts['watch'])
+            if latest_seq() != built:
+                built = self.build(opts['path'])
@@ -0,0 +1,52 @@
+# catalog/management/commands/compact_stock_ledger.py
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.inventory import compact, location_drift, repair_stock_cache, stock_cache_drift
+
+
+class Command(BaseCommand):
+    help = "Fold stock movements into per-product snapshots; optionally check Product.stock against the ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lag', type=float, default=60.0,
+                            help='Only fold movements older than this many seconds.')
+        parser.add_argument('--interval', type=float, default=300.0,
+                            help='Seconds between compactions.')
+        parser.add_argument('--once', action='store_true',
+                            help='Compact what is due now and exit.')
+        parser.add_argument('--verify', action='store_true',
+                            help='With --once: after compacting, compare the stock cache with the ledger.')
+        parser.add_argument('--repair', action='store_true',
+                            help='With --verify: reset drifted stock values and warehouse rows to the ledger.')
+
+    def handle(self, *args, **opts):
+        # من غير --once اللوب ما بيخلصش، فالتحقق عمره ما كان هيشتغل
+        if (opts['verify'] or opts['repair']) and not opts['once']:
+            raise CommandError("--verify and --repair need --once.")
+        while True:
+            started = time.perf_counter()
+            created = compact(lag=timedelta(seconds=opts['lag']))
+            self.stdout.write(f"{created} snapshots written in {time.perf_counter() - started:.2f}s.")
+            if opts['once']:
+                break
+            time.sleep(opts['interval'])
+
+        if opts['verify']:
+            drift = stock_cache_drift()
+            for pid, (cached, ledger) in sorted(drift.items())[:20]:
+                self.stdout.write(f"  product {pid}: stock {cached}, ledger {ledger}")
+            if drift and opts['repair']:
+                self.stdout.write(f"Repaired {repair_stock_cache(drift)} products.")
+            elif drift:
+                raise CommandError(f"{len(drift)} products differ from the stock ledger.")
+
+            # مجموع المخازن بيتحدث مع الكاش في نفس الـ UPDATE؛ لو اختلفوا يبقى حد كتب من برا catalog.inventory
+            located = location_drift()
+            for pid, (cached, total) in sorted(located.items())[:20]:
+                self.stdout.write(f"  product {pid}: stock {cached}, warehouses {total}")
+            if located:
+                raise CommandError(f"{len(located)} products differ from their warehouse totals.")
+            self.stdout.write("Stock cache matches the ledger and the warehouse totals.")
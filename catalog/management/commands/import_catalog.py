@@ -0,0 +1,36 @@
+# catalog/management/commands/import_catalog.py
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import CatalogImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = "Stream a supplier catalog (CSV or JSONL) and upsert products by sku with their quantity tiers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change (use -v 2 for a per-row diff) without writing.')
+
+    def handle(self, *args, **opts):
+        path = opts['path']
+        fmt = opts['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in ('csv', 'jsonl'):
+            raise CommandError("Cannot guess the format; pass --format csv|jsonl.")
+
+        importer = CatalogImporter(batch_size=opts['batch_size'], dry_run=opts['dry_run'],
+                                   stdout=self.stdout, verbosity=opts['verbosity'])
+        with open(path, newline='', encoding='utf-8') as fp:
+            stats = importer.run(read_rows(fp, fmt))
+
+        prefix = "[dry-run] " if opts['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{stats.rows} rows: {stats.created} created, {stats.updated} updated, "
+            f"{stats.unchanged} unchanged, {stats.tiers_replaced} tier tables replaced, "
+            f"{stats.errors} errors ({stats.rows_per_second:,.0f} rows/s)."
+        ))
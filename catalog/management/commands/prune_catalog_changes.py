@@ -0,0 +1,30 @@
+# catalog/management/commands/prune_catalog_changes.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.changes import prune_changes
+
+
+class Command(BaseCommand):
+    help = "Delete catalog change-feed entries older than CATALOG_CHANGES_RETENTION_DAYS, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=3600.0,
+                            help='Seconds between sweeps.')
+        parser.add_argument('--once', action='store_true',
+                            help='Prune what is past retention now and exit.')
+
+    def handle(self, *args, **opts):
+        total = 0
+        while True:
+            pruned = prune_changes(batch_size=opts['batch_size'])
+            total += pruned
+            if pruned:
+                self.stdout.write(f"Pruned {pruned} catalog changes.")
+            if opts['once']:
+                break
+            time.sleep(opts['interval'])
+
+        self.stdout.write(f"Done. {total} changes pruned.")
@@ -0,0 +1,17 @@
+# catalog/management/commands/rebuild_product_search.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog.search import fts_enabled, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FTS5 product search table from catalog_product."
+
+    def handle(self, *args, **opts):
+        if not fts_enabled():
+            self.stdout.write("Full-text search is only available on SQLite; nothing to do.")
+            return
+        with transaction.atomic():
+            count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products."))
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_category_subcategory_product_subcategory'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('active', True)), fields=['subcategory', 'name', 'id'], name='product_active_sub_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('active', True)), fields=['name', 'id'], name='product_active_name_idx'),
+        ),
+    ]
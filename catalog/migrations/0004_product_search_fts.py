@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+# نسخة ثابتة من catalog.search وقت كتابة الـ migration
+FTS_TABLE = 'catalog_product_fts'
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    "USING fts5(sku, name, description, tokenize = 'unicode61 remove_diacritics 2')"
+)
+DROP_SQL = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SQL)
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, sku, name, description) "
+        "SELECT id, sku, name, description FROM catalog_product")
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
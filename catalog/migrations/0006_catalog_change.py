@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+def seed_existing_products(apps, schema_editor):
+    # سطر لكل منتج موجود، علشان ?since=0 يرجع الكتالوج كله
+    Product = apps.get_model('catalog', 'Product')
+    CatalogChange = apps.get_model('catalog', 'CatalogChange')
+    batch = []
+    for pk in Product.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=2000):
+        batch.append(CatalogChange(product_id=pk))
+        if len(batch) >= 2000:
+            CatalogChange.objects.bulk_create(batch)
+            batch = []
+    CatalogChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('product_id', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['seq'],
+            },
+        ),
+        migrations.RunPython(seed_existing_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:13
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def open_ledger(apps, schema_editor):
+    # المخزون الموجود قبل السجل بيبقى رصيد أول مدة، فالسجل يبدأ متساوي مع الكاش
+    Product = apps.get_model('catalog', 'Product')
+    StockMovement = apps.get_model('catalog', 'StockMovement')
+    now = timezone.now()
+    batch = []
+    for pid, stock in Product.objects.exclude(stock=0).order_by('pk').values_list('pk', 'stock').iterator(chunk_size=2000):
+        batch.append(StockMovement(product_id=pid, kind='opening', quantity=stock, created_at=now))
+        if len(batch) == 2000:
+            StockMovement.objects.bulk_create(batch, batch_size=500)
+            batch = []
+    StockMovement.objects.bulk_create(batch, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_product_reserved'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('product_id', models.IntegerField()),
+                ('kind', models.CharField(choices=[('opening', 'Opening balance'), ('receipt', 'Receipt'), ('adjustment', 'Adjustment'), ('fulfilment', 'Fulfilment')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('reference', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['product_id', 'id'], name='stockmove_product_id_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.IntegerField()),
+                ('seq', models.BigIntegerField()),
+                ('quantity', models.IntegerField()),
+                ('as_of', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['product_id', 'seq'],
+                'indexes': [models.Index(fields=['seq'], name='stocksnapshot_seq_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product_id', 'seq'), name='stocksnapshot_product_seq_uniq')],
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_stock_to_main_warehouse(apps, schema_editor):
+    # كل المخزون الموجود كان في مكان واحد: يبقى في المخزن الافتراضي
+    Warehouse = apps.get_model('catalog', 'Warehouse')
+    WarehouseStock = apps.get_model('catalog', 'WarehouseStock')
+    Product = apps.get_model('catalog', 'Product')
+    StockMovement = apps.get_model('catalog', 'StockMovement')
+    main = Warehouse.objects.create(code='MAIN', name='Main warehouse', is_default=True, priority=0)
+    StockMovement.objects.update(warehouse=main)
+    batch = []
+    for pid, stock in Product.objects.exclude(stock=0).order_by('pk').values_list('pk', 'stock').iterator(chunk_size=2000):
+        batch.append(WarehouseStock(warehouse=main, product_id=pid, quantity=stock))
+        if len(batch) == 2000:
+            WarehouseStock.objects.bulk_create(batch, batch_size=500)
+            batch = []
+    WarehouseStock.objects.bulk_create(batch, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Warehouse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=32, unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('priority', models.PositiveIntegerField(default=100)),
+                ('is_default', models.BooleanField(default=False)),
+                ('active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['priority', 'code'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('is_default',), name='warehouse_single_default')],
+            },
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='warehouse',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='catalog.warehouse'),
+        ),
+        migrations.CreateModel(
+            name='WarehouseStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='warehouse_stock', to='catalog.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_rows', to='catalog.warehouse')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'warehouse'), name='warehousestock_product_warehouse_uniq')],
+            },
+        ),
+        migrations.RunPython(move_stock_to_main_warehouse, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    apps.get_model('catalog', 'CatalogVersion').objects.get_or_create(pk=1, defaults={'version': 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_warehouses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
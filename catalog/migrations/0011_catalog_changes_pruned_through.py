@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogversion',
+            name='changes_pruned_through',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
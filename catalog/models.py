@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.text import slugify
 
 
@@ -51,14 +51,82 @@ class Product(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     base_price = models.DecimalField(max_digits=12, decimal_places=2)
+    # كاش للمخزون الحالي = مجموع WarehouseStock للمنتج؛ الأصل هو سجل الحركات StockMovement (catalog.inventory).
+    # أي تغيير لازم يعدي على catalog.inventory علشان الحركة تتسجل مع الكاش في نفس الـ transaction
     stock = models.IntegerField(default=0)
+    # محجوز لطلبات لسه ما اتنفذتش (orders.reservations)؛ المتاح للبيع = stock - reserved
+    reserved = models.IntegerField(default=0)
     active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # آخر تعديل (بيستخدم في ETag / Last-Modified)؛ أي update() جماعي لازم يحدثه بنفسه
+    updated_at = models.DateTimeField(auto_now=True)
     subcategory = models.ForeignKey(SubCategory, related_name='products', on_delete=models.SET_NULL, null=True, blank=True)
-    
+
+    class Meta:
+        indexes = [
+            # keyset pagination على (name, id) مع/بدون فلتر subcategory.
+            # partial index (WHERE active) بدل عمود active في أول الـ index، لأن Django بيكتب
+            # filter(active=True) كـ WHERE "active" مش active = 1، فـ SQLite ما يقدرش يعمل seek عليه
+            models.Index(fields=['subcategory', 'name', 'id'], condition=models.Q(active=True),
+                         name='product_active_sub_name_idx'),
+            models.Index(fields=['name', 'id'], condition=models.Q(active=True),
+                         name='product_active_name_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(reserved__gte=0), name='product_reserved_not_negative'),
+        ]
+
     def __str__(self):
         return f"{self.sku} - {self.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'stock' in field_names:
+            instance._loaded_stock = instance.stock
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or 'stock' in fields:
+            self._loaded_stock = self.stock
+
+    def save(self, *args, **kwargs):
+        from .inventory import record_opening_stock, set_stock
+
+        # reserved بيتغير بـ UPDATE شرطي بس؛ save() كامل (من الـ admin مثلاً) بقيمة اتقرت من شوية
+        # كان هيمسح أي حجز حصل في النص.
+        # stock كمان ما بيتكتبش مباشرة: القيمة الجديدة بتتحول لحركة تسوية (الفرق عن القيمة الحالية في الـ DB)
+        if self._state.adding or kwargs.get('force_insert'):
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                record_opening_stock([self])
+            self._loaded_stock = self.stock
+            return
+
+        update_fields = kwargs.get('update_fields')
+        deferred = self.get_deferred_fields()
+        if update_fields is None:
+            update_fields = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in ('reserved', 'stock') and f.attname not in deferred
+            ]
+            stock_changed = 'stock' not in deferred and getattr(self, '_loaded_stock', None) != self.stock
+        else:
+            stock_changed = 'stock' in update_fields
+            update_fields = [name for name in update_fields if name != 'stock']
+        if not stock_changed:
+            super().save(*args, **{**kwargs, 'update_fields': update_fields})
+            return
+        with transaction.atomic():
+            super().save(*args, **{**kwargs, 'update_fields': update_fields})
+            self.stock = set_stock({self.pk: self.stock}, reference='product.save')[self.pk]
+        self._loaded_stock = self.stock
+
+    @property
+    def available(self):
+        return self.stock - self.reserved
+
     def get_price_for_quantity(self, qty: int):
         
         """
@@ -67,12 +135,11 @@ class Product(models.Model):
           - نحصل على كل الشرائح المرتبطة بهذا المنتج (quantity_prices).
           - نرتبها نزولياً حسب min_qty علشان نختار أعلى شريحة تنطبق.
           - إذا لم توجد شريحة مناسبة نرجع base_price.
+        الشرائح بتتجمع مرة واحدة لكل منتج في catalog.pricing (bisect + كاش LRU)،
+        فالتسعير في الحالة المستقرة بدون أي query.
         """
-        tiers = self.quantity_prices.order_by('-min_qty')  # related_name في QuantityPrice
-        for t in tiers:
-            if qty >= t.min_qty and (t.max_qty is None or qty <= t.max_qty):
-                return t.price
-        return self.base_price
+        from .pricing import get_tier_table
+        return get_tier_table(self).price_for(qty, self.base_price)
 
 class QuantityPrice(models.Model):
     """
@@ -97,8 +164,134 @@ class QuantityPrice(models.Model):
         return f"{self.product.sku}:{self.min_qty}+=>{self.price}"
 
 
+class CatalogChange(models.Model):
+    """
+    سجل تغييرات المنتجات (append-only) لـ /api/catalog/changes/?since=<seq>.
+    seq بيزيد دايماً (AUTOINCREMENT)، و product_id رقم عادي مش FK علشان السطر يفضل بعد حذف المنتج.
+    أي تعديل في المنتج أو شرائحه (حتى بالـ update() الجماعي) لازم يضيف سطر هنا (catalog.changes).
+    """
+    seq = models.BigAutoField(primary_key=True)
+    product_id = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['seq']
+
+    def __str__(self):
+        return f"#{self.seq} product {self.product_id}"
+
+
+class CatalogVersion(models.Model):
+    """
+    رقم إصدار الكتالوج (catalog.cache): صف واحد (pk=1) بيزيد مع كل تعديل في نفس transaction الكتابة،
+    فكل الـ processes (workers، import_catalog، build_catalog_snapshot) بيشوفوا نفس الرقم.
+    changes_pruned_through: آخر CatalogChange.seq اتمسح (prune_catalog_changes)؛ cursor أقدم منه لازم resync.
+    """
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    version = models.PositiveBigIntegerField(default=1)
+    changes_pruned_through = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"catalog v{self.version}"
+
+
+class Warehouse(models.Model):
+    """
+    مخزن بنشحن منه. التنفيذ بيختار مخزن لكل سطر حسب customer_city (catalog.inventory.pick_locations).
+    المخزن الموقف (active=False) محسوب في Product.stock بس ما بنشحنش منه.
+    المخزن الافتراضي (is_default) بياخد الاستلام والتسويات اللي ما اتحددش لها مخزن.
+    """
+    code = models.CharField(max_length=32, unique=True)
+    name = models.CharField(max_length=200)
+    city = models.CharField(max_length=100, blank=True)
+    # الأقل الأول لما مفيش مخزن في مدينة العميل
+    priority = models.PositiveIntegerField(default=100)
+    is_default = models.BooleanField(default=False)
+    active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['priority', 'code']
+        constraints = [
+            models.UniqueConstraint(fields=['is_default'], condition=models.Q(is_default=True),
+                                    name='warehouse_single_default'),
+        ]
+
+    def __str__(self):
+        return f"{self.code} - {self.name}"
+
 
+class WarehouseStock(models.Model):
+    """
+    مخزون منتج في مخزن. مجموعه لكل منتج = Product.stock (بيتحدثوا مع بعض في catalog.inventory).
+    """
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.PROTECT, related_name='stock_rows')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='warehouse_stock')
+    quantity = models.IntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'warehouse'], name='warehousestock_product_warehouse_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.warehouse_id}: {self.quantity}"
+
+
+class StockMovement(models.Model):
+    """
+    سجل حركات المخزون (append-only): كل سطر فرق موجب أو سالب في مخزون منتج.
+    المخزون الحالي = آخر StockSnapshot + مجموع الحركات بعده، و Product.stock كاش ليه.
+    product_id رقم عادي مش FK زي CatalogChange علشان التاريخ يفضل بعد حذف المنتج.
+    """
+    OPENING = 'opening'          # رصيد أول مدة (منتج جديد أو قبل السجل)
+    RECEIPT = 'receipt'          # استلام بضاعة
+    ADJUSTMENT = 'adjustment'    # تسوية/جرد: الـ admin أو الاستيراد حددوا رقم جديد
+    FULFILMENT = 'fulfilment'    # خروج بضاعة لطلب اتنفذ
 
+    KIND_CHOICES = [
+        (OPENING, 'Opening balance'),
+        (RECEIPT, 'Receipt'),
+        (ADJUSTMENT, 'Adjustment'),
+        (FULFILMENT, 'Fulfilment'),
+    ]
 
-       
\ No newline at end of file
+    id = models.BigAutoField(primary_key=True)
+    product_id = models.IntegerField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.PROTECT, related_name='+', null=True, blank=True)
+    # مصدر الحركة للمراجعة: "order:15"، "import"، "product.save"...
+    reference = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['product_id', 'id'], name='stockmove_product_id_idx')]
+
+    def __str__(self):
+        return f"#{self.id} product {self.product_id} {self.quantity:+d} ({self.kind})"
+
+
+class StockSnapshot(models.Model):
+    """
+    رصيد منتج بعد ضم كل الحركات لحد seq (StockMovement.id) في compaction واحد.
+    as_of = وقت آخر حركة اتضمت، فالرصيد ده صحيح لأي وقت من as_of لحد الحركة اللي بعدها.
+    """
+    product_id = models.IntegerField()
+    seq = models.BigIntegerField()
+    quantity = models.IntegerField()
+    as_of = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['product_id', 'seq']
+        constraints = [
+            models.UniqueConstraint(fields=['product_id', 'seq'], name='stocksnapshot_product_seq_uniq'),
+        ]
+        indexes = [
+            # آخر watermark اتضم (بداية الـ tail)
+            models.Index(fields=['seq'], name='stocksnapshot_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f"product {self.product_id} = {self.quantity} @ #{self.seq}"
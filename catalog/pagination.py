@@ -0,0 +1,133 @@
+# catalog/pagination.py
+"""
+Pagination الكتالوج.
+
+الوضع الافتراضي PageNumberPagination زي باقي المشروع.
+وضع اختياري keyset (cursor) مرتب على (name, id): بدون COUNT(*) وبدون OFFSET،
+فالصفحة رقم 5000 بنفس سرعة الصفحة الأولى. بيتفعل بـ ?pagination=cursor
+(للصفحة الأولى) أو بوجود ?cursor=... (الصفحات التالية).
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination على (name, id) مع cursor مُشفّر (opaque).
+    الـ cursor = آخر (name, id) في الصفحة، والصفحة التالية:
+        name >= :name AND (name > :name OR id > :id)  ORDER BY name, id  LIMIT page_size + 1
+    شرط name >= بيخلي SQLite يبدأ من مكان الـ cursor في الـ index مباشرة.
+    """
+    page_size = 20
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('name', 'id')
+
+    def __init__(self, page_size=None):
+        if page_size:
+            self.page_size = page_size
+        self.next_cursor = None
+        self.request = None
+
+    @staticmethod
+    def encode_cursor(name, pk):
+        raw = json.dumps([name, pk], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(value):
+        try:
+            raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+            name, pk = json.loads(raw.decode('utf-8'))
+            if not isinstance(name, str) or not isinstance(pk, int):
+                raise ValueError
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound('Invalid cursor')
+        return name, pk
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            name, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(name__gte=name) & (Q(name__gt=name) | Q(id__gt=pk)))
+
+        rows = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            self.next_cursor = self.encode_cursor(last.name, last.id)
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'pagination')
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CatalogPagination(PageNumberPagination):
+    """
+    PageNumberPagination العادي، مع تحويل اختياري لـ KeysetPagination.
+    """
+    mode_query_param = 'pagination'
+    keyset_class = KeysetPagination
+
+    def __init__(self):
+        self.keyset = None
+
+    def use_keyset(self, request):
+        params = request.query_params
+        if params.get('q'):
+            # نتايج البحث مرتبة بـ bm25 مش (name, id)، فبتفضل بأرقام الصفحات
+            return False
+        return (params.get(self.mode_query_param) == 'cursor'
+                or self.keyset_class.cursor_query_param in params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class(page_size=self.page_size)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,229 @@
+# catalog/pricing.py
+"""
+جدول شرائح الأسعار المُجمّع (compiled) لكل منتج، محفوظ في كاش LRU داخل العملية.
+
+بدل ما نعمل query على quantity_prices مع كل سطر طلب، نجمع شرائح المنتج مرة واحدة
+في جدول مرتب حسب min_qty ونحدد الشريحة بـ bisect.
+الكاش بيتمسح من signals الـ Product و QuantityPrice (catalog/signals.py) في نفس الـ process.
+التعديلات من processes تانية (workers تانية، import_catalog) بتوصل من سجل التغييرات: مرة كل
+CATALOG_TIER_CACHE_CHECK_MS على الأكثر sync_tier_cache بيقرا سطور CatalogChange اللي بعد آخر seq شافه
+(query واحدة) ويمسح المنتجات دي بس؛ لو كتير أوي بيمسح الكاش كله.
+لو فيه catalog snapshot صالح (catalog/snapshot.py) الشرائح بتتقري منه الأول من غير كاش ولا query.
+"""
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+
+from .snapshot import get_snapshot
+
+DEFAULT_CACHE_SIZE = 100_000
+# أكتر من كده تغييرات من آخر sync: أرخص نمسح الكاش كله من إننا نقرا الـ ids
+MAX_SYNC_CHANGES = 5_000
+
+
+class TierTable:
+    """
+    شرائح منتج واحد مرتبة تصاعدياً حسب min_qty.
+    نفس منطق get_price_for_quantity القديم: أعلى شريحة min_qty <= qty
+    و (max_qty فاضي أو qty <= max_qty)، وإلا base_price.
+    """
+    __slots__ = ('breakpoints', 'max_qtys', 'prices')
+
+    def __init__(self, rows=()):
+        # rows: (id, min_qty, max_qty, price)
+        # عند تساوي min_qty نرتب id تنازلياً علشان المشي للخلف يختار الأقدم أولاً
+        ordered = sorted(rows, key=lambda r: (r[1], -(r[0] or 0)))
+        self.breakpoints = [r[1] for r in ordered]
+        self.max_qtys = [r[2] for r in ordered]
+        self.prices = [r[3] for r in ordered]
+
+    def __len__(self):
+        return len(self.breakpoints)
+
+    def price_for(self, qty, default):
+        i = bisect_right(self.breakpoints, qty) - 1
+        # عادة الشريحة الأولى هي المطابقة؛ نكمل للخلف فقط لو max_qty مش مغطي qty
+        while i >= 0:
+            max_qty = self.max_qtys[i]
+            if max_qty is None or qty <= max_qty:
+                return self.prices[i]
+            i -= 1
+        return default
+
+
+class TierCache:
+    """
+    كاش LRU بسيط (thread-safe) من product_id إلى TierTable.
+    generation بيزيد مع كل invalidate علشان قراءة بدأت قبل التعديل ما تخزنش بيانات قديمة.
+    seq: آخر CatalogChange.seq الكاش متزامن معاه (None = لسه ما اتزامنش)، و checked_at وقت آخر sync.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.generation = 0
+        self.seq = None
+        self.checked_at = 0.0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, product_id):
+        with self._lock:
+            table = self._data.get(product_id)
+            if table is not None:
+                self._data.move_to_end(product_id)
+            return table
+
+    def set(self, product_id, table, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[product_id] = table
+            self._data.move_to_end(product_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, product_id):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(product_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+            # كاش فاضي مش محتاج sync دلوقتي؛ الـ sync الجاي (بعد المدة العادية) بياخد seq من الأول
+            self.seq, self.checked_at = None, time.monotonic()
+
+    def advance(self, seq, product_ids=None):
+        """
+        التغييرات لحد seq وصلت: يمسح product_ids (أو الكاش كله لو None). الـ seq ما بيرجعش لورا.
+        """
+        with self._lock:
+            if self.seq is not None and seq <= self.seq and product_ids is not None:
+                self.checked_at = time.monotonic()
+                return
+            self.generation += 1
+            if product_ids is None:
+                self._data.clear()
+            else:
+                for pid in product_ids:
+                    self._data.pop(pid, None)
+            self.seq, self.checked_at = seq, time.monotonic()
+
+    def __len__(self):
+        return len(self._data)
+
+
+tier_cache = TierCache(getattr(settings, 'CATALOG_TIER_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+
+
+def _check_interval():
+    return getattr(settings, 'CATALOG_TIER_CACHE_CHECK_MS', 250) / 1000
+
+
+def sync_tier_cache(force=False):
+    """
+    يمسح من الكاش المنتجات اللي اتغيرت في أي process من آخر sync، مرة كل CATALOG_TIER_CACHE_CHECK_MS على الأكتر.
+    """
+    from .changes import latest_seq, retention
+    from .models import CatalogChange
+
+    seq = tier_cache.seq
+    idle = time.monotonic() - tier_cache.checked_at
+    if not force and idle < _check_interval():
+        return
+    if seq is None or idle > retention().total_seconds():
+        # أول sync في الـ process (أو السجل من بعد آخر sync ممكن يكون اتمسح): مش عارفين الموجود
+        # اتحمل إمتى، فنبدأ من كاش فاضي عند latest_seq
+        tier_cache.advance(latest_seq())
+        return
+    rows = list(CatalogChange.objects.filter(seq__gt=seq).order_by('seq')
+                .values_list('seq', 'product_id')[:MAX_SYNC_CHANGES + 1])
+    if len(rows) > MAX_SYNC_CHANGES:
+        tier_cache.advance(latest_seq())
+    elif rows:
+        tier_cache.advance(rows[-1][0], {pid for _, pid in rows})
+    else:
+        tier_cache.advance(seq, ())
+
+
+def _rows_from_prefetch(product):
+    """
+    لو quantity_prices متعمل لها prefetch_related نستخدمها بدون query.
+    """
+    prefetched = getattr(product, '_prefetched_objects_cache', {}).get('quantity_prices')
+    if prefetched is None:
+        return None
+    return [(t.pk, t.min_qty, t.max_qty, t.price) for t in prefetched]
+
+
+def get_tier_table(product):
+    """
+    يرجع TierTable للمنتج من الـ snapshot أو الكاش، أو يبنيه (prefetch أو query واحدة) ويخزنه.
+    """
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        table = snapshot.tier_table(product.pk)
+        if table is not None:
+            return table
+
+    sync_tier_cache()
+    table = tier_cache.get(product.pk)
+    if table is not None:
+        return table
+
+    generation = tier_cache.generation
+    rows = _rows_from_prefetch(product)
+    if rows is None:
+        rows = product.quantity_prices.order_by().values_list('id', 'min_qty', 'max_qty', 'price')
+    table = TierTable(rows)
+    tier_cache.set(product.pk, table, generation)
+    return table
+
+
+def get_tier_tables(product_ids):
+    """
+    نسخة batch: يرجع {product_id: TierTable} لكل المنتجات بـ query واحدة على الأكثر
+    (للمنتجات اللي مش في الكاش فقط).
+    """
+    from .models import QuantityPrice
+
+    tables = {}
+    missing = []
+    snapshot = get_snapshot()
+    synced = False
+    for pid in set(product_ids):
+        table = snapshot.tier_table(pid) if snapshot is not None else None
+        if table is None:
+            if not synced:
+                sync_tier_cache()
+                synced = True
+            table = tier_cache.get(pid)
+        if table is None:
+            missing.append(pid)
+        else:
+            tables[pid] = table
+
+    if missing:
+        generation = tier_cache.generation
+        rows_by_product = {pid: [] for pid in missing}
+        rows = (QuantityPrice.objects.filter(product_id__in=missing).order_by()
+                .values_list('product_id', 'id', 'min_qty', 'max_qty', 'price'))
+        for product_id, *row in rows:
+            rows_by_product[product_id].append(row)
+        for pid, product_rows in rows_by_product.items():
+            table = TierTable(product_rows)
+            tier_cache.set(pid, table, generation)
+            tables[pid] = table
+    return tables
+
+
+def invalidate_product_tiers(product_id):
+    tier_cache.invalidate(product_id)
+
+
+def clear_tier_cache():
+    tier_cache.clear()
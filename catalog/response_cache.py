@@ -0,0 +1,143 @@
+# catalog/response_cache.py
+"""
+كاش للـ responses بتاعة الكتالوج للزوار (GET من غير Authorization ولا session).
+
+- المفتاح: الـ path + الـ query params بعد الترتيب + Accept. كل entry فيها catalog version
+  اللي اتحسبت عليه، فأي تعديل في Category / SubCategory / Product / QuantityPrice
+  (signals أو العمليات الجماعية اللي بتعمل bump_catalog_version) بيخليها قديمة من غير ما نمسح حاجة.
+- single-flight: لما الـ entry تبقى قديمة أو مش موجودة، process واحد بس بياخد lock (cache.add)
+  ويحسب الـ response من جديد. الباقيين بيرجعوا النسخة القديمة (stale-while-revalidate)،
+  ولو مفيش نسخة خالص بيستنوا شوية لحد ما الـ builder يخلص.
+- الـ backend هو alias 'catalog' في CACHES. مع locmem (الافتراضي) الكاش مقفول إلا لو
+  CATALOG_RESPONSE_CACHE_ENABLED اتفتح صراحة (process واحد)؛ مع file/redis مفتوح.
+- مش لكل الـ views: الـ delta feed (CatalogChangesView) لازم يتقري من الداتابيز دايماً، والأسعار
+  (price-for-qty) ليها snapshot/LRU خاص بيها؛ الـ viewset بيستثني الـ actions في response_cache_skip_actions.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_http_date_safe
+
+from .cache import get_catalog_version
+from .conditional import etag_matches
+
+CACHE_ALIAS = 'catalog'
+DEFAULT_TIMEOUT = 60 * 60
+# وقت الـ lock لازم يبقى أطول من أبطأ request في الكتالوج
+LOCK_TIMEOUT = 30
+WAIT_FOR_BUILDER = 2.0
+WAIT_STEP = 0.02
+MAX_BODY_SIZE = 1024 * 1024
+SKIPPED_HEADERS = {'set-cookie', 'content-length'}
+
+
+def response_cache():
+    return caches[CACHE_ALIAS if CACHE_ALIAS in settings.CACHES else 'default']
+
+
+def is_enabled():
+    return getattr(settings, 'CATALOG_RESPONSE_CACHE_ENABLED', False)
+
+
+def is_cacheable_request(request):
+    return (request.method == 'GET'
+            and 'HTTP_AUTHORIZATION' not in request.META
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES)
+
+
+def cache_key(request):
+    params = sorted((key, sorted(values)) for key, values in request.GET.lists())
+    raw = '|'.join([request.path, repr(params), request.META.get('HTTP_ACCEPT', '')])
+    return 'catalog:response:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _entry_from_response(response, version):
+    if response.status_code != 200 or response.streaming or response.has_header('Set-Cookie'):
+        return None
+    if hasattr(response, 'render'):
+        response.render()
+    if len(response.content) > MAX_BODY_SIZE:
+        return None
+    headers = [(k, v) for k, v in response.items() if k.lower() not in SKIPPED_HEADERS]
+    return {'version': version, 'content': response.content, 'headers': headers}
+
+
+def _response_from_entry(request, entry, state):
+    headers = dict(entry['headers'])
+    etag = headers.get('ETag')
+    last_modified = headers.get('Last-Modified')
+    if (etag and etag_matches(request, etag)) or _not_modified_since(request, last_modified):
+        response = HttpResponseNotModified()
+        for name in ('ETag', 'Last-Modified'):
+            if name in headers:
+                response[name] = headers[name]
+    else:
+        response = HttpResponse(entry['content'])
+        for name, value in entry['headers']:
+            response[name] = value
+    response['X-Cache'] = state
+    return response
+
+
+def _not_modified_since(request, last_modified):
+    if not last_modified or request.headers.get('If-None-Match'):
+        return False
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+    modified = parse_http_date_safe(last_modified)
+    return since is not None and modified is not None and modified <= since
+
+
+def serve(request, compute):
+    """
+    يرجع response من الكاش أو من compute() (اللي بيرجع HttpResponse/DRF Response).
+    """
+    cache = response_cache()
+    key = cache_key(request)
+    version = get_catalog_version()
+    entry = cache.get(key)
+    if entry is not None and entry['version'] == version:
+        return _response_from_entry(request, entry, 'HIT')
+
+    lock_key = key + ':lock'
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        if entry is not None:
+            return _response_from_entry(request, entry, 'STALE')
+        # مفيش نسخة قديمة: نستنى الـ builder بدل ما كلنا نحسب نفس الحاجة
+        deadline = time.monotonic() + WAIT_FOR_BUILDER
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_STEP)
+            entry = cache.get(key)
+            if entry is not None:
+                return _response_from_entry(request, entry, 'HIT')
+        response = compute()
+        response['X-Cache'] = 'MISS'
+        return response
+
+    try:
+        response = compute()
+        # الـ version اللي اتقرا قبل الحساب: لو حصل تعديل أثناءه، الـ entry تتعتبر قديمة
+        fresh = _entry_from_response(response, version)
+        if fresh is not None:
+            cache.set(key, fresh, getattr(settings, 'CATALOG_RESPONSE_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    finally:
+        cache.delete(lock_key)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+class CachedCatalogResponseMixin:
+    """
+    لأي APIView في الكتالوج: GET للزوار بيعدي على serve().
+    """
+    # actions في الـ viewset مش بتتكاش (action_map بيتحدد قبل dispatch، self.action لأ)
+    response_cache_skip_actions = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        action = getattr(self, 'action_map', {}).get(request.method.lower())
+        if not is_enabled() or not is_cacheable_request(request) or action in self.response_cache_skip_actions:
+            return super().dispatch(request, *args, **kwargs)
+        compute = super().dispatch
+        return serve(request, lambda: compute(request, *args, **kwargs))
@@ -0,0 +1,98 @@
+# catalog/search.py
+"""
+بحث نصي في المنتجات باستخدام جدول SQLite FTS5 (catalog_product_fts).
+
+الجدول بيحتفظ بنسخة من sku / name / description و rowid = Product.id.
+بيتحدث من signals (catalog/signals.py) ومن manage.py rebuild_product_search،
+وأي كود بيعمل bulk_create/bulk_update لازم ينادي index_products بنفسه.
+على أي database غير SQLite كل الدوال دي بتبقى no-op والبحث بيرجع لـ icontains.
+"""
+from django.db import connection
+from django.db.models import Q
+
+FTS_TABLE = 'catalog_product_fts'
+
+# أوزان bm25 للأعمدة بنفس ترتيبها في الجدول: sku, name, description
+BM25_WEIGHTS = (10.0, 5.0, 1.0)
+
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    "USING fts5(sku, name, description, tokenize = 'unicode61 remove_diacritics 2')"
+)
+DROP_SQL = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(q):
+    """
+    يحول نص المستخدم لـ MATCH expression آمن: كل كلمة بين "" مع * للبحث بالبادئة،
+    والكلمات كلها لازم تتطابق (AND). كده علامات FTS5 الخاصة ما تعملش syntax error.
+    """
+    terms = [t.replace('"', '""') for t in q.split()]
+    return ' '.join(f'"{t}"*' for t in terms if t)
+
+
+def index_products(products):
+    """
+    يضيف/يحدّث صفوف المنتجات في جدول البحث. products: Product objects.
+    """
+    if not fts_enabled():
+        return
+    rows = [(p.pk, p.sku or '', p.name or '', p.description or '') for p in products]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(r[0],) for r in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, sku, name, description) VALUES (%s, %s, %s, %s)", rows)
+
+
+def remove_products(product_ids):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pid,) for pid in product_ids])
+
+
+def rebuild_index():
+    """
+    يعيد بناء جدول البحث بالكامل من catalog_product ويرجع عدد الصفوف.
+    """
+    if not fts_enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_SQL)
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, sku, name, description) "
+            "SELECT id, sku, name, description FROM catalog_product")
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def search_products(queryset, q):
+    """
+    يفلتر queryset بنتيجة البحث ويرتبها بـ bm25 (الأقل = الأنسب).
+    بيتجمع عادي مع أي filter تاني (category/subcategory) ومع الـ pagination.
+    """
+    match = build_match_query(q)
+    if not match:
+        return queryset.none()
+    if not fts_enabled():
+        return queryset.filter(
+            Q(sku__icontains=q) | Q(name__icontains=q) | Q(description__icontains=q)
+        ).order_by('name', 'id')
+
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    table = queryset.model._meta.db_table
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[match],
+        select={'search_rank': f'bm25({FTS_TABLE}, {weights})'},
+        order_by=['search_rank', 'id'],
+    )
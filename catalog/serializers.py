@@ -19,14 +19,82 @@ class QuantityPriceSerializer(serializers.ModelSerializer):
         model = QuantityPrice
         fields = ['id', 'min_qty', 'max_qty', 'price']
 
-class ProductListSerializer(serializers.ModelSerializer):
+def query_param_set(request, name):
+    """
+    ?fields=a,b,c -> {'a', 'b', 'c'}
+    """
+    if request is None:
+        return set()
+    raw = request.query_params.get(name, '')
+    return {part.strip() for part in raw.split(',') if part.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    ?fields=name,base_price بيشيل باقي الحقول، و ?expand=subcategory,quantity_prices
+    بيبدل الـ id بالـ object كامل. الأسماء غير المعروفة بتتجاهل.
+    sparse_queryset بيعمل نفس التقليل في الـ SQL (.only / select_related / prefetch_related).
+    """
+    # اسم الحقل -> (serializer, kwargs, طريقة التحميل, المسار)
+    expandable_fields = {
+        'subcategory': (SubCategorySerializer, {}, 'select_related', 'subcategory__category'),
+        'quantity_prices': (QuantityPriceSerializer, {'many': True}, 'prefetch_related', 'quantity_prices'),
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        wanted, expand = self.requested_fields(request)
+        for name in expand:
+            serializer_class, options, _, _ = self.expandable_fields[name]
+            self.fields[name] = serializer_class(read_only=True, **options)
+        if wanted:
+            for name in list(self.fields):
+                if name not in wanted:
+                    self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, request):
+        """
+        (الحقول المطلوبة أو set فاضية = الكل, الحقول اللي هتتعمل expand).
+        """
+        expand = query_param_set(request, 'expand') & cls.expandable_fields.keys()
+        wanted = query_param_set(request, 'fields')
+        if wanted:
+            # لو ولا اسم صح بترجع set فاضية = كل الحقول، بدل object فاضي
+            wanted = (wanted & set(cls.Meta.fields)) | expand
+        return wanted, expand
+
+    @classmethod
+    def sparse_queryset(cls, queryset, request, required=()):
+        """
+        required: أعمدة لازم تتحمل حتى لو مش مطلوبة في الـ response (زي name للترتيب والـ cursor).
+        """
+        wanted, expand = cls.requested_fields(request)
+        for name in expand:
+            loader, path = cls.expandable_fields[name][2:]
+            queryset = getattr(queryset, loader)(path)
+        if wanted:
+            concrete = {f.name for f in cls.Meta.model._meta.concrete_fields}
+            queryset = queryset.only(*sorted((wanted | set(required)) & concrete))
+        return queryset
+
+
+class ProductListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'sku', 'name', 'description', 'base_price', 'stock', 'active','subcategory']
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     quantity_prices = QuantityPriceSerializer(many=True, read_only=True)
 
     class Meta:
         model = Product
         fields = ['id','sku','name','description','base_price','stock','active','quantity_prices','subcategory']
+
+class PriceQuoteItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    qty = serializers.IntegerField(min_value=1)
+
+class PriceQuoteSerializer(serializers.Serializer):
+    items = PriceQuoteItemSerializer(many=True, allow_empty=False, max_length=1000)
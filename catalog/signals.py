@@ -0,0 +1,75 @@
+# catalog/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .changes import record_changes
+from .models import Category, Product, QuantityPrice, SubCategory
+from .pricing import invalidate_product_tiers
+from .search import index_products, remove_products
+
+
+def _invalidate_tiers(product_id):
+    if product_id is None:
+        return
+    # نمسح فوراً، ومرة تانية بعد الـ commit علشان أي قراءة حصلت وسط الـ transaction
+    # ما تفضلش محفوظة بالقيم القديمة
+    invalidate_product_tiers(product_id)
+    transaction.on_commit(lambda: invalidate_product_tiers(product_id))
+
+
+@receiver(post_save, sender=QuantityPrice)
+@receiver(post_delete, sender=QuantityPrice)
+def invalidate_tiers_on_quantity_price_change(sender, instance, **kwargs):
+    _invalidate_tiers(instance.product_id)
+
+
+@receiver(post_save, sender=QuantityPrice)
+@receiver(post_delete, sender=QuantityPrice)
+def touch_product_on_quantity_price_change(sender, instance, **kwargs):
+    # الشرائح جزء من تفاصيل المنتج، فنحدث updated_at علشان الـ ETag يتغير
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_tiers_on_product_change(sender, instance, **kwargs):
+    _invalidate_tiers(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def update_search_index_on_save(sender, instance, **kwargs):
+    index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_search_index_on_delete(sender, instance, **kwargs):
+    remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def record_product_change(sender, instance, **kwargs):
+    # الحذف وإلغاء التفعيل بيبانوا في الـ feed كـ tombstone من حالة المنتج الحالية
+    record_changes([instance.pk])
+
+
+@receiver(post_save, sender=QuantityPrice)
+@receiver(post_delete, sender=QuantityPrice)
+def record_quantity_price_change(sender, instance, **kwargs):
+    record_changes([instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=QuantityPrice)
+@receiver(post_delete, sender=QuantityPrice)
+def bump_catalog_version_on_change(sender, **kwargs):
+    # الرقم في الـ DB: بيتغير مع الـ commit نفسه، فمش محتاجين bump تاني بعده
+    bump_catalog_version()
@@ -0,0 +1,293 @@
+# catalog/snapshot.py
+"""
+Snapshot للكتالوج في ملف memory-mapped مشترك بين كل الـ workers.
+
+الملف فيه arrays ثابتة الحجم (ids مرتبة، base_price و stock و active، والشرائح flat لكل المنتجات)
+وكل worker بيفتحه بـ mmap ويقرا منه بـ memoryview من غير نسخ، فالصفحات بتتشارك من الـ page cache
+والذاكرة لكل worker ما بتكبرش مع عدد الـ workers زي كاش LRU في catalog.pricing.
+
+- البناء: manage.py build_catalog_snapshot (مرة واحدة أو --watch). الكتابة في ملف مؤقت
+  جنب الملف الأصلي وبعدين os.replace، فأي reader يا يشوف الملف القديم كامل يا الجديد كامل.
+- الصلاحية: الملف فيه آخر CatalogChange.seq اتبنى عليه (أي تعديل في منتج أو شرائحه بيضيف سطر).
+  get_snapshot بيقارنه بـ latest_seq() من الداتابيز (مش من الـ Django cache، علشان الـ process اللي بنى
+  الملف والـ workers يشوفوا نفس الرقم)؛ لو اختلفوا بيرجع None والأسعار بتتحسب من الداتابيز لحد ما
+  الـ snapshot يتبني تاني. القراية دي مرة كل CATALOG_SNAPSHOT_CHECK_MS على الأكثر لكل process،
+  وأي record_changes في نفس الـ process بيلغي الانتظار فوراً.
+
+الإعداد: CATALOG_SNAPSHOT_PATH في settings (فاضي = مقفول).
+"""
+import mmap
+import os
+import struct
+import tempfile
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from decimal import Decimal
+from threading import Lock
+
+from django.conf import settings
+
+from utils.db import read_only_atomic
+
+MAGIC = b'CATSNAP2'
+# magic، آخر CatalogChange.seq، عدد المنتجات، عدد الشرائح، حجم أكواد الـ sku
+HEADER = struct.Struct('=8sqqqq')
+NO_MAX_QTY = -1
+
+SnapshotProduct = namedtuple('SnapshotProduct', 'id sku active base_price stock')
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _cents(value):
+    return int(value.scaleb(2))
+
+
+def _price(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def _padded(size):
+    return (size + 7) & ~7
+
+
+class SnapshotTierTable:
+    """
+    نفس واجهة catalog.pricing.TierTable بس فوق slices من الـ mmap (من غير نسخ).
+    """
+    __slots__ = ('breakpoints', 'max_qtys', 'prices')
+
+    def __init__(self, breakpoints, max_qtys, prices):
+        self.breakpoints = breakpoints
+        self.max_qtys = max_qtys
+        self.prices = prices
+
+    def __len__(self):
+        return len(self.breakpoints)
+
+    def price_for(self, qty, default):
+        i = bisect_right(self.breakpoints, qty) - 1
+        while i >= 0:
+            max_qty = self.max_qtys[i]
+            if max_qty == NO_MAX_QTY or qty <= max_qty:
+                return _price(self.prices[i])
+            i -= 1
+        return default
+
+
+class CatalogSnapshot:
+    def __init__(self, path):
+        with open(path, 'rb') as fp:
+            self.stat = os.fstat(fp.fileno())
+            if self.stat.st_size < HEADER.size:
+                raise SnapshotError(f"{path}: truncated snapshot")
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.change_seq, count, tiers, sku_bytes = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path}: not a catalog snapshot")
+        layout = _layout(count, tiers, sku_bytes)
+        if layout['end'] != self.stat.st_size:
+            raise SnapshotError(f"{path}: size mismatch")
+
+        buf = memoryview(self._mmap)
+
+        def section(name, fmt, length):
+            start = layout[name]
+            return buf[start:start + length * struct.calcsize(fmt)].cast(fmt)
+
+        self.ids = section('ids', 'q', count)
+        self.base_prices = section('base_prices', 'q', count)
+        self.stock = section('stock', 'q', count)
+        self.tier_start = section('tier_start', 'q', count + 1)
+        self.sku_start = section('sku_start', 'q', count + 1)
+        self.tier_min = section('tier_min', 'q', tiers)
+        self.tier_max = section('tier_max', 'q', tiers)
+        self.tier_price = section('tier_price', 'q', tiers)
+        self.active = section('active', 'B', count)
+        self.skus = section('skus', 'B', sku_bytes)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index(self, product_id):
+        i = bisect_left(self.ids, product_id)
+        if i < len(self.ids) and self.ids[i] == product_id:
+            return i
+        return None
+
+    def product(self, product_id):
+        i = self.index(product_id)
+        if i is None:
+            return None
+        sku = bytes(self.skus[self.sku_start[i]:self.sku_start[i + 1]]).decode('utf-8')
+        return SnapshotProduct(product_id, sku, bool(self.active[i]), _price(self.base_prices[i]), self.stock[i])
+
+    def tier_table(self, product_id):
+        i = self.index(product_id)
+        if i is None:
+            return None
+        start, end = self.tier_start[i], self.tier_start[i + 1]
+        return SnapshotTierTable(self.tier_min[start:end], self.tier_max[start:end], self.tier_price[start:end])
+
+
+def _layout(count, tiers, sku_bytes):
+    """
+    offsets كل section في الملف (كلها على حدود 8 bytes).
+    """
+    sizes = (
+        ('ids', 8 * count), ('base_prices', 8 * count), ('stock', 8 * count),
+        ('tier_start', 8 * (count + 1)), ('sku_start', 8 * (count + 1)),
+        ('tier_min', 8 * tiers), ('tier_max', 8 * tiers), ('tier_price', 8 * tiers),
+        ('active', count), ('skus', sku_bytes),
+    )
+    layout = {}
+    offset = _padded(HEADER.size)
+    for name, size in sizes:
+        layout[name] = offset
+        offset += _padded(size)
+    layout['end'] = offset
+    return layout
+
+
+def snapshot_path():
+    return getattr(settings, 'CATALOG_SNAPSHOT_PATH', None) or None
+
+
+def build_snapshot(path=None, chunk_size=5000):
+    """
+    يبني الـ snapshot من الداتابيز ويكتبه بشكل atomic. يرجع (change_seq, عدد المنتجات, عدد الشرائح).
+    """
+    from .changes import latest_seq
+    from .models import Product, QuantityPrice
+
+    path = path or snapshot_path()
+    if not path:
+        raise SnapshotError("CATALOG_SNAPSHOT_PATH is not set")
+
+    ids, base_prices, stock, active = array('q'), array('q'), array('q'), array('B')
+    tier_start, tier_min, tier_max, tier_price = array('q', [0]), array('q'), array('q'), array('q')
+    sku_start, skus = array('q', [0]), bytearray()
+
+    # الـ seq والبيانات من نفس الـ transaction: أي تعديل بعدها بيزود latest_seq والـ snapshot يتعتبر قديم.
+    # transaction قراية بس: قفل الكتابة (IMMEDIATE) كان هيوقف الـ checkouts طول البناء
+    with read_only_atomic():
+        change_seq = latest_seq()
+        products = (Product.objects.order_by('pk')
+                    .values_list('pk', 'sku', 'active', 'base_price', 'stock').iterator(chunk_size=chunk_size))
+        # نفس ترتيب TierTable: min_qty تصاعدي، وعند التساوي id تنازلي
+        tier_rows = (QuantityPrice.objects.order_by('product_id', 'min_qty', '-id')
+                     .values_list('product_id', 'min_qty', 'max_qty', 'price').iterator(chunk_size=chunk_size))
+        pending = next(tier_rows, None)
+        for pk, sku, is_active, base_price, qty in products:
+            ids.append(pk)
+            base_prices.append(_cents(base_price))
+            stock.append(qty)
+            active.append(1 if is_active else 0)
+            skus += sku.encode('utf-8')
+            sku_start.append(len(skus))
+            while pending is not None and pending[0] <= pk:
+                if pending[0] == pk:
+                    tier_min.append(pending[1])
+                    tier_max.append(NO_MAX_QTY if pending[2] is None else pending[2])
+                    tier_price.append(_cents(pending[3]))
+                pending = next(tier_rows, None)
+            tier_start.append(len(tier_min))
+
+    count, tiers = len(ids), len(tier_min)
+    layout = _layout(count, tiers, len(skus))
+    sections = (
+        ('ids', ids), ('base_prices', base_prices), ('stock', stock), ('tier_start', tier_start),
+        ('sku_start', sku_start), ('tier_min', tier_min), ('tier_max', tier_max),
+        ('tier_price', tier_price), ('active', active), ('skus', skus),
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.catalog-snapshot-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(HEADER.pack(MAGIC, change_seq, count, tiers, len(skus)))
+            for name, data in sections:
+                fp.seek(layout[name])
+                fp.write(data)
+            fp.truncate(layout['end'])
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    # إحنا لسه قارين الـ seq ده، فمش محتاجين نسأل الداتابيز تاني في الـ process ده لحد الفحص الجاي
+    _remember_seq(change_seq)
+    return change_seq, count, tiers
+
+
+_current = None
+_lock = Lock()
+# آخر latest_seq() اتقرا وإمتى (time.monotonic)
+_seen_seq = None
+_seq_read_at = 0.0
+
+
+def _check_interval():
+    return getattr(settings, 'CATALOG_SNAPSHOT_CHECK_MS', 250) / 1000
+
+
+def _remember_seq(seq):
+    global _seen_seq, _seq_read_at
+    _seen_seq, _seq_read_at = seq, time.monotonic()
+
+
+def _latest_seq():
+    from .changes import latest_seq
+
+    if _seen_seq is None or time.monotonic() - _seq_read_at >= _check_interval():
+        _remember_seq(latest_seq())
+    return _seen_seq
+
+
+def expire_snapshot_check():
+    """
+    الكتالوج اتغير في الـ process ده (record_changes): الفحص الجاي يقرا latest_seq من الداتابيز.
+    """
+    global _seen_seq
+    _seen_seq = None
+
+
+def get_snapshot():
+    """
+    الـ snapshot الحالي لو موجود ومطابق لآخر CatalogChange.seq، وإلا None (الـ caller يرجع للداتابيز).
+    الملف بيتفتح تاني بس لما الـ snapshot المفتوح يبقى قديم.
+    """
+    global _current
+    path = snapshot_path()
+    if path is None:
+        return None
+    seq = _latest_seq()
+    snapshot = _current
+    if snapshot is not None and snapshot.change_seq == seq:
+        return snapshot
+
+    with _lock:
+        snapshot = _current
+        try:
+            stat = os.stat(path)
+            if snapshot is None or (stat.st_ino, stat.st_mtime_ns) != (snapshot.stat.st_ino, snapshot.stat.st_mtime_ns):
+                # الـ mmap القديم بيتقفل لوحده لما آخر reference ليه يروح
+                snapshot = _current = CatalogSnapshot(path)
+        except (OSError, SnapshotError):
+            return None
+    return snapshot if snapshot.change_seq == seq else None
+
+
+def reset_snapshot():
+    global _current, _seen_seq
+    with _lock:
+        _current = None
+        _seen_seq = None
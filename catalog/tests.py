@@ -1,3 +1,956 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from .cache import get_catalog_version
+from .changes import latest_seq, prune_changes, record_changes
+from .inventory import (active_warehouses, compact, ledger_stock, location_drift, pick_locations, receive_stock,
+                        repair_stock_cache, set_stock, stock_as_of, stock_cache_drift)
+from .models import (CatalogChange, Category, Product, QuantityPrice, StockMovement, StockSnapshot, SubCategory,
+                     Warehouse, WarehouseStock)
+from .pricing import TierTable, clear_tier_cache, get_tier_tables, sync_tier_cache
+from .snapshot import CatalogSnapshot, build_snapshot, get_snapshot, reset_snapshot
+
+
+# عدد الـ queries هنا من غير sync كاش الشرائح (بيحصل مرة كل CATALOG_TIER_CACHE_CHECK_MS)
+@override_settings(CATALOG_TIER_CACHE_CHECK_MS=60_000)
+class PriceForQuantityTests(TestCase):
+    def setUp(self):
+        clear_tier_cache()
+        self.product = Product.objects.create(sku='P-1', name='Rice', base_price=Decimal('10.00'))
+        QuantityPrice.objects.create(product=self.product, min_qty=10, max_qty=49, price=Decimal('9.00'))
+        QuantityPrice.objects.create(product=self.product, min_qty=50, price=Decimal('8.00'))
+
+    def test_tiers_and_base_price(self):
+        self.assertEqual(self.product.get_price_for_quantity(1), Decimal('10.00'))
+        self.assertEqual(self.product.get_price_for_quantity(10), Decimal('9.00'))
+        self.assertEqual(self.product.get_price_for_quantity(49), Decimal('9.00'))
+        self.assertEqual(self.product.get_price_for_quantity(500), Decimal('8.00'))
+
+    def test_falls_back_to_lower_tier_when_max_qty_excludes(self):
+        QuantityPrice.objects.create(product=self.product, min_qty=100, max_qty=200, price=Decimal('7.00'))
+        self.assertEqual(self.product.get_price_for_quantity(150), Decimal('7.00'))
+        self.assertEqual(self.product.get_price_for_quantity(201), Decimal('8.00'))
+
+    def test_steady_state_costs_no_queries(self):
+        self.product.get_price_for_quantity(10)
+        with self.assertNumQueries(0):
+            for qty in (1, 10, 50, 1000):
+                self.product.get_price_for_quantity(qty)
+
+    def test_cache_invalidated_by_tier_changes(self):
+        self.assertEqual(self.product.get_price_for_quantity(60), Decimal('8.00'))
+        tier = self.product.quantity_prices.get(min_qty=50)
+        tier.price = Decimal('7.50')
+        tier.save()
+        self.assertEqual(self.product.get_price_for_quantity(60), Decimal('7.50'))
+        tier.delete()
+        self.assertEqual(self.product.get_price_for_quantity(60), Decimal('10.00'))
+
+    def test_changes_from_another_process_reach_the_cache(self):
+        other = Product.objects.create(sku='P-2', name='Oil', base_price=Decimal('5.00'))
+        QuantityPrice.objects.create(product=other, min_qty=10, price=Decimal('4.00'))
+        sync_tier_cache(force=True)
+        self.assertEqual(self.product.get_price_for_quantity(60), Decimal('8.00'))
+        self.assertEqual(other.get_price_for_quantity(10), Decimal('4.00'))
+        # process تاني (أو import_catalog) غيّر السعر: من غير signals هنا، بس سطر في سجل التغييرات
+        QuantityPrice.objects.filter(product=self.product, min_qty=50).update(price=Decimal('7.25'))
+        record_changes([self.product.pk])
+        self.assertEqual(self.product.get_price_for_quantity(60), Decimal('8.00'))
+        with override_settings(CATALOG_TIER_CACHE_CHECK_MS=0), self.assertNumQueries(2):
+            # sync (query واحدة) + تحميل المنتج اللي اتغير
+            self.assertEqual(self.product.get_price_for_quantity(60), Decimal('7.25'))
+        # التاني فضل في الكاش
+        with self.assertNumQueries(0):
+            self.assertEqual(other.get_price_for_quantity(10), Decimal('4.00'))
+
+    def test_batch_lookup_uses_one_query(self):
+        other = Product.objects.create(sku='P-2', name='Oil', base_price=Decimal('5.00'))
+        clear_tier_cache()
+        with self.assertNumQueries(1):
+            tables = get_tier_tables([self.product.pk, other.pk])
+        self.assertEqual(len(tables[self.product.pk]), 2)
+        self.assertEqual(len(tables[other.pk]), 0)
+
+
+@override_settings(CATALOG_TIER_CACHE_CHECK_MS=60_000)
+class PriceQuoteTests(APITestCase):
+    url = '/api/products/price-quote/'
+
+    def setUp(self):
+        clear_tier_cache()
+        self.products = []
+        for n in range(5):
+            p = Product.objects.create(sku=f'Q-{n}', name=f'Item {n}', base_price=Decimal('10.00'))
+            QuantityPrice.objects.create(product=p, min_qty=10, price=Decimal('9.00'))
+            self.products.append(p)
+
+    def test_quote_matches_get_price_for_quantity(self):
+        items = [{'product_id': p.pk, 'qty': qty} for p in self.products for qty in (1, 12)]
+        resp = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data['items']), len(items))
+        for line, it in zip(resp.data['items'], items):
+            product = Product.objects.get(pk=it['product_id'])
+            unit = product.get_price_for_quantity(it['qty'])
+            self.assertEqual(line['unit_price'], str(unit))
+            self.assertEqual(line['total_price'], str(unit * it['qty']))
+        self.assertEqual(resp.data['total_price'], str(5 * (Decimal('10.00') + 12 * Decimal('9.00'))))
+
+    def test_query_count_is_constant(self):
+        items = [{'product_id': p.pk, 'qty': 3} for p in self.products]
+        clear_tier_cache()
+        with self.assertNumQueries(2):
+            self.client.post(self.url, items, format='json')
+        with self.assertNumQueries(1):
+            self.client.post(self.url, items * 50, format='json')
+
+    def test_unknown_product_is_rejected(self):
+        resp = self.client.post(self.url, [{'product_id': 999999, 'qty': 1}], format='json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.data['missing'], [999999])
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        # أسماء مكررة علشان نتأكد إن الترتيب الثانوي على id شغال
+        for n in range(45):
+            Product.objects.create(sku=f'K-{n}', name=f'Name {n % 7}', base_price=Decimal('1.00'))
+        Product.objects.create(sku='K-off', name='Name 0', base_price=Decimal('1.00'), active=False)
+
+    def test_walks_every_active_product_once_in_name_id_order(self):
+        url = '/api/products/?pagination=cursor&page_size=10'
+        seen = []
+        while url:
+            # catalog version + الصفحة
+            with self.assertNumQueries(2):
+                resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotIn('count', resp.data)
+            seen.extend((p['name'], p['id']) for p in resp.data['results'])
+            url = resp.data['next']
+        expected = list(Product.objects.filter(active=True).order_by('name', 'id').values_list('name', 'id'))
+        self.assertEqual(seen, expected)
+
+    def test_page_numbers_remain_default(self):
+        resp = self.client.get('/api/products/')
+        self.assertEqual(resp.data['count'], 45)
+
+    def test_invalid_cursor(self):
+        resp = self.client.get('/api/products/?cursor=not-a-cursor')
+        self.assertEqual(resp.status_code, 404)
+
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        cat = Category.objects.create(name='Food')
+        self.grains = SubCategory.objects.create(category=cat, name='Grains')
+        self.oils = SubCategory.objects.create(category=cat, name='Oils')
+        self.rice = Product.objects.create(sku='RICE-5KG', name='Basmati rice', base_price=Decimal('1.00'),
+                                           subcategory=self.grains)
+        self.sauce = Product.objects.create(sku='SAUCE-1', name='Curry sauce', description='Goes well with rice',
+                                            base_price=Decimal('1.00'), subcategory=self.oils)
+        Product.objects.create(sku='OIL-1', name='Sunflower oil', base_price=Decimal('1.00'), subcategory=self.oils)
+
+    def ids(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return [p['id'] for p in resp.data['results']]
+
+    def test_ranked_by_bm25(self):
+        self.assertEqual(self.ids('/api/products/?q=rice'), [self.rice.pk, self.sauce.pk])
+
+    def test_prefix_and_unicode(self):
+        arabic = Product.objects.create(sku='AR-1', name='أرز مصري', base_price=Decimal('1.00'))
+        self.assertEqual(self.ids('/api/products/?q=basm'), [self.rice.pk])
+        self.assertEqual(self.ids('/api/products/?q=أرز'), [arabic.pk])
+
+    def test_combines_with_subcategory_filter(self):
+        self.assertEqual(self.ids(f'/api/products/?q=rice&subcategory={self.oils.pk}'), [self.sauce.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.rice.name = 'Jasmine grain'
+        self.rice.save()
+        self.assertEqual(self.ids('/api/products/?q=jasmine'), [self.rice.pk])
+        self.sauce.delete()
+        self.assertEqual(self.ids('/api/products/?q=rice'), [self.rice.pk])
+
+    def test_fts_syntax_is_escaped(self):
+        self.assertEqual(self.ids('/api/products/?q="rice" OR (NEAR'), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM catalog_product_fts')
+        call_command('rebuild_product_search', stdout=StringIO())
+        self.assertEqual(self.ids('/api/products/?q=sunflower'), [Product.objects.get(sku='OIL-1').pk])
+
+
+class CategoryTreeTests(APITestCase):
+    url = '/api/catalog/tree/'
+
+    def setUp(self):
+        cache.clear()
+        self.food = Category.objects.create(name='Food')
+        Category.objects.create(name='Hidden', active=False)
+        self.grains = SubCategory.objects.create(category=self.food, name='Grains')
+        SubCategory.objects.create(category=self.food, name='Old', active=False)
+        for n in range(3):
+            Product.objects.create(sku=f'T-{n}', name=f'T {n}', base_price=Decimal('1.00'),
+                                   subcategory=self.grains, active=n < 2)
+
+    def test_tree_with_active_counts(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data, [{
+            'id': self.food.pk, 'name': 'Food', 'slug': 'food', 'product_count': 2,
+            'subcategories': [{'id': self.grains.pk, 'name': 'Grains', 'slug': 'grains', 'product_count': 2}],
+        }])
+
+    def test_served_from_cache_until_catalog_changes(self):
+        # الـ query الزيادة هي قراية catalog version من CatalogVersion
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        Product.objects.create(sku='T-new', name='New', base_price=Decimal('1.00'), subcategory=self.grains)
+        with self.assertNumQueries(3):
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.data[0]['product_count'], 3)
+
+
+# هنا بنختبر طبقة الـ ETag لوحدها، من غير كاش الـ responses (ResponseCacheTests)
+@override_settings(CATALOG_RESPONSE_CACHE_ENABLED=False)
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(sku='E-1', name='Etag', base_price=Decimal('2.00'))
+
+    def test_list_answers_304_without_queries(self):
+        first = self.client.get('/api/products/')
+        etag = first['ETag']
+        # query واحدة بس: catalog version
+        with self.assertNumQueries(1):
+            resp = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], etag)
+        # صفحة/فلتر مختلف = ETag مختلف
+        self.assertNotEqual(self.client.get('/api/products/?page_size=5')['ETag'], etag)
+
+    def test_list_etag_changes_with_catalog(self):
+        etag = self.client.get('/api/categories/')['ETag']
+        Category.objects.create(name='New')
+        resp = self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+
+    def test_version_is_shared_between_processes(self):
+        from .cache import bump_catalog_version
+        etag = self.client.get('/api/products/')['ETag']
+        # process تاني بكاش locmem خاص بيه بيغير الكتالوج: الـ version في الـ DB فالـ ETag هنا بيتغير
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                                   'LOCATION': 'other-process'}}):
+            bump_catalog_version()
+        resp = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+
+    def test_detail_uses_updated_at(self):
+        url = f'/api/products/{self.product.pk}/'
+        first = self.client.get(url)
+        self.assertIn('Last-Modified', first)
+        with self.assertNumQueries(1):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(resp.status_code, 304)
+        resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(resp.status_code, 304)
+
+        QuantityPrice.objects.create(product=self.product, min_qty=10, price=Decimal('1.50'))
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data['quantity_prices']), 1)
+
+    def test_missing_product_is_404(self):
+        self.assertEqual(self.client.get('/api/products/999999/').status_code, 404)
+
+
+class ImportCatalogTests(TestCase):
+    csv_data = (
+        "sku,name,description,base_price,stock,active,subcategory,tiers\n"
+        "IMP-1,Rice,Long grain,10.00,100,1,grains,10:9.00;50:8.00\n"
+        "IMP-2,Beans,,4.50,20,1,,\n"
+        "IMP-3,Broken,,not-a-price,1,1,,\n"
+    )
+
+    def setUp(self):
+        clear_tier_cache()
+        cat = Category.objects.create(name='Food')
+        self.grains = SubCategory.objects.create(category=cat, name='Grains')
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def _import(self, data, suffix, *args):
+        path = os.path.join(self.tmp, f'catalog.{suffix}')
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.write(data)
+        out = StringIO()
+        with self.assertLogs('catalog.importer', level='WARNING') if 'Broken' in data else nullcontext():
+            call_command('import_catalog', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_csv_upsert_and_unchanged_rows_are_skipped(self):
+        out = self._import(self.csv_data, 'csv')
+        self.assertIn('2 created', out)
+        self.assertIn('1 errors', out)
+        rice = Product.objects.get(sku='IMP-1')
+        self.assertEqual(rice.subcategory, self.grains)
+        self.assertEqual(rice.get_price_for_quantity(60), Decimal('8.00'))
+
+        out = self._import(self.csv_data, 'csv')
+        self.assertIn('0 created, 0 updated, 2 unchanged', out)
+
+    def test_jsonl_replaces_tiers_and_dry_run_writes_nothing(self):
+        self._import(self.csv_data, 'csv')
+        rice = Product.objects.get(sku='IMP-1')
+        self.assertEqual(rice.get_price_for_quantity(60), Decimal('8.00'))
+
+        line = json.dumps({'sku': 'IMP-1', 'base_price': '11.00',
+                           'tiers': [{'min_qty': 5, 'max_qty': None, 'price': '10.50'}]})
+        out = self._import(line + '\n', 'jsonl', '--dry-run', '-v', '2')
+        self.assertIn('~ IMP-1: base_price', out)
+        self.assertIn('[dry-run]', out)
+        rice.refresh_from_db()
+        self.assertEqual(rice.base_price, Decimal('10.00'))
+
+        self._import(line + '\n', 'jsonl')
+        rice.refresh_from_db()
+        self.assertEqual(rice.base_price, Decimal('11.00'))
+        self.assertEqual(rice.quantity_prices.count(), 1)
+        self.assertEqual(rice.get_price_for_quantity(60), Decimal('10.50'))
+
+    def test_broken_jsonl_lines_are_counted_as_errors(self):
+        data = ('{"sku": "IMP-8", "name": "Lentils", "base_price": "3.00"}\n'
+                '{"sku": "IMP-9", "name": "Broken", \n'
+                '[1, 2]\n'
+                '{"sku": "IMP-10", "name": "Salt", "base_price": "1.00"}\n')
+        out = self._import(data, 'jsonl')
+        self.assertIn('2 created', out)
+        self.assertIn('2 errors', out)
+        self.assertEqual(set(Product.objects.values_list('sku', flat=True)), {'IMP-8', 'IMP-10'})
+
+    def test_invalid_tier_ranges_are_row_errors(self):
+        data = ('{"sku": "IMP-4", "name": "Broken", "base_price": "1.00", "tiers": [{"min_qty": -5, "price": "1"}]}\n'
+                '{"sku": "IMP-5", "name": "Broken", "base_price": "1.00", '
+                '"tiers": [{"min_qty": 10, "max_qty": 5, "price": "1"}]}\n'
+                '{"sku": "IMP-6", "name": "Broken", "base_price": "1.00", "tiers": "5:-1.00"}\n'
+                '{"sku": "IMP-7", "name": "Salt", "base_price": "1.00", "tiers": "5-9:0.90"}\n')
+        out = self._import(data, 'jsonl')
+        self.assertIn('1 created', out)
+        self.assertIn('3 errors', out)
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), ['IMP-7'])
+
+    def test_catalog_version_is_bumped_with_every_batch(self):
+        version = get_catalog_version()
+        self._import(self.csv_data, 'csv', '--batch-size', '1')
+        # دفعتين اتكتبوا، والصف البايظ ما بيغيرش النسخة
+        self.assertEqual(get_catalog_version(), version + 2)
+
+    def test_stock_changes_go_through_the_ledger(self):
+        self._import(self.csv_data, 'csv')
+        self._import('{"sku": "IMP-1", "stock": 70}\n', 'jsonl')
+        rice = Product.objects.get(sku='IMP-1')
+        self.assertEqual(rice.stock, 70)
+        self.assertEqual(list(StockMovement.objects.filter(product_id=rice.pk).values_list('kind', 'quantity')),
+                         [(StockMovement.OPENING, 100), (StockMovement.ADJUSTMENT, -30)])
+        self.assertEqual(stock_cache_drift(), {})
+
+
+class CatalogExportTests(APITestCase):
+    def setUp(self):
+        cat = Category.objects.create(name='Food')
+        self.grains = SubCategory.objects.create(category=cat, name='Grains')
+        self.rice = Product.objects.create(sku='EXP-1', name='Rice, "long"', base_price=Decimal('10.00'),
+                                           stock=5, subcategory=self.grains)
+        QuantityPrice.objects.create(product=self.rice, min_qty=10, price=Decimal('9.00'))
+        QuantityPrice.objects.create(product=self.rice, min_qty=50, max_qty=99, price=Decimal('8.00'))
+        Product.objects.create(sku='EXP-2', name='Beans', base_price=Decimal('4.50'))
+        Product.objects.create(sku='EXP-3', name='Hidden', base_price=Decimal('1.00'), active=False)
+
+    def _body(self, response):
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_ndjson_streams_active_products_with_tiers(self):
+        resp = self.client.get('/api/products/export.ndjson')
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertTrue(resp['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in self._body(resp).splitlines()]
+        self.assertEqual([r['sku'] for r in rows], ['EXP-1', 'EXP-2'])
+        self.assertEqual(rows[0]['subcategory'], self.grains.slug)
+        self.assertEqual(rows[0]['quantity_prices'], [
+            {'min_qty': 10, 'max_qty': None, 'price': '9.00'},
+            {'min_qty': 50, 'max_qty': 99, 'price': '8.00'},
+        ])
+        self.assertEqual(rows[1]['quantity_prices'], [])
+
+    def test_csv_export_round_trips_through_import(self):
+        resp = self.client.get('/api/products/export.csv')
+        self.assertEqual(resp.status_code, 200)
+        body = self._body(resp)
+        self.assertIn('"Rice, ""long"""', body)
+        self.assertIn('10:9.00;50-99:8.00', body)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'catalog.csv')
+            with open(path, 'w', encoding='utf-8', newline='') as fp:
+                fp.write(body)
+            out = StringIO()
+            call_command('import_catalog', path, stdout=out)
+        self.assertIn('0 created, 0 updated, 2 unchanged', out.getvalue())
+
+    def test_tiers_are_fetched_once_per_chunk(self):
+        from .export import iter_ndjson
+        for n in range(5):
+            Product.objects.create(sku=f'EXP-X{n}', name=f'Extra {n}', base_price=Decimal('1.00'))
+        # 7 منتجات بـ chunk_size=3 -> cursor واحد للمنتجات + query شرائح لكل chunk من الـ 3
+        with self.assertNumQueries(4):
+            lines = ''.join(iter_ndjson(chunk_size=3)).splitlines()
+        self.assertEqual(len(lines), 7)
+
+    def test_unknown_format_is_404(self):
+        self.assertEqual(self.client.get('/api/products/export.xml').status_code, 404)
+
+
+class CatalogChangesTests(APITestCase):
+    def setUp(self):
+        self.rice = Product.objects.create(sku='CH-1', name='Rice', base_price=Decimal('10.00'), stock=5)
+        self.beans = Product.objects.create(sku='CH-2', name='Beans', base_price=Decimal('4.00'))
+        self.oil = Product.objects.create(sku='CH-3', name='Oil', base_price=Decimal('7.00'))
+        self.since = latest_seq()
+
+    def _changes(self, since, **params):
+        resp = self.client.get('/api/catalog/changes/', {'since': since, **params})
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_only_changes_after_since_are_returned_once_per_product(self):
+        self.rice.stock = 4
+        self.rice.save()
+        QuantityPrice.objects.create(product=self.rice, min_qty=10, price=Decimal('9.00'))
+        data = self._changes(self.since)
+        self.assertEqual([r['id'] for r in data['results']], [self.rice.pk])
+        product = data['results'][0]['product']
+        self.assertEqual(product['stock'], 4)
+        self.assertEqual(product['quantity_prices'][0]['price'], '9.00')
+        self.assertFalse(data['has_more'])
+        # مزامنة تانية من next: مفيش جديد
+        again = self._changes(data['next'])
+        self.assertEqual((again['results'], again['next']), ([], data['next']))
+
+    def test_delete_and_deactivate_are_tombstones(self):
+        beans_id = self.beans.pk
+        self.beans.delete()
+        self.oil.active = False
+        self.oil.save()
+        results = self._changes(self.since)['results']
+        self.assertEqual(results, [
+            {'seq': results[0]['seq'], 'id': beans_id, 'deleted': True},
+            {'seq': results[1]['seq'], 'id': self.oil.pk, 'deleted': True},
+        ])
+
+    def test_pages_follow_sequence(self):
+        for product in (self.oil, self.rice, self.beans):
+            product.save()
+        first = self._changes(self.since, limit=2)
+        self.assertTrue(first['has_more'])
+        self.assertEqual([r['id'] for r in first['results']], [self.oil.pk, self.rice.pk])
+        second = self._changes(first['next'], limit=2)
+        self.assertEqual([r['id'] for r in second['results']], [self.beans.pk])
+        self.assertFalse(second['has_more'])
+
+    def test_import_records_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'catalog.csv')
+            with open(path, 'w', encoding='utf-8') as fp:
+                fp.write("sku,stock\nCH-2,30\nCH-3,7\n")
+            call_command('import_catalog', path, stdout=StringIO())
+        changed = set(CatalogChange.objects.filter(seq__gt=self.since).values_list('product_id', flat=True))
+        self.assertEqual(changed, {self.beans.pk, self.oil.pk})
+
+    def test_invalid_since_is_400(self):
+        self.assertEqual(self.client.get('/api/catalog/changes/', {'since': 'x'}).status_code, 400)
+
+    def test_pruned_history_asks_old_cursors_to_resync(self):
+        old = CatalogChange.objects.count()
+        CatalogChange.objects.update(created_at=timezone.now() - timedelta(days=31))
+        self.rice.stock = 4
+        self.rice.save()
+        self.assertEqual(prune_changes(batch_size=2), old)
+
+        resp = self.client.get('/api/catalog/changes/', {'since': 0})
+        self.assertEqual(resp.status_code, 410)
+        self.assertEqual(resp.json()['pruned_through'], self.since)
+        self.assertEqual(resp.json()['latest'], latest_seq())
+        # cursor من بعد الـ watermark بيكمل عادي
+        self.assertEqual([r['id'] for r in self._changes(self.since)['results']], [self.rice.pk])
+
+        # حتى لو كله قديم، آخر سطر بيفضل (latest_seq ما يرجعش لورا)
+        latest = latest_seq()
+        CatalogChange.objects.update(created_at=timezone.now() - timedelta(days=31))
+        out = StringIO()
+        call_command('prune_catalog_changes', '--once', stdout=out)
+        self.assertIn('0 changes pruned', out.getvalue())
+        self.assertEqual(list(CatalogChange.objects.values_list('seq', flat=True)), [latest])
+
+
+class CatalogSnapshotTests(APITestCase):
+    def setUp(self):
+        clear_tier_cache()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'catalog.snap')
+        settings_override = override_settings(CATALOG_SNAPSHOT_PATH=self.path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_snapshot()
+        self.addCleanup(reset_snapshot)
+
+        self.rice = Product.objects.create(sku='SN-1', name='Rice', base_price=Decimal('10.00'), stock=7)
+        for min_qty, max_qty, price in ((10, 49, '9.00'), (50, None, '8.00'), (100, 200, '7.00'), (50, None, '8.50')):
+            QuantityPrice.objects.create(product=self.rice, min_qty=min_qty, max_qty=max_qty, price=Decimal(price))
+        self.oil = Product.objects.create(sku='SN-2', name='Oil', base_price=Decimal('5.25'), active=False)
+
+    def test_prices_match_tier_table(self):
+        build_snapshot()
+        snapshot = get_snapshot()
+        self.assertIsNotNone(snapshot)
+        table = TierTable(self.rice.quantity_prices.values_list('id', 'min_qty', 'max_qty', 'price'))
+        tiers = snapshot.tier_table(self.rice.pk)
+        for qty in (1, 9, 10, 49, 50, 99, 100, 150, 200, 201, 10_000):
+            self.assertEqual(tiers.price_for(qty, self.rice.base_price), table.price_for(qty, self.rice.base_price))
+        self.assertEqual(snapshot.product(self.oil.pk), (self.oil.pk, 'SN-2', False, Decimal('5.25'), 0))
+        self.assertEqual(len(snapshot.tier_table(self.oil.pk)), 0)
+        self.assertIsNone(snapshot.product(10 ** 9))
+
+    def test_pricing_reads_snapshot_without_queries(self):
+        build_snapshot()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.rice.get_price_for_quantity(150), Decimal('7.00'))
+            self.assertEqual(get_tier_tables([self.rice.pk])[self.rice.pk].price_for(60, None), Decimal('8.00'))
+            resp = self.client.get(f'/api/products/{self.rice.pk}/price-for-qty/', {'qty': 50})
+        self.assertEqual(resp.json()['unit_price'], '8.00')
+        # منتج غير نشط: نفس الـ 404 من get_object
+        self.assertEqual(self.client.get(f'/api/products/{self.oil.pk}/price-for-qty/').status_code, 404)
+
+    def test_stale_snapshot_falls_back_until_rebuilt(self):
+        build_snapshot()
+        tier = self.rice.quantity_prices.get(min_qty=100)
+        tier.price = Decimal('6.00')
+        tier.save()
+        self.assertIsNone(get_snapshot())
+        self.assertEqual(self.rice.get_price_for_quantity(150), Decimal('6.00'))
+        build_snapshot()
+        self.assertEqual(get_snapshot().tier_table(self.rice.pk).price_for(150, None), Decimal('6.00'))
+
+    def test_rebuild_replaces_file_atomically(self):
+        build_snapshot()
+        old = get_snapshot()
+        self.rice.stock = 3
+        self.rice.save()
+        build_snapshot()
+        # الـ reader القديم لسه شايف الملف القديم كامل، والجديد بيتفتح من المسار
+        self.assertEqual(old.product(self.rice.pk).stock, 7)
+        self.assertEqual(get_snapshot().product(self.rice.pk).stock, 3)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['catalog.snap'])
+
+    def test_snapshot_built_elsewhere_is_used_without_shared_cache(self):
+        # process الـ build_catalog_snapshot ليه LocMemCache لوحده: الصلاحية مش معتمدة على الكاش
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                                   'LOCATION': 'snapshot-builder'}}):
+            call_command('build_catalog_snapshot', stdout=StringIO())
+        reset_snapshot()
+        cache.clear()
+        snapshot = get_snapshot()
+        self.assertIsNotNone(snapshot)
+        self.assertEqual(snapshot.change_seq, latest_seq())
+
+    def test_change_from_another_process_is_seen_after_check_interval(self):
+        with override_settings(CATALOG_SNAPSHOT_CHECK_MS=60_000):
+            build_snapshot()
+            # سطر CatalogChange من process تاني (من غير record_changes هنا): لسه جوه مدة الفحص
+            CatalogChange.objects.create(product_id=self.rice.pk)
+            self.assertIsNotNone(get_snapshot())
+        with override_settings(CATALOG_SNAPSHOT_CHECK_MS=0):
+            self.assertIsNone(get_snapshot())
+            build_snapshot()
+            self.assertIsNotNone(get_snapshot())
+
+    def test_corrupt_file_is_ignored(self):
+        with open(self.path, 'wb') as fp:
+            fp.write(b'not a snapshot' * 10)
+        self.assertIsNone(get_snapshot())
+        self.assertEqual(self.rice.get_price_for_quantity(60), Decimal('8.00'))
+
+    def test_command_builds_snapshot(self):
+        out = StringIO()
+        call_command('build_catalog_snapshot', stdout=out)
+        self.assertIn('2 products, 4 tiers', out.getvalue())
+        self.assertEqual(len(CatalogSnapshot(self.path)), 2)
+
+
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        cat = Category.objects.create(name='Food')
+        self.grains = SubCategory.objects.create(category=cat, name='Grains')
+        for n in range(5):
+            product = Product.objects.create(sku=f'SF-{n}', name=f'Product {n}', description='وصف طويل ' * 200,
+                                             base_price=Decimal('10.00'), subcategory=self.grains)
+            QuantityPrice.objects.create(product=product, min_qty=10, price=Decimal('9.00'))
+        self.product = product
+
+    def test_fields_prunes_payload_and_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get('/api/products/', {'fields': 'id,base_price,bogus'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(set(resp.json()['results'][0]), {'id', 'base_price'})
+        page_sql = ctx.captured_queries[-1]['sql']
+        self.assertNotIn('"description"', page_sql)
+        self.assertIn('"name"', page_sql)  # لازم للترتيب
+
+    def test_unknown_fields_only_returns_everything(self):
+        resp = self.client.get('/api/products/', {'fields': 'bogus'})
+        self.assertIn('description', resp.json()['results'][0])
+
+    def test_expand_loads_related_in_constant_queries(self):
+        # catalog version + count + الصفحة (مع subcategory و category بـ JOIN) + prefetch للشرائح
+        with self.assertNumQueries(4):
+            resp = self.client.get('/api/products/', {'expand': 'subcategory,quantity_prices',
+                                                      'fields': 'name,subcategory'})
+        row = resp.json()['results'][0]
+        self.assertEqual(set(row), {'name', 'subcategory', 'quantity_prices'})
+        self.assertEqual(row['subcategory']['slug'], 'grains')
+        self.assertEqual(row['subcategory']['category']['name'], 'Food')
+        self.assertEqual(row['quantity_prices'][0]['price'], '9.00')
+
+    def test_detail_fields_and_expand(self):
+        url = f'/api/products/{self.product.pk}/'
+        self.assertEqual(self.client.get(url, {'fields': 'name'}).json(), {'name': 'Product 4'})
+        data = self.client.get(url, {'expand': 'subcategory'}).json()
+        self.assertEqual(data['subcategory']['name'], 'Grains')
+        self.assertEqual(len(data['quantity_prices']), 1)
+
+    def test_detail_etag_depends_on_query(self):
+        url = f'/api/products/{self.product.pk}/'
+        full = self.client.get(url)
+        sparse = self.client.get(url, {'fields': 'name'})
+        self.assertNotEqual(full['ETag'], sparse['ETag'])
+        expanded = self.client.get(url, {'expand': 'subcategory'})
+        self.assertNotIn('Last-Modified', expanded)
+        # تعديل الفئة الفرعية بيغير الـ ETag بتاع الـ expand
+        self.grains.name = 'Cereals'
+        self.grains.save()
+        again = self.client.get(url, {'expand': 'subcategory'}, HTTP_IF_NONE_MATCH=expanded['ETag'])
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['subcategory']['name'], 'Cereals')
+
+
+class FastListTests(APITestCase):
+    def setUp(self):
+        cat = Category.objects.create(name='Food')
+        Category.objects.create(name='Drinks')
+        self.grains = SubCategory.objects.create(category=cat, name='Grains')
+        for n in range(30):
+            Product.objects.create(sku=f'FL-{n:02d}', name=f'منتج {n:02d}', description='سطر\u2028"تاني"',
+                                   base_price=Decimal('1234.5') + n, stock=n,
+                                   subcategory=self.grains if n % 2 else None)
+
+    def _serializer_bytes(self, url, params):
+        from .fastlist import FastListMixin
+        # نفس الـ request من غير الـ fast path ومن غير orjson
+        with mock.patch.object(FastListMixin, 'get_row_encoder', return_value=None), \
+                mock.patch('utils.renderers.orjson', None):
+            resp = self.client.get(url, params)
+        return resp.content
+
+    def assertSameBytes(self, url, params=None):
+        params = params or {}
+        fast = self.client.get(url, params)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, self._serializer_bytes(url, params))
+        return fast
+
+    def test_product_list_is_byte_identical(self):
+        self.assertSameBytes('/api/products/')
+        self.assertSameBytes('/api/products/', {'page': 2})
+        self.assertSameBytes('/api/products/', {'fields': 'id,base_price,subcategory'})
+        first = self.assertSameBytes('/api/products/', {'pagination': 'cursor', 'page_size': 7})
+        self.assertSameBytes('/api/products/', {'cursor': first.json()['next'].split('cursor=')[1].split('&')[0]})
+
+    def test_category_list_is_byte_identical(self):
+        self.assertSameBytes('/api/categories/')
+
+    def test_fast_path_skips_model_instances(self):
+        with mock.patch.object(Product, '__init__', side_effect=AssertionError('model built')):
+            resp = self.client.get('/api/products/')
+        self.assertEqual(len(resp.json()['results']), 20)
+
+    def test_expand_uses_serializers(self):
+        resp = self.client.get('/api/products/', {'expand': 'subcategory'})
+        self.assertEqual(resp.json()['results'][1]['subcategory']['name'], 'Grains')
+
+    def test_renderer_matches_json_renderer(self):
+        from datetime import datetime, timezone as dt_timezone
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from utils.renderers import FastJSONRenderer
+        data = {'price': Decimal('9.50'), 'when': datetime(2024, 1, 2, 3, 4, 5, 678000, tzinfo=dt_timezone.utc),
+                1: 'int key', 'text': 'a\u2028b', 'lazy': gettext_lazy('Hello'), 'ids': {3}, 'big': 2 ** 70}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+@override_settings(CATALOG_RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.product = Product.objects.create(sku='RC-1', name='Cached', base_price=Decimal('3.00'))
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get('/api/products/', {'b': '1', 'a': '2'})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        # الـ HIT بيقرا catalog version بس
+        with self.assertNumQueries(1):
+            second = self.client.get('/api/products/?a=2&b=1')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/products/?a=2&b=1', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+    def test_catalog_changes_invalidate(self):
+        url = f'/api/products/{self.product.pk}/'
+        self.client.get(url)
+        QuantityPrice.objects.create(product=self.product, min_qty=5, price=Decimal('2.50'))
+        resp = self.client.get(url)
+        self.assertEqual(resp['X-Cache'], 'MISS')
+        self.assertEqual(len(resp.json()['quantity_prices']), 1)
+        SubCategory.objects.create(category=Category.objects.create(name='Food'), name='Grains')
+        self.assertEqual(self.client.get('/api/catalog/tree/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/catalog/tree/')['X-Cache'], 'HIT')
+
+    def test_stale_entry_is_served_while_rebuilding(self):
+        from .response_cache import cache_key
+        first = self.client.get('/api/products/')
+        self.product.name = 'Renamed'
+        self.product.save()
+        # process تاني ماسك الـ lock وبيحسب
+        key = cache_key(first.wsgi_request)
+        caches['catalog'].add(key + ':lock', 1)
+        with self.assertNumQueries(1):
+            stale = self.client.get('/api/products/')
+        self.assertEqual((stale['X-Cache'], stale.content), ('STALE', first.content))
+        caches['catalog'].delete(key + ':lock')
+        self.assertIn(b'Renamed', self.client.get('/api/products/').content)
+
+    def test_single_flight_under_concurrent_misses(self):
+        import threading
+        from django.test import RequestFactory
+        from .response_cache import serve
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return HttpResponse(b'{"ok":true}', content_type='application/json')
+
+        request = RequestFactory().get('/api/catalog/tree/', {'single': 'flight'})
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(serve(request, compute))) for _ in range(8)]
+        # الـ threads ما بتشاركش الـ test transaction، فالـ version ثابت هنا بدل ما يقروه من الـ DB
+        with mock.patch('catalog.response_cache.get_catalog_version', return_value=1):
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual({r.content for r in results}, {b'{"ok":true}'})
+        self.assertEqual(sorted(r['X-Cache'] for r in results), ['HIT'] * 7 + ['MISS'])
+
+    def test_changes_feed_and_price_for_qty_are_never_cached(self):
+        for url in ('/api/catalog/changes/?since=0', f'/api/products/{self.product.pk}/price-for-qty/?qty=3'):
+            self.client.get(url)
+            self.assertNotIn('X-Cache', self.client.get(url), url)
+        since = latest_seq()
+        self.product.name = 'Renamed'
+        self.product.save()
+        self.assertEqual(self.client.get('/api/catalog/changes/', {'since': since}).json()['results'][0]['id'],
+                         self.product.pk)
+
+    # settings بتتقري تاني من env فاضي (ومن غير .env المطور)
+    @mock.patch.dict(os.environ, {}, clear=True)
+    @mock.patch('dotenv.load_dotenv')
+    def test_off_by_default_with_locmem(self, load_dotenv):
+        import importlib
+        from config import settings as project_settings
+        importlib.reload(project_settings)
+        self.assertEqual(project_settings.CATALOG_CACHE_BACKEND, project_settings.LOCMEM_CACHE_BACKEND)
+        self.assertFalse(project_settings.CATALOG_RESPONSE_CACHE_ENABLED)
+        with mock.patch.dict(os.environ, {'CATALOG_CACHE_BACKEND': 'django_redis.cache.RedisCache'}):
+            importlib.reload(project_settings)
+            self.assertTrue(project_settings.CATALOG_RESPONSE_CACHE_ENABLED)
+        importlib.reload(project_settings)
+
+    def test_authenticated_and_write_requests_bypass_cache(self):
+        resp = self.client.get('/api/categories/', HTTP_AUTHORIZATION='Bearer nope')
+        self.assertNotIn('X-Cache', resp)
+        self.assertNotIn('X-Cache', self.client.post('/api/products/price-quote/', {'items': [
+            {'product_id': self.product.pk, 'qty': 1}]}, format='json'))
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.rice = Product.objects.create(sku='L-1', name='Rice', base_price=Decimal('1.00'), stock=10)
+        self.oil = Product.objects.create(sku='L-2', name='Oil', base_price=Decimal('1.00'))
+
+    def _at(self, minutes_ago):
+        # الحركات اللي لسه اتكتبت نرجعها لورا في الزمن
+        when = timezone.now() - timedelta(minutes=minutes_ago)
+        StockMovement.objects.filter(created_at__gt=when).update(created_at=when)
+        return when
+
+    def _stock(self, product):
+        product.refresh_from_db()
+        return product.stock
+
+    def test_every_change_is_a_movement_and_cache_follows(self):
+        receive_stock({self.rice.pk: 5, self.oil.pk: 8}, reference='PO-1')
+        set_stock({self.oil.pk: 6})
+        self.assertEqual((self._stock(self.rice), self._stock(self.oil)), (15, 6))
+        self.assertEqual(list(StockMovement.objects.filter(product_id=self.oil.pk).values_list('kind', 'quantity')),
+                         [(StockMovement.RECEIPT, 8), (StockMovement.ADJUSTMENT, -2)])
+        self.assertEqual(ledger_stock([self.rice.pk, self.oil.pk]), {self.rice.pk: 15, self.oil.pk: 6})
+
+    def test_save_records_an_adjustment_instead_of_overwriting(self):
+        stale = Product.objects.get(pk=self.rice.pk)
+        receive_stock({self.rice.pk: 5})
+        # save() كامل من نسخة قديمة ما يمسحش الاستلام اللي حصل بعد ما اتقرت
+        stale.name = 'Rice 5kg'
+        stale.save()
+        self.assertEqual(self._stock(self.rice), 15)
+        # وتغيير stock صريح بيبقى تسوية للرقم الجديد
+        stale.stock = 12
+        stale.save()
+        self.assertEqual(self._stock(self.rice), 12)
+        self.assertEqual(StockMovement.objects.filter(product_id=self.rice.pk).last().quantity, -3)
+        self.assertEqual(stock_cache_drift(), {})
+
+    def test_compaction_folds_into_snapshots_and_keeps_totals(self):
+        receive_stock({self.rice.pk: 5})
+        self._at(10)
+        self.assertEqual(compact(), 1)
+        self.assertEqual(compact(), 0)
+        receive_stock({self.rice.pk: 1, self.oil.pk: 2})
+        self._at(5)
+        self.assertEqual(compact(), 2)
+        receive_stock({self.rice.pk: 4})
+        self.assertEqual(list(StockSnapshot.objects.filter(product_id=self.rice.pk).values_list('quantity', flat=True)),
+                         [15, 16])
+        # snapshot + tail (الحركة الأخيرة لسه ما اتضمتش)
+        with self.assertNumQueries(3):
+            self.assertEqual(ledger_stock([self.rice.pk, self.oil.pk]), {self.rice.pk: 20, self.oil.pk: 2})
+
+    def test_stock_as_of_date(self):
+        start = self._at(60)
+        receive_stock({self.rice.pk: 5})
+        middle = self._at(30)
+        compact()
+        set_stock({self.rice.pk: 3})
+        self._at(10)
+        receive_stock({self.rice.pk: 1})
+        ids = [self.rice.pk]
+        self.assertEqual(stock_as_of(ids, start - timedelta(minutes=1)), {self.rice.pk: 0})
+        self.assertEqual(stock_as_of(ids, start), {self.rice.pk: 10})
+        self.assertEqual(stock_as_of(ids, middle), {self.rice.pk: 15})
+        self.assertEqual(stock_as_of(ids, timezone.now() - timedelta(minutes=5)), {self.rice.pk: 3})
+        self.assertEqual(stock_as_of(ids, timezone.now()), {self.rice.pk: 4})
+
+    def test_drift_is_reported_and_repaired(self):
+        Product.objects.filter(pk=self.rice.pk).update(stock=99)
+        drift = stock_cache_drift()
+        self.assertEqual(drift, {self.rice.pk: (99, 10)})
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('compact_stock_ledger', '--once', '--verify', stdout=out)
+        with self.assertRaises(CommandError):
+            call_command('compact_stock_ledger', '--verify', stdout=out)
+        call_command('compact_stock_ledger', '--once', '--verify', '--repair', '--lag', '0', stdout=out)
+        self.assertEqual(self._stock(self.rice), 10)
+        self.assertEqual(stock_cache_drift(), {})
+
+    def test_repair_resets_warehouse_rows_with_the_cache(self):
+        # الكاش وصف المخزن اتكتبوا من برا السجل مع بعض
+        Product.objects.filter(pk=self.rice.pk).update(stock=99)
+        WarehouseStock.objects.filter(product=self.rice).update(quantity=99)
+        drift = stock_cache_drift()
+        # حركة اتعملت commit بعد حساب drift ما تضيعش
+        receive_stock({self.rice.pk: 2})
+        self.assertEqual(repair_stock_cache(drift), 1)
+        self.assertEqual(self._stock(self.rice), 12)
+        self.assertEqual((stock_cache_drift(), location_drift()), ({}, {}))
+        self.assertEqual(StockMovement.objects.filter(product_id=self.rice.pk).count(), 2)
+
+
+class WarehouseStockTests(TestCase):
+    def setUp(self):
+        self.main = Warehouse.objects.get(is_default=True)
+        self.alex = Warehouse.objects.create(code='ALX', name='Alexandria', city='Alexandria', priority=10)
+        self.giza = Warehouse.objects.create(code='GIZ', name='Giza', city='Giza', priority=20)
+        self.rice = Product.objects.create(sku='W-1', name='Rice', base_price=Decimal('1.00'), stock=10)
+        receive_stock({self.rice.pk: 6}, warehouse_id=self.alex.pk)
+        receive_stock({self.rice.pk: 3}, warehouse_id=self.giza.pk)
+
+    def _locations(self):
+        return dict(WarehouseStock.objects.filter(product=self.rice).values_list('warehouse__code', 'quantity'))
+
+    def test_product_stock_is_the_sum_of_locations(self):
+        self.rice.refresh_from_db()
+        self.assertEqual(self.rice.stock, 19)
+        self.assertEqual(self._locations(), {'MAIN': 10, 'ALX': 6, 'GIZ': 3})
+        self.assertEqual(location_drift(), {})
+
+    def test_pick_prefers_customer_city_then_one_shipment_then_split(self):
+        on_hand = {self.main.pk: 10, self.alex.pk: 6, self.giza.pk: 3}
+        warehouses = active_warehouses()
+        self.assertEqual(pick_locations(3, on_hand, warehouses, ' giza'), [(self.giza.pk, 3)])
+        # جيزة ما تكفيش: شحنة واحدة من المخزن اللي عليه الدور
+        self.assertEqual(pick_locations(5, on_hand, warehouses, 'Giza'), [(self.main.pk, 5)])
+        self.assertEqual(pick_locations(18, on_hand, warehouses, 'Giza'),
+                         [(self.giza.pk, 3), (self.main.pk, 10), (self.alex.pk, 5)])
+        self.assertEqual(sum(q for _, q in pick_locations(50, on_hand, warehouses)), 19)
+
+    def test_total_adjustment_spreads_over_locations(self):
+        # الإجمالي 19 -> 4: النقص بيتوزع بنفس ترتيب التنفيذ (الافتراضي الأول)
+        set_stock({self.rice.pk: 4})
+        self.assertEqual(self._locations(), {'MAIN': 0, 'ALX': 1, 'GIZ': 3})
+        # رقم لمخزن واحد بيغير الإجمالي بالفرق
+        set_stock({self.rice.pk: 5}, warehouse_id=self.giza.pk)
+        self.rice.refresh_from_db()
+        self.assertEqual(self.rice.stock, 6)
+        self.assertEqual(self._locations(), {'MAIN': 0, 'ALX': 1, 'GIZ': 5})
+        self.assertEqual((location_drift(), stock_cache_drift()), ({}, {}))
@@ -9,7 +9,11 @@ router = routers.DefaultRouter()
 router.register(r'products', ProductViewSet, basename='product')
 
 urlpatterns = [
+    # قبل الـ router علشان export.csv ما يتفهمش كـ products/<id>.<format>
+    path('products/export.<str:fmt>', views.ProductExportView.as_view(), name='product-export'),
     path('', include(router.urls)),
+    path('catalog/tree/', views.CategoryTreeView.as_view(), name='catalog-tree'),
+    path('catalog/changes/', views.CatalogChangesView.as_view(), name='catalog-changes'),
     path('categories/',views.CategoryListViews.as_view(),name ='category-list'),
     path('subcategories/', views.SubCategoryListViews.as_view(), name='subcategory-list'),
     path('categories/<int:category_id>/subcategoies/',views.SubCategoryListViews.as_view(),name = 'subcategory-create-list'),
@@ -1,5 +1,6 @@
 from django.shortcuts import render
 # catalog/views.py
+from decimal import Decimal
 
 from rest_framework import viewsets
 from rest_framework.decorators import action
@@ -7,23 +8,76 @@ from rest_framework.response import Response
 from rest_framework import status,serializers
 from rest_framework import generics
 from .models import Product , SubCategory,Category
-from .serializers import ProductListSerializer, ProductDetailSerializer,SubCategorySerializer,CategorySerializer
+from .serializers import ProductListSerializer, ProductDetailSerializer,SubCategorySerializer,CategorySerializer,PriceQuoteSerializer
+from .pricing import get_tier_tables
+from .snapshot import get_snapshot
+from .pagination import CatalogPagination
+from .search import search_products
+from .tree import get_category_tree
+from .conditional import CatalogListETagMixin, ProductETagRetrieveMixin
+from .fastlist import FastListMixin
+from .response_cache import CachedCatalogResponseMixin
+from .export import iter_csv, iter_ndjson
+from .changes import DEFAULT_LIMIT, MAX_LIMIT, CursorTooOld, changes_since, latest_seq
 from rest_framework.permissions import AllowAny
+from rest_framework.views import APIView
+from django.http import StreamingHttpResponse, Http404
 
 
-class CategoryListViews(generics.ListCreateAPIView):
+class CategoryListViews(CachedCatalogResponseMixin, CatalogListETagMixin, FastListMixin, generics.ListCreateAPIView):
     queryset = Category.objects.filter(active =True).order_by('name')
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
+    pagination_class = CatalogPagination
+
+# شجرة الكتالوج كاملة في request واحد (للـ navigation)
+class CategoryTreeView(CachedCatalogResponseMixin, generics.GenericAPIView):
+    """
+    GET /api/catalog/tree/
+    الفئات النشطة + الفئات الفرعية النشطة + عدد المنتجات النشطة لكل عقدة.
+    بتتقري من الكاش، وبتتحسب تاني بس لما الكتالوج يتغير (catalog version).
+    """
+    permission_classes = [AllowAny]
+    pagination_class = None
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_category_tree())
+
+# التغييرات في المنتجات من آخر مزامنة للعميل
+class CatalogChangesView(APIView):
+    """
+    GET /api/catalog/changes/?since=<seq>&limit=<n>
+    العميل يبدأ بـ since=0 ويبعت next في الطلب الجاي لحد ما has_more يبقى false.
+    لو since أقدم من السجل المحفوظ: 410 مع latest، والعميل يعمل sync كامل من الـ export ويكمل من latest.
+    من غير كاش الـ responses: الـ feed لازم يرجع كل تعديل اتعمل commit.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+            if since < 0 or limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({'detail': 'Invalid since or limit parameter'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            entries, next_since, has_more = changes_since(since, limit)
+        except CursorTooOld as e:
+            return Response({'detail': 'Cursor too old, resync from the full export.', 'resync': True,
+                             'pruned_through': e.pruned_through, 'latest': latest_seq()},
+                            status=status.HTTP_410_GONE)
+        return Response({'since': since, 'next': next_since, 'has_more': has_more, 'results': entries})
 
 # قائمة الفئات الداخلية لِـ category معين
-class SubCategoryListViews(generics.ListCreateAPIView):
+class SubCategoryListViews(CachedCatalogResponseMixin, generics.ListCreateAPIView):
     serializer_class = SubCategorySerializer
     permission_classes = [AllowAny]
     
     def get_queryset(self):
         cat_id = self.kwargs.get('category_id')
-        qs = SubCategory.objects.filter(active = True)
+        qs = SubCategory.objects.filter(active = True).select_related('category')
         if cat_id:
             qs = qs.filter(category_id=cat_id)
         return qs.order_by('name')
@@ -44,35 +98,81 @@ class SubCategoryListViews(generics.ListCreateAPIView):
             raise serializers.ValidationError({"category": "Category not found."})
         serializer.save(category=cat)
 
+def filter_product_list(qs, params):
+    """
+    فلاتر قائمة المنتجات المشتركة: category / subcategory و ?q= للبحث النصي (FTS5).
+    مع q الترتيب بيبقى حسب bm25، غير كده حسب الاسم.
+    """
+    # فلترة حسب category أو subcategory
+    cat = params.get('category')
+    sub = params.get('subcategory')
+    if sub:
+        qs = qs.filter(subcategory_id=sub)
+    elif cat:
+        qs = qs.filter(subcategory__category_id=cat)
+    q = (params.get('q') or '').strip()
+    if q:
+        return search_products(qs, q)
+    return qs.order_by('name')
+
 # قائمة المنتجات (قابلة للتصفية عبر query params)
-class ProductListViews(generics.ListAPIView):
+class ProductListViews(CachedCatalogResponseMixin, CatalogListETagMixin, FastListMixin, generics.ListAPIView):
     serializer_class = ProductListSerializer
     permission_classes = [AllowAny]  # التأكد من السماح للجميع برؤية المنتجات
+    pagination_class = CatalogPagination  # ?pagination=cursor لتفعيل الـ keyset
     def get_queryset(self):
-       qs = Product.objects.filter(active=True)
-       # فلترة حسب category أو subcategory
-       cat = self.request.query_params.get('category')
-       sub = self.request.query_params.get('subcategory')
-       if sub:
-           qs =qs.filter(subcategory_id=sub)
-       elif cat:
-           qs =qs.filter(subcategory__category_id=cat)   
-       return qs.order_by('name')
+       qs = filter_product_list(Product.objects.filter(active=True), self.request.query_params)
+       return ProductListSerializer.sparse_queryset(qs, self.request, required=('name',))
+# تصدير الكتالوج النشط كامل (stream) بدل المرور على الصفحات
+class ProductExportView(APIView):
+    """
+    GET /api/products/export.ndjson  أو  /api/products/export.csv
+    """
+    permission_classes = [AllowAny]
+    formats = {
+        'ndjson': (iter_ndjson, 'application/x-ndjson; charset=utf-8'),
+        'csv': (iter_csv, 'text/csv; charset=utf-8'),
+    }
+
+    def get(self, request, fmt):
+        if fmt not in self.formats:
+            raise Http404
+        generate, content_type = self.formats[fmt]
+        response = StreamingHttpResponse(generate(), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="catalog.{fmt}"'
+        return response
+
 # تفاصيل منتج واحد
-class ProductDetailView(generics.RetrieveAPIView):
-    queryset = Product.objects.filter(active=True)
+class ProductDetailView(CachedCatalogResponseMixin, ProductETagRetrieveMixin, generics.RetrieveAPIView):
     permission_classes = [AllowAny]
     serializer_class = ProductDetailSerializer
     lookup_field = 'id'
+
+    def get_queryset(self):
+        return ProductDetailSerializer.sparse_queryset(Product.objects.filter(active=True), self.request)
     
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(CachedCatalogResponseMixin, CatalogListETagMixin, FastListMixin, ProductETagRetrieveMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet للقراءة فقط (list, retrieve) لمنتجات الكتالوج.
     يعمل action فرعي price-for-qty لحساب السعر بناءً على الكمية.
     """
     queryset = Product.objects.filter(active=True)
     permission_classes = [AllowAny]
+    pagination_class = CatalogPagination
     lookup_field = 'id'
+    # الأسعار بتتحسب من الـ snapshot أو LRU الشرائح؛ body متكاش لكل qty كان هيفضل قديم في الـ workers التانية
+    response_cache_skip_actions = ('price_for_qty',)
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action == 'list':
+            # /api/products/ بيوصل هنا (الـ router قبل ProductListViews) فنطبق نفس الفلاتر والبحث
+            qs = filter_product_list(qs, self.request.query_params)
+            # name دايماً للترتيب وللـ cursor في الـ keyset pagination
+            qs = ProductListSerializer.sparse_queryset(qs, self.request, required=('name',))
+        elif self.action == 'retrieve':
+            qs = ProductDetailSerializer.sparse_queryset(qs, self.request)
+        return qs
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -81,7 +181,11 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=True, methods=['get'], url_path='price-for-qty')
     def price_for_qty(self, request, id=None):
-        product = self.get_object()
+        # من الـ snapshot المشترك لو صالح (من غير أي query)، وإلا من الداتابيز زي الأول
+        snapshot = get_snapshot()
+        row = snapshot.product(int(id)) if snapshot is not None and id.isdigit() else None
+        if row is None or not row.active:
+            product = self.get_object()
         qty_param = request.query_params.get('qty', '1')
         try:
             qty = int(qty_param)
@@ -90,11 +194,55 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         except Exception:
             return Response({'detail': 'Invalid qty parameter'}, status=status.HTTP_400_BAD_REQUEST)
 
-        unit_price = product.get_price_for_quantity(qty)
+        if row is not None and row.active:
+            product_id = row.id
+            unit_price = snapshot.tier_table(row.id).price_for(qty, row.base_price)
+        else:
+            product_id = product.id
+            unit_price = product.get_price_for_quantity(qty)
         total = unit_price * qty
         return Response({
-            'product_id': product.id,
+            'product_id': product_id,
             'qty': qty,
             'unit_price': str(unit_price),
             'total_price': str(total),
         })
+
+    @action(detail=False, methods=['post'], url_path='price-quote')
+    def price_quote(self, request):
+        """
+        تسعير سلة كاملة في request واحد:
+        POST /api/products/price-quote/  {"items": [{"product_id": 1, "qty": 10}, ...]}
+        (أو list مباشرة بنفس الشكل). كل المنتجات والشرائح بتتحمل بعدد ثابت من الـ queries.
+        """
+        data = request.data
+        if isinstance(data, list):
+            data = {'items': data}
+        serializer = PriceQuoteSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['items']
+
+        product_ids = {it['product_id'] for it in items}
+        base_prices = dict(
+            self.get_queryset().filter(id__in=product_ids).values_list('id', 'base_price')
+        )
+        missing = sorted(product_ids - base_prices.keys())
+        if missing:
+            return Response({'detail': 'One or more products do not exist.', 'missing': missing},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        tables = get_tier_tables(product_ids)
+        lines = []
+        basket_total = Decimal('0.00')
+        for it in items:
+            pid, qty = it['product_id'], it['qty']
+            unit_price = tables[pid].price_for(qty, base_prices[pid])
+            total = unit_price * qty
+            basket_total += total
+            lines.append({
+                'product_id': pid,
+                'qty': qty,
+                'unit_price': str(unit_price),
+                'total_price': str(total),
+            })
+        return Response({'items': lines, 'total_price': str(basket_total)})
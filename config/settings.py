@@ -70,6 +70,8 @@ INSTALLED_APPS = [
 #AUTH_USER_MODEL = 'accounts.User'
 
 MIDDLEWARE = [
+    # أول واحد علشان الوقت الكلي يشمل باقي الـ middlewares
+    'utils.timing.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -107,10 +109,64 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL: القراية ما بتستناش الكتابة. IMMEDIATE: الـ transaction بتاخد قفل الكتابة من أولها
+            # وتستنى (timeout) بدل ما تفشل بـ "database is locked" لما تحاول تكتب بعد ما قرت
+            # (حجز المخزون في checkout متزامن). القراية الطويلة (snapshot، compaction) بتستخدم
+            # utils.db.read_only_atomic (BEGIN DEFERRED) علشان ما تمسكش القفل ده.
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
 
+# Cache
+# locmem افتراضياً للتطوير؛ مع أكتر من worker اختار backend مشترك (file/redis/...) من الـ env
+# علشان الكاش يبقى واحد في كل الـ workers.
+LOCMEM_CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+CATALOG_CACHE_BACKEND = os.getenv('CATALOG_CACHE_BACKEND', LOCMEM_CACHE_BACKEND)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', 'wholesale-store'),
+    },
+    # responses الكتالوج للزوار (catalog/response_cache.py) في cache لوحده علشان ما يزقوش كاش الشجرة والشرائح بره
+    'catalog': {
+        'BACKEND': CATALOG_CACHE_BACKEND,
+        'LOCATION': os.getenv('CATALOG_CACHE_LOCATION', 'wholesale-store-catalog'),
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+# كاش الـ responses مقفول افتراضياً مع locmem: كل worker كان هيفضل يرجع نسخته لحد ما هو نفسه يحسب تاني
+CATALOG_RESPONSE_CACHE_ENABLED = os.getenv(
+    'CATALOG_RESPONSE_CACHE_ENABLED', '0' if CATALOG_CACHE_BACKEND == LOCMEM_CACHE_BACKEND else '1') == '1'
+
+# ملف الـ catalog snapshot المشترك بين الـ workers (manage.py build_catalog_snapshot)؛ فاضي = مقفول
+CATALOG_SNAPSHOT_PATH = os.getenv('CATALOG_SNAPSHOT_PATH', '')
+# كل worker بيتأكد إن الـ snapshot لسه مطابق لآخر CatalogChange.seq مرة كل المدة دي على الأكتر
+CATALOG_SNAPSHOT_CHECK_MS = int(os.getenv('CATALOG_SNAPSHOT_CHECK_MS', '250'))
+# كاش الشرائح جوه الـ process (catalog/pricing.py) بيشوف تعديلات الـ processes التانية في خلال المدة دي
+CATALOG_TIER_CACHE_CHECK_MS = int(os.getenv('CATALOG_TIER_CACHE_CHECK_MS', '250'))
+
+# utils/timing.py: نسبة الـ requests اللي بيتقاس فيها queries/serializers وبيطلع لها Server-Timing
+# (0 = latency histograms بس)، وحد الـ slow request log، وتوكن اختياري لـ /metrics
+REQUEST_TIMING_SAMPLE_RATE = float(os.getenv('REQUEST_TIMING_SAMPLE_RATE', '0'))
+REQUEST_TIMING_SLOW_MS = float(os.getenv('REQUEST_TIMING_SLOW_MS', '1000'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# مدة حجز المخزون لطلب pending قبل ما release_expired_reservations يرجعه
+STOCK_RESERVATION_TTL_MINUTES = int(os.getenv('STOCK_RESERVATION_TTL_MINUTES', '30'))
+
+# مدة تخزين رد إنشاء الطلب لكل Idempotency-Key قبل ما prune_idempotency_keys يمسحه
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+
+# مدة الاحتفاظ بسجل تغييرات الكتالوج (/api/catalog/changes/) قبل ما prune_catalog_changes يمسحه؛
+# العميل اللي cursor بتاعه أقدم من كده بياخد 410 ويعمل resync من الـ export
+CATALOG_CHANGES_RETENTION_DAYS = int(os.getenv('CATALOG_CHANGES_RETENTION_DAYS', '30'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -163,6 +219,11 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # orjson (لو متسطب) بنفس output بتاع JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'utils.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
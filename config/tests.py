@@ -0,0 +1,377 @@
+"""
+Query budget لكل endpoint في config.urls.
+
+كل endpoint بيتنادى مرتين: على داتا صغيرة وبعد ما الداتا تكبر كذا مرة. لازم:
+- عدد الـ queries <= الـ budget بتاعه، ونفس العدد في المرتين (مش بيكبر مع حجم النتيجة).
+- مفيش full table scan (SCAN من غير index في EXPLAIN QUERY PLAN) على
+  catalog_product / orders_order / orders_orderitem، إلا اللي مكتوب سببه في allowed_scans.
+لو فيه حاجة باظت الـ test بيفشل بـ diff بين الـ budgets والأرقام الفعلية، وتحته الـ SQL.
+
+أي URL جديد لازم يتضاف في ENDPOINTS (أو SKIPPED بسبب)، وإلا test_every_url_is_covered بيفشل.
+"""
+import itertools
+import json
+import re
+import warnings
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from catalog.models import Category, Product, QuantityPrice, SubCategory
+from catalog.pricing import clear_tier_cache
+from orders.models import Order, OrderItem
+from utils.db import read_only_atomic
+from utils.timing import METRICS
+
+WATCHED_TABLES = ('catalog_product', 'orders_order', 'orders_orderitem')
+FULL_SCAN = re.compile(r'^SCAN (%s)(?: AS \w+)?$' % '|'.join(WATCHED_TABLES))
+
+_counter = itertools.count()
+
+
+@dataclass
+class Endpoint:
+    route: str            # الـ pattern زي ما بيطلع من الـ resolver
+    method: str
+    budget: int
+    path: str = None      # الـ URL الفعلي (format فيه {product} / {category} / {order})
+    data: object = None   # dict أو callable(case) للـ POST
+    auth: bool = False
+    status: int = 200
+    allowed_scans: dict = field(default_factory=dict)  # table -> السبب
+
+    def label(self):
+        return f"{self.method} {self.route}"
+
+
+def _register_payload(case):
+    n = next(_counter)
+    return {'username': f'budget{n}', 'email': f'budget{n}@example.com', 'password': 'secret123'}
+
+
+def _order_payload(case):
+    return {'customer_name': 'Budget', 'customer_phone': '0100', 'customer_email': 'b@example.com',
+            'customer_city': 'Cairo', 'customer_address': 'Street',
+            'items': [{'product_id': pid, 'quantity': 5} for pid in case.product_ids]}
+
+
+def _quote_payload(case):
+    return {'items': [{'product_id': pid, 'qty': 12} for pid in case.product_ids]}
+
+
+ENDPOINTS = [
+    Endpoint('metrics', 'GET', 0),
+    # accounts
+    Endpoint('api/accounts/register/', 'POST', 8, data=_register_payload, status=201),
+    Endpoint('api/accounts/login/', 'POST', 1, data=lambda case: {'username': 'buyer', 'password': 'secret123'}),
+    Endpoint('api/accounts/token/refresh/', 'POST', 1),
+    Endpoint('api/accounts/me/', 'GET', 1, auth=True),
+    # catalog
+    Endpoint('api/', 'GET', 0, auth=True),
+    Endpoint('api/products/', 'GET', 3),
+    Endpoint('api/products/<id>/', 'GET', 3, path='api/products/{product}/'),
+    Endpoint('api/products/<id>/price-for-qty/', 'GET', 2, path='api/products/{product}/price-for-qty/?qty=12'),
+    Endpoint('api/products/price-quote/', 'POST', 2, data=_quote_payload),
+    Endpoint('api/products/export.<str:fmt>', 'GET', 2, path='api/products/export.ndjson',
+             allowed_scans={'catalog_product': 'full export walks every active product in pk order'}),
+    Endpoint('api/catalog/tree/', 'GET', 3),
+    Endpoint('api/catalog/changes/', 'GET', 3, path='api/catalog/changes/?since=0'),
+    Endpoint('api/categories/', 'GET', 3),
+    Endpoint('api/subcategories/', 'GET', 2),
+    Endpoint('api/categories/<int:category_id>/subcategoies/', 'GET', 2,
+             path='api/categories/{category}/subcategoies/'),
+    Endpoint('api/categories/<int:category_id>/subcategories/', 'GET', 2,
+             path='api/categories/{category}/subcategories/'),
+    # orders
+    Endpoint('api/orders/', 'GET', 2, auth=True),
+    Endpoint('api/orders/<int:pk>/', 'GET', 2, path='api/orders/{order}/', auth=True),
+    Endpoint('api/orders/create/', 'POST', 8, data=_order_payload, status=201),
+]
+
+# patterns مش محتاجة budget (أو ما بتتوصلش) مع السبب
+SKIPPED = {
+    'admin/': 'Django admin',
+    'api/products/': 'ProductListViews is shadowed by the router list route',
+    'api/products/<int:id>/': 'ProductDetailView is shadowed by the router detail route',
+}
+
+
+def iter_routes(patterns=None, prefix=''):
+    """
+    كل الـ routes النهائية في config.urls كـ نص (من غير format suffix بتاع الـ router).
+    """
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for p in patterns:
+        route = prefix + _route_text(p.pattern)
+        if isinstance(p, URLResolver):
+            if route == 'admin/':
+                yield route
+                continue
+            yield from iter_routes(p.url_patterns, route)
+        elif isinstance(p, URLPattern):
+            if 'format' in p.pattern.regex.groupindex:
+                continue
+            yield route
+
+
+def _route_text(pattern):
+    text = str(pattern)
+    # routes الـ router بتاعة DRF regex: ^products/(?P<id>[^/.]+)/$ -> products/<id>/
+    text = re.sub(r'\(\?P<(\w+)>[^)]*\)', r'<\1>', text)
+    return text.lstrip('^').rstrip('$').replace('\\.', '.')
+
+
+def full_scans(queries):
+    """
+    {table: [sql, ...]} لكل query عملت SCAN من غير index على جدول من WATCHED_TABLES.
+    """
+    found = {}
+    with connection.cursor() as cursor:
+        for q in queries:
+            sql = q['sql']
+            if not re.match(r'\s*(SELECT|UPDATE|DELETE|WITH)\b', sql, re.I):
+                continue
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            for row in cursor.fetchall():
+                match = FULL_SCAN.match(row[-1])
+                if match:
+                    found.setdefault(match.group(1), []).append(sql)
+    return found
+
+
+@override_settings(CATALOG_RESPONSE_CACHE_ENABLED=False, CATALOG_TIER_CACHE_CHECK_MS=60_000)
+class QueryBudgetTests(APITestCase):
+    small = 3
+    growth = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='buyer', password='secret123')
+        cls.category = Category.objects.create(name='Food')
+        cls.subcategory = SubCategory.objects.create(category=cls.category, name='Grains')
+
+    def setUp(self):
+        self.product_ids = []
+        self.order_ids = []
+        self.grow(self.small)
+
+    def grow(self, n):
+        """
+        بيزود منتجات (بشرائح) وفئات فرعية وطلبات بأصناف، بـ bulk علشان الـ setup نفسه يبقى سريع.
+        """
+        start = Product.objects.count()
+        products = Product.objects.bulk_create([
+            Product(sku=f'QB-{start + i}', name=f'Budget product {start + i}', base_price=Decimal('10.00'),
+                    stock=1000, subcategory=self.subcategory)
+            for i in range(n)
+        ])
+        QuantityPrice.objects.bulk_create([
+            QuantityPrice(product=p, min_qty=q, price=Decimal('9.00') - q // 10)
+            for p in products for q in (10, 20, 30)
+        ])
+        SubCategory.objects.bulk_create([
+            SubCategory(category=self.category, name=f'Sub {start + i}', slug=f'sub-{start + i}') for i in range(n)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(user=self.user, customer_name='Buyer', total=Decimal('50.00')) for _ in range(n)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=o, product=p, quantity=5, unit_price=Decimal('10.00'))
+            for o in orders for p in products
+        ])
+        self.product_ids += [p.pk for p in products]
+        self.order_ids += [o.pk for o in orders]
+
+    def call(self, endpoint):
+        with warnings.catch_warnings():
+            # الـ SECRET_KEY بتاع التطوير قصير على HMAC؛ مش موضوع الـ test ده
+            warnings.filterwarnings('ignore', module='jwt')
+            return self._call(endpoint)
+
+    def _call(self, endpoint):
+        client = APIClient()
+        if endpoint.auth:
+            client.force_authenticate(self.user)
+        path = '/' + (endpoint.path or endpoint.route).format(
+            product=self.product_ids[0], category=self.category.pk, order=self.order_ids[0])
+        if endpoint.route == 'api/accounts/token/refresh/':
+            client.cookies['refresh_token'] = str(RefreshToken.for_user(self.user))
+        data = endpoint.data(self) if callable(endpoint.data) else endpoint.data
+
+        # كاش الشرائح و catalog version بيتمسحوا علشان نقيس الحالة الباردة
+        clear_tier_cache()
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            if endpoint.method == 'GET':
+                resp = client.get(path)
+            else:
+                resp = client.post(path, data, format='json')
+            if resp.streaming:
+                b''.join(resp.streaming_content)
+        self.assertEqual(resp.status_code, endpoint.status, f"{endpoint.label()}: {getattr(resp, 'data', '')}")
+        return ctx.captured_queries
+
+    def describe(self, endpoint, small, large, scans):
+        """
+        سطر الـ endpoint في الـ diff: لو كله تمام بيطابق expected بالظبط.
+        """
+        counts = (f"<= {endpoint.budget} queries" if max(len(small), len(large)) <= endpoint.budget
+                  else f"{len(small)}/{len(large)} queries (budget {endpoint.budget})")
+        growth = 'flat' if len(large) <= len(small) else f"grows {len(small)} -> {len(large)}"
+        scans = ', '.join(f"SCAN {t}" for t in sorted(scans)) or 'no full scans'
+        return f"{endpoint.label():<58} {counts}, {growth}, {scans}"
+
+    def test_every_url_is_covered(self):
+        covered = {e.route for e in ENDPOINTS} | set(SKIPPED)
+        self.assertEqual(sorted(set(iter_routes()) - covered), [],
+                         "new URL without a query budget: add it to ENDPOINTS in config/tests.py")
+
+    def test_query_budgets(self):
+        runs = {}
+        for endpoint in ENDPOINTS:
+            runs[endpoint.label()] = [self.call(endpoint)]
+        self.grow(self.small * self.growth)
+        for endpoint in ENDPOINTS:
+            runs[endpoint.label()].append(self.call(endpoint))
+
+        expected, actual, details = [], [], []
+        for endpoint in ENDPOINTS:
+            small, large = runs[endpoint.label()]
+            scans = {t: sqls for t, sqls in full_scans(small + large).items() if t not in endpoint.allowed_scans}
+            expected.append(f"{endpoint.label():<58} <= {endpoint.budget} queries, flat, no full scans")
+            line = self.describe(endpoint, small, large, scans)
+            actual.append(line)
+            if line != expected[-1]:
+                sql = '\n'.join(f"    {n}. {q['sql']}" for n, q in enumerate(large, 1))
+                details.append(f"{endpoint.label()} ({len(large)} queries on the larger dataset):\n{sql}")
+                for table, sqls in scans.items():
+                    details.append(f"  full scan on {table}:\n" + '\n'.join(f"    {s}" for s in sorted(set(sqls))))
+        self.maxDiff = None
+        self.assertEqual('\n'.join(actual), '\n'.join(expected), '\n\n' + '\n\n'.join(details))
+
+
+def server_timing(response):
+    """
+    {'db': (ms, desc), ...} من header الـ Server-Timing.
+    """
+    spans = {}
+    for part in response['Server-Timing'].split(', '):
+        name, *params = part.split(';')
+        values = dict(p.split('=', 1) for p in params)
+        spans[name] = (float(values['dur']), values.get('desc', '').strip('"'))
+    return spans
+
+
+@override_settings(CATALOG_RESPONSE_CACHE_ENABLED=False)
+class RequestTimingTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='buyer', password='secret123')
+        cls.product = Product.objects.create(sku='T-1', name='Rice', base_price=Decimal('10.00'), stock=100)
+        QuantityPrice.objects.create(product=cls.product, min_qty=10, price=Decimal('9.00'))
+
+    def setUp(self):
+        for metric in METRICS:
+            metric.clear()
+        clear_tier_cache()
+
+    def requests(self):
+        """
+        CreateOrderView والكتالوج و views الـ JWT.
+        """
+        login = self.client.post('/api/accounts/login/', {'username': 'buyer', 'password': 'secret123'},
+                                 format='json')
+        return {
+            'login': login,
+            'refresh': self.client.post('/api/accounts/token/refresh/'),
+            'product-list': self.client.get('/api/products/'),
+            'product-detail': self.client.get(f'/api/products/{self.product.pk}/'),
+            'order-create': self.client.post('/api/orders/create/', {
+                'customer_name': 'A', 'customer_phone': '1', 'customer_email': 'a@example.com',
+                'customer_city': 'Cairo', 'customer_address': 'x',
+                'items': [{'product_id': self.product.pk, 'quantity': 12}]}, format='json'),
+        }
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0, REQUEST_TIMING_SLOW_MS=60_000)
+    def test_sampled_requests_get_server_timing(self):
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', module='jwt')
+            responses = self.requests()
+        for name, resp in responses.items():
+            self.assertLess(resp.status_code, 400, name)
+            spans = server_timing(resp)
+            self.assertEqual(set(spans), {'db', 'serialize', 'view', 'render', 'total'}, name)
+            self.assertLessEqual(spans['db'][0], spans['total'][0], name)
+            self.assertLessEqual(spans['view'][0], spans['total'][0], name)
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(f'/api/products/{self.product.pk}/')
+        self.assertEqual(server_timing(resp)['db'][1], f"{len(ctx.captured_queries)} queries")
+        self.assertGreater(server_timing(resp)['serialize'][0], 0)
+        # الـ fast list path (values_list + RowEncoder) بيتحسب serialize برضه
+        self.assertGreater(server_timing(self.client.get('/api/products/'))['serialize'][0], 0)
+
+    def test_unsampled_requests_only_feed_the_histogram(self):
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', module='jwt')
+            responses = self.requests()
+        for resp in responses.values():
+            self.assertFalse(resp.has_header('Server-Timing'))
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_count{route="product-detail",method="GET",status="2xx"} 1',
+                      body)
+        self.assertIn('http_request_duration_seconds_bucket{route="order-create",method="POST",status="2xx",le="+Inf"} 1',
+                      body)
+        self.assertIn('route="login",method="POST"', body)
+        self.assertIn('route="token_refresh",method="POST"', body)
+        # الـ queries بتتعد للـ requests المتاخدة sample بس
+        self.assertNotIn('http_request_db_queries_count', body)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0, REQUEST_TIMING_SLOW_MS=0)
+    def test_slow_requests_are_logged_with_top_queries(self):
+        with self.assertLogs('utils.timing', 'WARNING') as logs:
+            self.client.get(f'/api/products/{self.product.pk}/')
+        payload = json.loads(logs.records[0].getMessage())
+        self.assertEqual(payload['event'], 'slow_request')
+        self.assertEqual(payload['route'], 'product-detail')
+        self.assertEqual(payload['status'], 200)
+        self.assertGreater(payload['queries'], 0)
+        self.assertTrue(payload['top_queries'])
+        self.assertIn('catalog_product', ' '.join(q['sql'] for q in payload['top_queries']))
+        self.assertEqual(logs.records[0].request_timing, payload)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        resp = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class ReadOnlyAtomicTests(TransactionTestCase):
+    # من غير transaction الـ test، علشان نشوف الـ BEGIN الحقيقي
+    def _begins(self, block):
+        with CaptureQueriesContext(connection) as ctx, block():
+            Product.objects.count()
+            with transaction.atomic():
+                Product.objects.count()
+        return [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('BEGIN')]
+
+    def test_reads_do_not_take_the_write_lock(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite transaction modes')
+        self.assertEqual(self._begins(read_only_atomic), ['BEGIN DEFERRED'])
+        # atomic() العادي بعده لسه بياخد قفل الكتابة
+        self.assertEqual(self._begins(transaction.atomic), ['BEGIN IMMEDIATE'])
@@ -17,9 +17,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path , include
 from catalog.views import CategoryListViews, SubCategoryListViews
+from utils.timing import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/accounts/', include('accounts.urls')),     # <-- اضافه هنا
     path('api/', include('catalog.urls')),
     path('api/orders/', include('orders.urls')),
@@ -3,7 +3,8 @@ from django.contrib import admin
 from django.db import transaction
 from django.contrib import messages
 
-from .models import Order, OrderItem
+from .models import Order, OrderItem, SheetExportOutbox
+from .fulfilment import fulfil_orders
 
 # نضيف Action لـ Mark as Confirmed
 def mark_as_confirmed(modeladmin, request, queryset):
@@ -30,24 +31,15 @@ mark_as_confirmed.short_description = "Mark selected orders as Confirmed"
 
 # نضيف Action لـ Mark as Fulfilled (خصم المخزون)
 def mark_as_fulfilled(modeladmin, request, queryset):
-    success = 0
-    failed = 0
-    for order in queryset:
-        try:
-            with transaction.atomic():
-                if order.status == 'fulfilled':
-                    continue  # إذا كانت الحالة Fulfilled، لا نقوم بأي تغيير
-                order.status = 'fulfilled'  # نغيّر الحالة إلى "Fulfilled"
-                order.save()  # سيتم خصم المخزون هنا باستخدام الـ signals
-                success += 1
-        except Exception as e:
-            failed += 1
-            messages.error(request, f"Failed to fulfill order {order.pk}: {e}")
+    # خصم جماعي: تجميع الكميات لكل منتج + UPDATE set-based بدل save() لكل طلب
+    try:
+        success = fulfil_orders(queryset)
+    except Exception as e:
+        messages.error(request, f"Failed to fulfill selected orders: {e}")
+        return
 
     if success:
         messages.success(request, f"Successfully marked {success} orders as fulfilled.")
-    if failed:
-        messages.error(request, f"{failed} orders failed to be fulfilled.")
 
 mark_as_fulfilled.short_description = "Mark selected orders as Fulfilled (deduct stock)"
 
@@ -68,3 +60,9 @@ class OrderAdmin(admin.ModelAdmin):
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('id', 'order', 'product', 'quantity', 'unit_price', 'created_at')
     search_fields = ('product__name',)
+
+@admin.register(SheetExportOutbox)
+class SheetExportOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = ('row', 'last_error', 'created_at', 'sent_at')
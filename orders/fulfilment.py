@@ -0,0 +1,116 @@
+# orders/fulfilment.py
+"""
+تنفيذ (fulfil) الطلبات وخصم المخزون بعمليات set-based.
+
+بدل save() لكل طلب و product.save() لكل سطر، بنجمع الكميات المطلوبة لكل منتج
+على كل الطلبات المختارة، ونكتب حركة خروج لكل (طلب، منتج، مخزن) في سجل المخزون (catalog.inventory)
+— المخزن بيتختار لكل سطر حسب customer_city — مع UPDATE ... SET stock = stock - x, reserved = reserved - y لكل دفعة منتجات، ونقلب الحالة بـ UPDATE واحد.
+الطلبات المحجوزة (orders.reservations) الحجز بتاعها بيتحول لخصم؛ القديمة أو اللي حجزها اتحرر بتتحجز تاني
+بالـ UPDATE الشرطي (stock - reserved >= qty) الأول، واللي المتاح ما يكفيهوش بيترفض ويفضل pending.
+المخازن الموقفة (Warehouse.active=False) محسوبة في Product.stock بس ما بنشحنش منها: الطلب اللي
+المخازن النشطة ما تغطيهوش بيترفض هو كمان (مع warning بالعجز) بدل ما يتخصم جزء منه.
+نفس الدالة deduct_stock_for_orders بيستخدمها الـ signal لما طلب واحد يتحول لـ fulfilled.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Sum
+
+from catalog.cache import bump_catalog_version
+from catalog.changes import record_changes
+from catalog.inventory import active_warehouses, apply_movements, locked_locations, pick_locations
+from catalog.models import StockMovement
+from .models import Order, OrderItem
+from .reservations import claim_orders, reserve_orders
+
+logger = logging.getLogger(__name__)
+
+
+def order_lines(order_ids):
+    """
+    [(order_id, product_id, qty)] مرتبة بالطلب، مجمعة لو المنتج متكرر في نفس الطلب (query واحدة).
+    """
+    return list(OrderItem.objects.filter(order_id__in=order_ids)
+                .values('order_id', 'product_id').annotate(qty=Sum('quantity'))
+                .order_by('order_id', 'product_id').values_list('order_id', 'product_id', 'qty'))
+
+
+def deduct_stock_for_orders(order_ids):
+    """
+    يخصم مخزون الطلبات اللي في order_ids ولسه ما اتخصمتش. الطلبات اللي مش محجوزة بتتحجز الأول،
+    فالخصم دايماً من الحجز ومفيش reserved > stock.
+    الطلب اللي المخازن النشطة ما تكفيش سطوره (Product.stock فيه مخازن موقفة) بيترفض ويفضل محجوز.
+    يرجع الـ ids اللي اترفضت (ما اتخصمتش وحالتها زي ما هي).
+    """
+    refused = reserve_orders(order_ids)
+    if refused:
+        logger.warning("Orders %s refused: not enough available stock.", refused)
+    held = list(Order.objects.filter(pk__in=order_ids, stock_status=Order.STOCK_RESERVED)
+                .select_for_update().order_by().values_list('pk', flat=True))
+    lines = [line for line in order_lines(held) if line[2]]
+
+    # مخزون المخازن مقفول لحد آخر الـ transaction: الحركة لازم تبقى الكمية اللي خرجت فعلاً ومن أنهي مخزن
+    on_hand = locked_locations({pid for _, pid, _ in lines})
+    cities = dict(Order.objects.filter(pk__in=held).values_list('pk', 'customer_city'))
+    warehouses = active_warehouses()
+    by_order = {}
+    for order_id, pid, qty in lines:
+        by_order.setdefault(order_id, []).append((pid, qty))
+    movements, required, unshipped = [], {}, []
+    for order_id, order_items in by_order.items():
+        picked, short = [], {}
+        for pid, qty in order_items:
+            locations = on_hand.setdefault(pid, {})
+            picks = pick_locations(qty, locations, warehouses, cities.get(order_id))
+            for wid, taken in picks:
+                locations[wid] -= taken
+            picked.append((pid, qty, picks))
+            missing = qty - sum(taken for _, taken in picks)
+            if missing:
+                short[pid] = missing
+        if short:
+            # الطلب كله بيترفض ونرجع اللي اتاخد منه للمخازن
+            for pid, _, picks in picked:
+                for wid, taken in picks:
+                    on_hand[pid][wid] += taken
+            unshipped.append(order_id)
+            logger.warning("Order %s refused: active warehouses are short %s.", order_id, short)
+            continue
+        for pid, qty, picks in picked:
+            required[pid] = required.get(pid, 0) + qty
+            movements.extend(StockMovement(product_id=pid, warehouse_id=wid, kind=StockMovement.FULFILMENT,
+                                           quantity=-taken, reference=f'order:{order_id}') for wid, taken in picks)
+
+    # نقلب الحالة (مشروطة بالحالة القديمة) علشان نفس الطلب ما يتخصمش مرتين
+    claim_orders(sorted(set(held) - set(unshipped)), Order.STOCK_RESERVED, Order.STOCK_DEDUCTED,
+                 reserved_until=None)
+    refused += unshipped
+    if not required:
+        return refused
+    # الكمية كلها محجوزة، فبتخرج من reserved مع خصمها من stock
+    apply_movements(movements, reserved=required)
+
+    # update() ما بيبعتش signals، فنبلغ الكتالوج بنفسنا (delta feed / ETag / كاش)
+    record_changes(list(required))
+    bump_catalog_version()
+    return refused
+
+
+@transaction.atomic
+def fulfil_orders(queryset):
+    """
+    يحول كل الطلبات في queryset (غير المنفذة) لـ fulfilled ويخصم مخزونها.
+    الطلبات اللي مخزونها ما يكفيش بتفضل على حالتها. يرجع عدد الطلبات اللي اتنفذت.
+    """
+    order_ids = list(
+        queryset.exclude(status=Order.STATUS_FULFILLED)
+        .select_for_update().order_by().values_list('pk', flat=True)
+    )
+    if not order_ids:
+        return 0
+
+    refused = set(deduct_stock_for_orders(order_ids))
+    updated = (Order.objects.filter(pk__in=[pk for pk in order_ids if pk not in refused])
+               .update(status=Order.STATUS_FULFILLED))
+    logger.info("%d orders fulfilled: stock deducted.", updated)
+    return updated
@@ -0,0 +1,125 @@
+# orders/idempotency.py
+"""
+Idempotency-Key لإنشاء الطلبات.
+
+- العميل بيبعت header Idempotency-Key (UUID مثلاً) ويعيد نفس المفتاح لو الشبكة وقعت.
+- أول request ناجح: المفتاح + hash الـ request + الرد بيتكتبوا في IdempotencyKey جوه نفس transaction الطلب.
+- أي إعادة بعد كده: query واحدة على الـ unique index وبيرجع الرد المحفوظ، من غير منتجات ولا شرائح ولا outbox.
+- طلبين بنفس المفتاح في نفس الوقت: الـ INSERT بتاع التاني بيستنى الأول (قفل الكتابة في SQLite،
+  والـ unique index في Postgres). لو الأول اتحفظ التاني بياخد IntegrityError وبيرجع رده؛ لو رجع (409 مثلاً)
+  التاني بيكمل عادي. فمفيش حالة "in progress" ظاهرة لحد برة الـ transaction.
+- الردود الفاشلة (400 / 409) ما بتتحفظش، فالإعادة بتتنفذ من الأول.
+- prune_expired_keys بيمسح اللي خلصت مدته على دفعات (manage.py prune_idempotency_keys).
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class InvalidIdempotencyKey(Exception):
+    pass
+
+
+class KeyAlreadyUsed(Exception):
+    """
+    مفتاح اتحفظ من request تاني خلص قبلنا (أو لسه مخلص وإحنا مستنيين قفله).
+    """
+
+
+def key_ttl():
+    return timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+class IdempotentRequest:
+    """
+    المفتاح والـ hash بتوع request واحد.
+    """
+
+    def __init__(self, request, key):
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise InvalidIdempotencyKey(f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters.")
+        user = request.user
+        self.scope = f'user:{user.pk}' if user.is_authenticated else 'anon'
+        self.key = key
+        body = json.dumps(request.data, sort_keys=True, separators=(',', ':'), default=str)
+        self.request_hash = hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def from_request(cls, request):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        return None if key is None else cls(request, key)
+
+    def stored_response(self):
+        """
+        الرد المحفوظ لو المفتاح اتستخدم قبل كده (query واحدة)، أو None لو لازم نعمل الطلب.
+        المفتاح اللي مدته خلصت بيتمسح هنا علشان الـ INSERT ما يخبطش فيه.
+        """
+        record = IdempotencyKey.objects.filter(scope=self.scope, key=self.key).first()
+        if record is None:
+            return None
+        if record.expires_at <= timezone.now():
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=timezone.now()).delete()
+            return None
+        return self.replay(record)
+
+    def replay(self, record):
+        if record.request_hash != self.request_hash:
+            return Response({'detail': f'{IDEMPOTENCY_HEADER} was already used with a different request.'},
+                            status=422)
+        return Response(record.response_body, status=record.response_status,
+                        headers={'Idempotent-Replayed': 'true'})
+
+    def claim(self):
+        """
+        بيحجز المفتاح جوه transaction الطلب قبل أي شغل على المنتجات. لازم يتنادي جوه atomic:
+        KeyAlreadyUsed بيطلع منه والـ transaction كلها بترجع، فمش محتاجين savepoint.
+        """
+        try:
+            return IdempotencyKey.objects.create(
+                scope=self.scope, key=self.key, request_hash=self.request_hash,
+                expires_at=timezone.now() + key_ttl())
+        except IntegrityError:
+            raise KeyAlreadyUsed(self.key)
+
+    def complete(self, record, order, response):
+        record.order = order
+        record.response_status = response.status_code
+        record.response_body = response.data
+        record.save(update_fields=['order', 'response_status', 'response_body'])
+
+    def reused_response(self):
+        """
+        الرد بعد KeyAlreadyUsed: الـ transaction بتاعتنا رجعت، والتانية اتحفظت خلاص.
+        """
+        record = IdempotencyKey.objects.filter(scope=self.scope, key=self.key).first()
+        if record is None:
+            # اتمسح بين الـ IntegrityError والقراية (prune): العميل يعيد
+            return Response({'detail': 'A request with this key is being processed, retry.'}, status=409,
+                            headers={'Retry-After': '1'})
+        return self.replay(record)
+
+
+def prune_expired_keys(now=None, batch_size=500):
+    """
+    يمسح المفاتيح اللي مدتها خلصت على دفعات (DELETE ... WHERE id IN (...)) ويرجع العدد.
+    """
+    now = now or timezone.now()
+    total = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=now)
+                   .order_by().values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        # مفيش FK بتشاور على IdempotencyKey ولا signals، فـ delete() هنا DELETE واحد من غير collector
+        total += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,252 @@
+# orders/management/commands/bench_endpoints.py
+"""
+Benchmark للـ endpoints الحقيقية (عن طريق Django test client، من غير شبكة) على الداتا الموجودة،
+ويفضل تكون متولدة بـ seed_bench. النتيجة JSON فيها لكل سيناريو p50/p95/p99 و throughput
+وعدد الـ queries لكل request، فتتحفظ وتتقارن بين commits بـ --compare.
+
+الكتابة (طلبات، fulfilment، ...) بتحصل جوه transaction بترجع في الآخر فالداتا ما بتتغيرش بين المرات.
+"""
+import json
+import logging
+import random
+import statistics
+import subprocess
+import time
+import warnings
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from catalog.management.commands._bench import rolled_back
+from catalog.models import Category, Product
+from orders.models import Order
+from .seed_bench import BENCH_PASSWORD, BENCH_USER_PREFIX
+
+SCENARIOS = ('browse', 'quote', 'order', 'login', 'refresh', 'fulfil')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(timings, queries, errors, elapsed):
+    ms = sorted(t * 1000 for t in timings)
+    return {
+        'requests': len(ms),
+        'errors': errors,
+        'p50_ms': round(percentile(ms, 50), 3) if ms else None,
+        'p95_ms': round(percentile(ms, 95), 3) if ms else None,
+        'p99_ms': round(percentile(ms, 99), 3) if ms else None,
+        'mean_ms': round(statistics.fmean(ms), 3) if ms else None,
+        'throughput_rps': round(len(ms) / elapsed, 1) if elapsed else None,
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+        'max_queries': max(queries) if queries else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Drive the real API endpoints and report p50/p95/p99, throughput and queries per request as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help='Requests per scenario.')
+        parser.add_argument('--auth-requests', type=int, default=20,
+                            help='Requests for login (password hashing is deliberately slow).')
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                            help='Run only these scenarios (repeatable). Default: all.')
+        parser.add_argument('--no-response-cache', action='store_true',
+                            help='Disable the anonymous catalog response cache.')
+        parser.add_argument('--output', help='Write the JSON report to this file as well.')
+        parser.add_argument('--compare', help='Previous JSON report to diff against.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **opts):
+        self.rnd = random.Random(opts['seed'])
+        self.product_ids = list(Product.objects.filter(active=True).values_list('pk', flat=True)[:50_000])
+        self.category_ids = list(Category.objects.values_list('pk', flat=True)[:1000])
+        self.user = (get_user_model().objects.filter(username__startswith=BENCH_USER_PREFIX)
+                     .order_by('pk').first())
+        if not self.product_ids:
+            raise CommandError("No products: run manage.py seed_bench first.")
+
+        report = {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'database': connection.vendor,
+            'response_cache': not opts['no_response_cache'],
+            'dataset': {
+                'products': Product.objects.count(),
+                'orders': Order.objects.count(),
+                'users': get_user_model().objects.count(),
+            },
+            'scenarios': {},
+        }
+        # تحذيرات المخزون السالب في الـ fulfilment بتغرق الـ output وبتبطّأ القياس
+        logging.getLogger('orders.fulfilment').setLevel(logging.ERROR)
+        for name in opts['scenario'] or SCENARIOS:
+            count = opts['auth_requests'] if name == 'login' else opts['requests']
+            caches['catalog'].clear()
+            with override_settings(CATALOG_RESPONSE_CACHE_ENABLED=not opts['no_response_cache']), \
+                    warnings.catch_warnings(), rolled_back():
+                # المفتاح القصير بتاع التطوير بيطلع تحذير مع كل توكن
+                warnings.filterwarnings('ignore', module='jwt')
+                report['scenarios'][name] = self.run_scenario(name, count, opts['warmup'])
+            self.stderr.write(self.format_line(name, report['scenarios'][name]))
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if opts['output']:
+            with open(opts['output'], 'w') as fp:
+                fp.write(output + '\n')
+        if opts['compare']:
+            with open(opts['compare']) as fp:
+                self.compare(json.load(fp), report)
+
+    def format_line(self, name, s):
+        if not s['requests']:
+            return f"{name:<8} skipped"
+        return (f"{name:<8} p50 {s['p50_ms']:8.2f}ms  p95 {s['p95_ms']:8.2f}ms  p99 {s['p99_ms']:8.2f}ms  "
+                f"{s['throughput_rps']:8.1f} req/s  {s['queries_per_request']:5.1f} q/req  errors {s['errors']}")
+
+    def compare(self, old, new):
+        self.stderr.write(f"\ncompared with {old.get('revision')} ({old.get('timestamp')}):")
+        for name, s in new['scenarios'].items():
+            before = old.get('scenarios', {}).get(name)
+            if not before or not s['requests'] or not before.get('requests'):
+                continue
+            self.stderr.write(
+                f"{name:<8} p95 {before['p95_ms']:8.2f} -> {s['p95_ms']:8.2f}ms ({self.change(before['p95_ms'], s['p95_ms'])})  "
+                f"throughput {self.change(before['throughput_rps'], s['throughput_rps'])}  "
+                f"q/req {before['queries_per_request']} -> {s['queries_per_request']}")
+
+    @staticmethod
+    def change(before, after):
+        if not before:
+            return 'n/a'
+        return f"{(after - before) / before * 100:+.1f}%"
+
+    def run_scenario(self, name, count, warmup):
+        step = getattr(self, f'step_{name}')
+        setup = getattr(self, f'setup_{name}', None)
+        state = setup() if setup else None
+        if state is False:
+            return summarize([], [], 0, 0)
+        for _ in range(warmup):
+            step(state)
+
+        timings, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as ctx:
+                t0 = time.perf_counter()
+                resp = step(state)
+                if resp.streaming:
+                    b''.join(resp.streaming_content)
+                timings.append(time.perf_counter() - t0)
+            queries.append(len(ctx.captured_queries))
+            if resp.status_code >= 400:
+                errors += 1
+        return summarize(timings, queries, errors, time.perf_counter() - started)
+
+    def client(self, user=None):
+        client = Client(SERVER_NAME='localhost')
+        if user is not None:
+            client.force_login(user)
+        return client
+
+    def items(self, key):
+        return [{'product_id': pid, key: self.rnd.randint(1, 300)}
+                for pid in self.rnd.sample(self.product_ids, min(5, len(self.product_ids)))]
+
+    # catalog browse: خليط صفحات الكتالوج زي الزوار
+    def setup_browse(self):
+        return self.client()
+
+    def step_browse(self, client):
+        roll = self.rnd.random()
+        if roll < 0.4:
+            return client.get(f'/api/products/{self.rnd.choice(self.product_ids)}/')
+        if roll < 0.6:
+            return client.get('/api/products/', {'page': self.rnd.randint(1, 50)})
+        if roll < 0.75 and self.category_ids:
+            return client.get('/api/products/', {'category': self.rnd.choice(self.category_ids)})
+        if roll < 0.85:
+            return client.get('/api/catalog/tree/')
+        if roll < 0.95:
+            return client.get('/api/categories/')
+        return client.get(f'/api/products/{self.rnd.choice(self.product_ids)}/price-for-qty/',
+                          {'qty': self.rnd.randint(1, 500)})
+
+    def setup_quote(self):
+        return self.client()
+
+    def step_quote(self, client):
+        return client.post('/api/products/price-quote/', {'items': self.items('qty')},
+                           content_type='application/json')
+
+    def setup_order(self):
+        if self.user is None:
+            return self.client()
+        from rest_framework_simplejwt.tokens import RefreshToken
+        # نفس اللي العميل الحقيقي بيبعته: access token في Authorization
+        token = RefreshToken.for_user(self.user).access_token
+        return Client(SERVER_NAME='localhost', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def step_order(self, client):
+        return client.post('/api/orders/create/', {
+            'customer_name': 'Bench', 'customer_phone': '0100000000', 'customer_email': 'bench@example.com',
+            'customer_city': 'Cairo', 'customer_address': 'Bench street', 'items': self.items('quantity'),
+        }, content_type='application/json')
+
+    def setup_login(self):
+        if self.user is None:
+            return False
+        return self.client()
+
+    def step_login(self, client):
+        return client.post('/api/accounts/login/', {'username': self.user.username, 'password': BENCH_PASSWORD},
+                           content_type='application/json')
+
+    def setup_refresh(self):
+        if self.user is None:
+            return False
+        from rest_framework_simplejwt.tokens import RefreshToken
+        client = self.client()
+        client.cookies['refresh_token'] = str(RefreshToken.for_user(self.user))
+        return client
+
+    def step_refresh(self, client):
+        return client.post('/api/accounts/token/refresh/')
+
+    # admin fulfilment: الـ action بتاع الـ admin على دفعة طلبات pending
+    def setup_fulfil(self):
+        admin = get_user_model().objects.create_superuser('bench-admin', 'admin@example.com', BENCH_PASSWORD)
+        pending = list(Order.objects.exclude(status=Order.STATUS_FULFILLED).order_by('pk')
+                       .values_list('pk', flat=True)[:20_000])
+        if not pending:
+            return False
+        return {'client': self.client(admin), 'pending': pending}
+
+    def step_fulfil(self, state):
+        batch, state['pending'] = state['pending'][:20], state['pending'][20:] or state['pending']
+        return state['client'].post('/admin/orders/order/', {
+            'action': 'mark_as_fulfilled', '_selected_action': batch,
+        })
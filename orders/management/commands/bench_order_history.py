@@ -0,0 +1,89 @@
+# orders/management/commands/bench_order_history.py
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from catalog.management.commands._bench import rolled_back, seed_catalog, timed
+from orders.models import Order, OrderItem
+from orders.pagination import OrderHistoryPagination
+from .seed_bench import historical_created_at
+
+
+class Command(BaseCommand):
+    help = "Benchmark /api/orders/ for a customer with many orders: first vs last page, cursor vs OFFSET."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10_000, help="Orders of the measured customer.")
+        parser.add_argument('--others', type=int, default=100_000, help="Orders of other customers.")
+        parser.add_argument('--items', type=int, default=3)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def measure(self, client, url):
+        samples = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as ctx:
+                resp = client.get(url)
+            samples.append((time.perf_counter() - start) * 1000)
+            assert resp.status_code == 200, (url, resp.status_code)
+        return statistics.median(samples), len(ctx.captured_queries)
+
+    def seed_orders(self, users, product_ids, count, rnd):
+        now = timezone.now()
+        for start in range(0, count, 2_000):
+            batch = [Order(user=rnd.choice(users), customer_name='Bench', total=Decimal('10.00'),
+                           created_at=now - timedelta(seconds=rnd.randrange(365 * 86400)))
+                     for _ in range(min(2_000, count - start))]
+            with historical_created_at(Order, OrderItem):
+                created = Order.objects.bulk_create(batch)
+                OrderItem.objects.bulk_create([
+                    OrderItem(order_id=o.pk, product_id=pid, quantity=1, unit_price=Decimal('10.00'),
+                              created_at=o.created_at)
+                    for o in created for pid in rnd.sample(product_ids, self.items)
+                ], batch_size=150)
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts['seed'])
+        self.repeat, self.items = opts['repeat'], opts['items']
+        page_size = opts['page_size']
+        with rolled_back():
+            product_ids = seed_catalog(2_000, min_tiers=0, max_tiers=0)
+            User = get_user_model()
+            customer = User.objects.create_user(username='bench-history')
+            others = [User.objects.create_user(username=f'bench-history-{n}') for n in range(50)]
+            _, seconds = timed(self.seed_orders, [customer], product_ids, opts['orders'], rnd)
+            self.stdout.write(f"seeded {opts['orders']:,} orders for the customer in {seconds:.1f}s")
+            _, seconds = timed(self.seed_orders, others, product_ids, opts['others'], rnd)
+            self.stdout.write(f"seeded {opts['others']:,} orders for other customers in {seconds:.1f}s")
+
+            last_page = opts['orders'] // page_size
+            last = (Order.objects.filter(user=customer).order_by('-created_at', '-id')
+                    .values_list('created_at', 'id')[(last_page - 1) * page_size - 1])
+            cursor = OrderHistoryPagination.encode_cursor(last[0].isoformat(), last[1])
+
+            client = Client(SERVER_NAME='localhost')
+            client.force_login(customer)
+            for label, url in (('cursor, page 1', f'/api/orders/?page_size={page_size}'),
+                               (f'cursor, page {last_page}', f'/api/orders/?page_size={page_size}&cursor={cursor}')):
+                ms, queries = self.measure(client, url)
+                self.stdout.write(f"{label:<28}: {ms:8.2f} ms (median), {queries} queries")
+
+            # query الطلبات لوحدها: keyset من index (user, created_at, id) مقابل OFFSET (زي PageNumberPagination)
+            history = Order.objects.filter(user=customer).order_by('-created_at', '-id')
+            keyset = history.filter(created_at__lte=last[0]).exclude(created_at=last[0], id__gte=last[1])
+            offset = (last_page - 1) * page_size
+            for label, qs in ((f'keyset query, page {last_page}', keyset[:page_size]),
+                              (f'OFFSET query, page {last_page}', history[offset:offset + page_size])):
+                samples = [timed(lambda: list(qs.values_list('pk')))[1] * 1000 for _ in range(self.repeat)]
+                self.stdout.write(f"{label:<28}: {statistics.median(samples):8.2f} ms (median)")
@@ -0,0 +1,56 @@
+# orders/management/commands/export_orders_to_sheets.py
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.outbox import drain_sheet_outbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Drain the Google Sheets order outbox in batches (append_rows) with retry and backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=8)
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when the outbox is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain what is due now and exit.')
+
+    def get_worksheet(self, refresh=False):
+        # import متأخر علشان gspread يتحمّل بس لما الـ worker يشتغل فعلاً
+        from utils.google_sheets import get_worksheet
+        return get_worksheet(refresh=refresh)
+
+    def handle(self, *args, **opts):
+        worksheet = None
+        total_sent = 0
+        while True:
+            try:
+                if worksheet is None:
+                    worksheet = self.get_worksheet(refresh=True)
+                sent, failed = drain_sheet_outbox(
+                    worksheet, batch_size=opts['batch_size'], max_attempts=opts['max_attempts'])
+            except Exception as e:
+                # مشكلة في الاتصال/التفويض نفسه: نعيد بناء الـ client في اللفة الجاية
+                logger.exception("Sheets worker error: %s", e)
+                worksheet = None
+                sent, failed = 0, 0
+                if opts['once']:
+                    raise
+
+            total_sent += sent
+            if failed:
+                # الـ client ممكن يكون بايظ (token/اتصال)، نعيد إنشاءه
+                worksheet = None
+            if sent:
+                self.stdout.write(f"Exported {sent} rows.")
+                continue
+            if opts['once']:
+                break
+            time.sleep(opts['interval'])
+
+        self.stdout.write(f"Done. {total_sent} rows exported.")
@@ -0,0 +1,30 @@
+# orders/management/commands/prune_idempotency_keys.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.idempotency import prune_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses whose TTL has passed, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=3600.0,
+                            help='Seconds between sweeps.')
+        parser.add_argument('--once', action='store_true',
+                            help='Prune what has expired now and exit.')
+
+    def handle(self, *args, **opts):
+        total = 0
+        while True:
+            pruned = prune_expired_keys(batch_size=opts['batch_size'])
+            total += pruned
+            if pruned:
+                self.stdout.write(f"Pruned {pruned} expired idempotency keys.")
+            if opts['once']:
+                break
+            time.sleep(opts['interval'])
+
+        self.stdout.write(f"Done. {total} keys pruned.")
@@ -0,0 +1,30 @@
+# orders/management/commands/release_expired_reservations.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Return the stock held by pending orders whose reservation has expired."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=60.0,
+                            help='Seconds between sweeps.')
+        parser.add_argument('--once', action='store_true',
+                            help='Release what has expired now and exit.')
+
+    def handle(self, *args, **opts):
+        total = 0
+        while True:
+            released = release_expired_reservations(batch_size=opts['batch_size'])
+            total += released
+            if released:
+                self.stdout.write(f"Released {released} expired reservations.")
+            if opts['once']:
+                break
+            time.sleep(opts['interval'])
+
+        self.stdout.write(f"Done. {total} reservations released.")
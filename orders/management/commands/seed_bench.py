@@ -0,0 +1,230 @@
+# orders/management/commands/seed_bench.py
+"""
+بيانات وهمية بحجم الـ production علشان نقيس محلياً (bench_endpoints):
+فئات وفئات فرعية ومنتجات بشرائح، مستخدمين بـ profiles، وطلبات قديمة بأصنافها.
+
+كله bulk_create على دفعات فالذاكرة ثابتة مهما كبر العدد. bulk_create ما بيبعتش signals،
+فالـ profiles بتتعمل هنا بإحصائياتها (orders_count / total_spent) من الطلبات اللي اتولدت،
+ورصيد أول مدة في سجل المخزون بيتكتب مع كل دفعة منتجات، وفي الآخر بنحدث البحث وسجل التغييرات وكاش الأسعار و catalog version بنفسنا زي import_catalog.
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Profile
+from catalog.cache import bump_catalog_version
+from catalog.changes import record_changes
+from catalog.inventory import record_opening_stock
+from catalog.models import Category, Product, QuantityPrice, SubCategory
+from catalog.pricing import clear_tier_cache
+from catalog.search import rebuild_index
+from orders.models import Order, OrderItem
+
+# كل المستخدمين الوهميين بنفس الباسورد (bench_endpoints بيعمل بيه login)
+BENCH_PASSWORD = 'bench-password'
+BENCH_USER_PREFIX = 'bench-user-'
+BENCH_SKU_PREFIX = 'SEED-'
+
+CITIES = ('Cairo', 'Giza', 'Alexandria', 'Mansoura', 'Tanta', 'Asyut', 'Aswan', 'Suez')
+
+
+@contextmanager
+def historical_created_at(*models):
+    """
+    auto_now_add بيكتب الوقت الحالي جوه bulk_create؛ نقفله مؤقتاً علشان الطلبات القديمة تاخد تاريخها.
+    """
+    fields = [m._meta.get_field('created_at') for m in models]
+    for f in fields:
+        f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f in fields:
+            f.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = "Generate a production-sized dataset (catalog, users, historical orders) with bulk_create."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--subcategories', type=int, default=10, help='Per category.')
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--min-tiers', type=int, default=2)
+        parser.add_argument('--max-tiers', type=int, default=8)
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--orders', type=int, default=200_000)
+        parser.add_argument('--max-items', type=int, default=8, help='Max lines per order.')
+        parser.add_argument('--days', type=int, default=365, help='Spread order dates over this many days.')
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def progress(self, label, done, total, started):
+        if self.verbosity > 1 or done == total:
+            rate = done / max(time.perf_counter() - started, 1e-9)
+            self.stdout.write(f"  {label}: {done:,}/{total:,} ({rate:,.0f} rows/s)")
+
+    def handle(self, *args, **opts):
+        self.verbosity = opts['verbosity']
+        self.batch_size = opts['batch_size']
+        self.rnd = random.Random(opts['seed'])
+        started = time.perf_counter()
+
+        subcategory_ids = self.seed_categories(opts['categories'], opts['subcategories'])
+        prices = self.seed_products(opts['products'], subcategory_ids, opts['min_tiers'], opts['max_tiers'])
+        user_ids = self.seed_users(opts['users'])
+        self.seed_orders(opts['orders'], user_ids, prices, opts['max_items'], opts['days'])
+
+        # bulk_create ما بيبعتش signals
+        indexed = rebuild_index()
+        clear_tier_cache()
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded in {time.perf_counter() - started:,.1f}s "
+            f"({indexed:,} products in the search index)."))
+
+    def seed_categories(self, categories, per_category):
+        start = Category.objects.count()
+        with transaction.atomic():
+            created = Category.objects.bulk_create([
+                Category(name=f'Seed category {n}', slug=f'seed-category-{n}')
+                for n in range(start, start + categories)
+            ])
+            subs = SubCategory.objects.bulk_create([
+                SubCategory(category=c, name=f'{c.name} / {m}', slug=f'{c.slug}-{m}')
+                for c in created for m in range(per_category)
+            ])
+        self.stdout.write(f"  categories: {len(created):,}, subcategories: {len(subs):,}")
+        return [s.pk for s in subs] or [None]
+
+    def seed_products(self, products, subcategory_ids, min_tiers, max_tiers):
+        """
+        يرجع {product_id: base_price} للطلبات.
+        """
+        rnd = self.rnd
+        offset = Product.objects.filter(sku__startswith=BENCH_SKU_PREFIX).count()
+        prices = {}
+        started = time.perf_counter()
+        for start in range(0, products, self.batch_size):
+            batch = []
+            for n in range(offset + start, offset + min(start + self.batch_size, products)):
+                batch.append(Product(
+                    sku=f'{BENCH_SKU_PREFIX}{n:09d}',
+                    name=f'Product {rnd.randrange(products * 10):09d}',
+                    description=f'Seeded product {n}',
+                    base_price=Decimal(rnd.randrange(100, 100_000)) / 100,
+                    stock=rnd.randrange(0, 5_000),
+                    # نسبة صغيرة غير نشطة زي الكتالوج الحقيقي
+                    active=rnd.random() > 0.02,
+                    subcategory_id=rnd.choice(subcategory_ids),
+                ))
+            tiers = []
+            with transaction.atomic():
+                created = Product.objects.bulk_create(batch)
+                for p in created:
+                    prices[p.pk] = p.base_price
+                    min_qty, price = 1, p.base_price
+                    for _ in range(rnd.randint(min_tiers, max_tiers)):
+                        min_qty += rnd.randint(5, 50)
+                        price = max(Decimal('0.01'), price - Decimal(rnd.randrange(1, 50)) / 100)
+                        tiers.append(QuantityPrice(product_id=p.pk, min_qty=min_qty, price=price))
+                QuantityPrice.objects.bulk_create(tiers, batch_size=self.batch_size)
+                record_opening_stock(created)
+                record_changes(p.pk for p in created)
+            self.progress('products', len(prices), products, started)
+        return prices
+
+    def seed_users(self, users):
+        User = get_user_model()
+        # hash واحد للكل: make_password لوحده بياخد مئات الـ ms
+        password = make_password(BENCH_PASSWORD)
+        offset = User.objects.filter(username__startswith=BENCH_USER_PREFIX).count()
+        user_ids = []
+        started = time.perf_counter()
+        for start in range(0, users, self.batch_size):
+            with transaction.atomic():
+                created = User.objects.bulk_create([
+                    User(username=f'{BENCH_USER_PREFIX}{n}', email=f'{BENCH_USER_PREFIX}{n}@example.com',
+                         first_name='Bench', last_name=str(n), password=password)
+                    for n in range(offset + start, offset + min(start + self.batch_size, users))
+                ])
+                Profile.objects.bulk_create([
+                    Profile(user_id=u.pk, number_phone=f'010{u.pk:08d}', city=self.rnd.choice(CITIES),
+                            address=f'{u.pk} Bench street')
+                    for u in created
+                ])
+            user_ids.extend(u.pk for u in created)
+            self.progress('users', len(user_ids), users, started)
+        return user_ids
+
+    def seed_orders(self, orders, user_ids, prices, max_items, days):
+        if not orders or not prices:
+            return
+        rnd = self.rnd
+        product_ids = list(prices)
+        now = timezone.now()
+        statuses = [s for s, _ in Order.STATUS_CHOICES]
+        weights = [1, 1, 2, 1, 8]  # أغلب الطلبات القديمة اتنفذت
+        stats = {}  # user_id -> [orders_count, total_spent, last_order_date]
+        done = items_total = 0
+        started = time.perf_counter()
+
+        while done < orders:
+            size = min(self.batch_size, orders - done)
+            batch, lines = [], []
+            for _ in range(size):
+                user_id = rnd.choice(user_ids) if user_ids and rnd.random() > 0.2 else None
+                created_at = now - timedelta(seconds=rnd.randrange(max(days, 1) * 86400))
+                order_lines = []
+                total = Decimal('0.00')
+                for pid in rnd.sample(product_ids, min(rnd.randint(1, max_items), len(product_ids))):
+                    qty = rnd.randint(1, 200)
+                    unit_price = prices[pid]
+                    total += unit_price * qty
+                    order_lines.append((pid, qty, unit_price))
+                status = rnd.choices(statuses, weights)[0]
+                batch.append(Order(
+                    user_id=user_id, status=status, created_at=created_at,
+                    # الطلبات القديمة ما عليهاش حجز؛ المنفذة منها اتخصمت خلاص
+                    stock_status=Order.STOCK_DEDUCTED if status == Order.STATUS_FULFILLED else Order.STOCK_NONE,
+                    total=total, customer_name=f'Customer {user_id or "guest"}',
+                    customer_phone='0100000000', customer_email='customer@example.com',
+                    customer_city=rnd.choice(CITIES), customer_address='Bench street'))
+                lines.append(order_lines)
+                if user_id:
+                    entry = stats.setdefault(user_id, [0, Decimal('0.00'), created_at])
+                    entry[0] += 1
+                    entry[1] += total
+                    entry[2] = max(entry[2], created_at)
+
+            with transaction.atomic(), historical_created_at(Order, OrderItem):
+                created = Order.objects.bulk_create(batch)
+                items = [
+                    OrderItem(order_id=o.pk, product_id=pid, quantity=qty, unit_price=price, created_at=o.created_at)
+                    for o, order_lines in zip(created, lines) for pid, qty, price in order_lines
+                ]
+                OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+            done += size
+            items_total += len(items)
+            self.progress('orders', done, orders, started)
+        self.stdout.write(f"  order items: {items_total:,}")
+
+        # نفس اللي الـ signal في accounts بيعمله لكل طلب، مرة واحدة في الآخر (على دفعات علشان حد الـ params)
+        user_ids = list(stats)
+        for start in range(0, len(user_ids), 500):
+            profiles = list(Profile.objects.filter(user_id__in=user_ids[start:start + 500])
+                            .only('pk', 'user_id', 'orders_count', 'total_spent', 'last_order_date'))
+            for profile in profiles:
+                count, spent, last = stats[profile.user_id]
+                profile.orders_count += count
+                profile.total_spent += spent
+                profile.last_order_date = max(filter(None, (profile.last_order_date, last)))
+            Profile.objects.bulk_update(profiles, ['orders_count', 'total_spent', 'last_order_date'])
@@ -0,0 +1,232 @@
+# orders/management/commands/stress_checkout.py
+"""
+Stress test لحجز المخزون: كذا process بيعملوا checkout في نفس الوقت على منتجات مخزونها قليل
+(ومعاهم إلغاء وتنفيذ وتحرير المنتهي)، وفي الآخر بنتأكد إن مفيش overselling:
+
+- reserved لكل منتج = مجموع كميات الطلبات اللي لسه محجوزة
+- stock = المخزون الأولاني - مجموع كميات الطلبات اللي اتخصمت
+- 0 <= reserved <= stock
+- كاش stock = رصيد سجل المخزون (catalog.inventory) = مجموع المخازن
+- الـ checkouts اللي بتشترك في Idempotency-Key (--duplicate-rate) بيطلع منها طلب واحد بس لكل مفتاح
+
+مدة الحجز قصيرة (--reservation-ttl ثواني) فحجوزات كتير بتخلص وتتحرر والـ checkouts التانية بتاخد المتاح،
+وتنفيذ الطلبات دي بعد كده لازم يحجز تاني أو يترفض من غير ما reserved يعدي stock.
+
+لازم يشتغل على قاعدة ملف (SQLite WAL أو Postgres) مش الـ in-memory بتاعة الـ tests،
+لأن كل worker process ليه connection لوحده. المنتجات بتتعمل بـ sku يبدأ بـ STRESS- وبتتمسح في الآخر.
+"""
+import logging
+import multiprocessing
+import random
+import time
+import warnings
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import F, Sum
+from django.test import Client
+
+from catalog.inventory import location_drift, record_opening_stock, stock_cache_drift
+from catalog.models import Product
+from orders.fulfilment import fulfil_orders
+from orders.models import IdempotencyKey, Order, OrderItem
+from orders.reservations import release_expired_reservations
+from .bench_endpoints import percentile
+
+STRESS_SKU_PREFIX = 'STRESS-'
+STRESS_KEY_PREFIX = 'stress-'
+
+
+def checkout_worker(worker, opts, product_ids, results):
+    # process جديد (fork): الـ connection بيتفتح من أول query
+    rnd = random.Random(opts['seed'] + worker)
+    client = Client(SERVER_NAME='localhost')
+    timings, statuses, cancelled, replayed, keys = [], Counter(), 0, 0, {}
+    shared_keys = max(1, opts['checkouts'] // 5)
+    warnings.filterwarnings('ignore', module='jwt')
+    for n in range(opts['checkouts']):
+        if rnd.random() < opts['duplicate_rate']:
+            # مفاتيح مشتركة بين الـ workers: نفس المفتاح = نفس الـ request، وبيتبعت من كذا process في نفس الوقت
+            shared = rnd.randrange(shared_keys)
+            key, cart = f'{STRESS_KEY_PREFIX}shared-{shared}', random.Random(f"{opts['seed']}-{shared}")
+        else:
+            key, cart = f'{STRESS_KEY_PREFIX}{worker}-{n}', rnd
+        items = [{'product_id': pid, 'quantity': cart.randint(1, opts['max_qty'])}
+                 for pid in cart.sample(product_ids, cart.randint(1, min(opts['max_lines'], len(product_ids))))]
+        started = time.perf_counter()
+        resp = client.post('/api/orders/create/', {
+            'customer_name': 'Stress', 'customer_phone': '0100000000',
+            'customer_email': 'stress@example.com', 'customer_city': 'Cairo',
+            'customer_address': 'Stress street', 'items': items,
+        }, content_type='application/json', headers={'Idempotency-Key': key})
+        timings.append(time.perf_counter() - started)
+        statuses[resp.status_code] += 1
+        if resp.status_code == 201:
+            keys.setdefault(key, set()).add(resp.json()['id'])
+            if resp.headers.get('Idempotent-Replayed'):
+                replayed += 1
+                continue
+        if resp.status_code == 201 and rnd.random() < opts['cancel_rate']:
+            order = Order.objects.get(pk=resp.json()['id'])
+            order.status = Order.STATUS_CANCELLED
+            order.save()
+            cancelled += 1
+    connections.close_all()
+    results.put({'timings': timings, 'statuses': dict(statuses), 'cancelled': cancelled,
+                 'replayed': replayed, 'keys': keys})
+
+
+def fulfil_worker(opts, product_ids, stop, results):
+    # الـ admin بينفذ دفعات من الطلبات المحجوزة وفي نفس الوقت بيتحرر المنتهي
+    rnd = random.Random(opts['seed'] - 1)
+    fulfilled = rounds = expired = 0
+    while not stop.is_set():
+        pending = (Order.objects.filter(status=Order.STATUS_PENDING, items__product_id__in=product_ids)
+                   .distinct().order_by('?'))[:rnd.randint(1, 10)]
+        # الحالة بتتشيك تاني جوه transaction التنفيذ: الطلب ممكن يكون اتلغى من ساعة ما اتقرا
+        fulfilled += fulfil_orders(Order.objects.filter(pk__in=list(pending.values_list('pk', flat=True)),
+                                                        status=Order.STATUS_PENDING))
+        expired += release_expired_reservations()
+        rounds += 1
+        time.sleep(0.01)
+    connections.close_all()
+    results.put({'fulfilled': fulfilled, 'fulfil_rounds': rounds, 'expired': expired})
+
+
+class Command(BaseCommand):
+    help = "Concurrent checkouts against scarce stock; verifies reservations never oversell."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--checkouts', type=int, default=50, help='Checkouts per worker.')
+        parser.add_argument('--products', type=int, default=20)
+        parser.add_argument('--stock', type=int, default=40, help='Initial stock per product.')
+        parser.add_argument('--max-lines', type=int, default=4)
+        parser.add_argument('--max-qty', type=int, default=5)
+        parser.add_argument('--cancel-rate', type=float, default=0.2)
+        parser.add_argument('--duplicate-rate', type=float, default=0.2,
+                            help='Share of checkouts sent with an Idempotency-Key shared across workers.')
+        parser.add_argument('--reservation-ttl', type=float, default=0.5,
+                            help='Reservation TTL in seconds, short so reservations expire mid-run (0 = settings).')
+        parser.add_argument('--no-fulfil', action='store_true', help='Skip the concurrent fulfilment worker.')
+        parser.add_argument('--keep', action='store_true', help='Keep the STRESS- products and orders.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **opts):
+        if connections['default'].vendor == 'sqlite':
+            mode = connections['default'].cursor().execute('PRAGMA journal_mode').fetchone()[0]
+            self.stdout.write(f"sqlite journal_mode={mode}")
+        # انتظار قفل الكتابة بيخلي requests كتير تعدي حد الـ slow log
+        logging.getLogger('utils.timing').setLevel(logging.ERROR)
+        self.cleanup()
+        products = Product.objects.bulk_create([
+            Product(sku=f'{STRESS_SKU_PREFIX}{n:04d}', name=f'Stress product {n}',
+                    base_price=Decimal('10.00'), stock=opts['stock'])
+            for n in range(opts['products'])
+        ])
+        record_opening_stock(products)
+        product_ids = [p.pk for p in products]
+
+        if opts['reservation_ttl']:
+            # الـ workers بيورثوا الـ setting مع الـ fork
+            settings.STOCK_RESERVATION_TTL_MINUTES = opts['reservation_ttl'] / 60
+        # الـ processes اللي بتتعمل fork ما ينفعش تشارك connection الأب
+        connections.close_all()
+        ctx = multiprocessing.get_context('fork')
+        results, stop = ctx.Queue(), ctx.Event()
+        workers = [ctx.Process(target=checkout_worker, args=(n, opts, product_ids, results))
+                   for n in range(opts['workers'])]
+        fulfiller = (None if opts['no_fulfil']
+                     else ctx.Process(target=fulfil_worker, args=(opts, product_ids, stop, results)))
+
+        started = time.perf_counter()
+        for p in workers + [fulfiller] * (fulfiller is not None):
+            p.start()
+        reports = [results.get() for _ in workers]
+        elapsed = time.perf_counter() - started
+        if fulfiller is not None:
+            stop.set()
+            reports.append(results.get())
+            fulfiller.join()
+        for p in workers:
+            p.join()
+        if any(p.exitcode for p in workers):
+            raise CommandError("A checkout worker crashed.")
+
+        self.report(reports, elapsed)
+        try:
+            problems = self.verify(product_ids, opts['stock']) + self.verify_keys(reports, product_ids)
+        finally:
+            if not opts['keep']:
+                self.cleanup()
+        if problems:
+            raise CommandError("Invariant violations:\n" + "\n".join(problems))
+        self.stdout.write(self.style.SUCCESS("No overselling: all stock invariants hold."))
+
+    def report(self, reports, elapsed):
+        timings = sorted(t * 1000 for r in reports for t in r.get('timings', ()))
+        statuses = Counter()
+        for r in reports:
+            statuses.update(r.get('statuses', {}))
+        self.stdout.write(
+            f"{len(timings)} checkouts in {elapsed:.1f}s ({len(timings) / elapsed:.1f}/s): "
+            f"p50 {percentile(timings, 50):.1f}ms  p95 {percentile(timings, 95):.1f}ms  "
+            f"p99 {percentile(timings, 99):.1f}ms  max {timings[-1]:.1f}ms")
+        self.stdout.write(f"status codes: {dict(sorted(statuses.items()))}, "
+                          f"cancelled: {sum(r.get('cancelled', 0) for r in reports)}, "
+                          f"fulfilled: {sum(r.get('fulfilled', 0) for r in reports)}, "
+                          f"expired: {sum(r.get('expired', 0) for r in reports)}, "
+                          f"replayed: {sum(r.get('replayed', 0) for r in reports)}")
+        if set(statuses) - {201, 409}:
+            raise CommandError(f"Unexpected status codes: {dict(statuses)}")
+
+    def verify(self, product_ids, initial_stock):
+        def by_product(stock_status):
+            return dict(OrderItem.objects.filter(product_id__in=product_ids, order__stock_status=stock_status)
+                        .values('product_id').annotate(qty=Sum('quantity')).order_by()
+                        .values_list('product_id', 'qty'))
+
+        held, deducted = by_product(Order.STOCK_RESERVED), by_product(Order.STOCK_DEDUCTED)
+        problems = []
+        for pid, stock, reserved in Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock', 'reserved'):
+            if reserved != held.get(pid, 0):
+                problems.append(f"product {pid}: reserved={reserved}, reserved orders hold {held.get(pid, 0)}")
+            if stock != initial_stock - deducted.get(pid, 0):
+                problems.append(f"product {pid}: stock={stock}, expected {initial_stock - deducted.get(pid, 0)}")
+            if not 0 <= reserved <= stock:
+                problems.append(f"product {pid}: reserved={reserved} outside 0..stock={stock}")
+        for pid, (cached, ledger) in stock_cache_drift(product_ids).items():
+            problems.append(f"product {pid}: stock cache {cached} != ledger {ledger}")
+        for pid, (cached, located) in location_drift(product_ids).items():
+            problems.append(f"product {pid}: stock cache {cached} != warehouses {located}")
+        oversold = Product.objects.filter(pk__in=product_ids, reserved__gt=F('stock')).count()
+        sold = sum(held.values()) + sum(deducted.values())
+        self.stdout.write(f"units held {sum(held.values())}, deducted {sum(deducted.values())}, "
+                          f"of {initial_stock * len(product_ids)} ({sold / (initial_stock * len(product_ids)):.0%} sold); "
+                          f"oversold products: {oversold}")
+        if not sold:
+            problems.append("No stock was sold: the stress run did not exercise reservations.")
+        return problems
+
+    def verify_keys(self, reports, product_ids):
+        """
+        كل مفتاح رجع نفس الطلب لكل اللي بعتوه، وعدد الطلبات = عدد المفاتيح اللي نجحت.
+        """
+        keys = {}
+        for r in reports:
+            for key, ids in r.get('keys', {}).items():
+                keys.setdefault(key, set()).update(ids)
+        problems = [f"key {key}: {len(ids)} different orders {sorted(ids)}" for key, ids in keys.items() if len(ids) > 1]
+        orders = Order.objects.filter(items__product_id__in=product_ids).distinct().count()
+        if orders != len(keys):
+            problems.append(f"{orders} stress orders for {len(keys)} successful idempotency keys")
+        return problems
+
+    def cleanup(self):
+        stress = Product.objects.filter(sku__startswith=STRESS_SKU_PREFIX)
+        Order.objects.filter(items__product__in=stress).distinct().delete()
+        stress.delete()
+        IdempotencyKey.objects.filter(key__startswith=STRESS_KEY_PREFIX).delete()
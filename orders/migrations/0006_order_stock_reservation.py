@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_fulfilled_as_deducted(apps, schema_editor):
+    # الطلبات المنفذة قبل الحجز اتخصم مخزونها خلاص
+    Order = apps.get_model('orders', 'Order')
+    Order.objects.filter(status='fulfilled').update(stock_status='deducted')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_sheetexportoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='reserved_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='stock_status',
+            field=models.CharField(choices=[('none', 'Not reserved'), ('reserved', 'Reserved'), ('released', 'Released'), ('deducted', 'Deducted')], default='none', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['stock_status', 'reserved_until'], name='order_reservation_expiry_idx'),
+        ),
+        migrations.RunPython(mark_fulfilled_as_deducted, migrations.RunPython.noop),
+    ]
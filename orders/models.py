@@ -1,6 +1,7 @@
 # orders/models.py
 from decimal import Decimal
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 from catalog.models import Product
@@ -24,11 +25,28 @@ class Order(models.Model):
         (STATUS_FULFILLED, 'Fulfilled'),
     )
 
+    # حالة المخزون بتاع الطلب (orders/reservations.py)
+    STOCK_NONE = 'none'            # طلبات قديمة من قبل الحجز: الخصم بيحصل مباشرة عند التنفيذ
+    STOCK_RESERVED = 'reserved'    # الكميات محجوزة في Product.reserved
+    STOCK_RELEASED = 'released'    # الحجز اتلغى (إلغاء أو انتهاء المدة)
+    STOCK_DEDUCTED = 'deducted'    # اتخصمت من Product.stock (الطلب اتنفذ)
+
+    STOCK_STATUS_CHOICES = (
+        (STOCK_NONE, 'Not reserved'),
+        (STOCK_RESERVED, 'Reserved'),
+        (STOCK_RELEASED, 'Released'),
+        (STOCK_DEDUCTED, 'Deducted'),
+    )
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    stock_status = models.CharField(max_length=20, choices=STOCK_STATUS_CHOICES, default=STOCK_NONE)
+    # الطلب الـ pending بيفقد الحجز بعد الوقت ده (manage.py release_expired_reservations)
+    reserved_until = models.DateTimeField(null=True, blank=True)
+
     total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
 
     # بيانات العميل
@@ -38,6 +56,13 @@ class Order(models.Model):
     customer_city = models.CharField(max_length=200, blank=True, null=True)
     customer_address = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['stock_status', 'reserved_until'], name='order_reservation_expiry_idx'),
+            # سجل طلبات العميل (orders.pagination): WHERE user_id = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_history_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.pk} - {self.status}"
 
@@ -54,15 +79,61 @@ class Order(models.Model):
         self.save(update_fields=['total'])
         return self.total
 
+    # الحقول اللي بنحفظ قيمتها الأصلية وقت التحميل من الـ DB (loaded-state tracker)
+    tracked_fields = ('status',)
+    reservation_fields = ('stock_status', 'reserved_until')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: getattr(instance, name) for name in cls.tracked_fields if name in field_names
+        }
+        return instance
+
+    def _remember_loaded_values(self, fields=None):
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            loaded = self._loaded_values = {}
+        for name in self.tracked_fields:
+            if fields is None or name in fields:
+                loaded[name] = getattr(self, name)
+
+    def get_loaded_value(self, name):
+        """
+        قيمة الحقل زي ما هي في الـ DB قبل أي تعديل في الذاكرة.
+        بدون queries طالما الـ instance اتحمل من الـ DB (أو اتحفظ قبل كده)؛
+        غير كده (instance اتعمل يدوياً بـ pk) بنقرأها مرة واحدة ونحفظها.
+        """
+        loaded = getattr(self, '_loaded_values', None) or {}
+        if name in loaded:
+            return loaded[name]
+        if self.pk is None:
+            return None
+        value = type(self)._base_manager.filter(pk=self.pk).values_list(name, flat=True).first()
+        self._loaded_values = {**loaded, name: value}
+        return value
+
+    @property
+    def previous_status(self):
+        return self.get_loaded_value('status')
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._remember_loaded_values(fields)
+
     def save(self, *args, **kwargs):
         """
         نعدل الحقول الخاصة بالعميل لتأخذ بياناته من الـ request.user إذا كان مسجلاً.
         """
-        if self.user:
+        customer_fields = (self.customer_name, self.customer_phone, self.customer_email,
+                           self.customer_address, self.customer_city)
+        # user_id بدل self.user علشان ما نحمّلش المستخدم لو كل البيانات موجودة
+        if self.user_id and not all(customer_fields):
             if not self.customer_name:
                 self.customer_name = f"{self.user.first_name} {self.user.last_name}"
             if not self.customer_phone:
-                self.customer_phone = self.user.profile.mobile if self.user.profile else ''
+                self.customer_phone = self.user.profile.number_phone if self.user.profile else ''
             if not self.customer_email:
                 self.customer_email = self.user.email
             if not self.customer_address:
@@ -70,7 +141,17 @@ class Order(models.Model):
             if not self.customer_city:
                 self.customer_city = self.user.profile.city if self.user.profile else ''
 
+        # stock_status / reserved_until بيتغيروا بـ UPDATE مشروط من orders.reservations بس؛
+        # save() كامل بـ instance قديم كان هيرجع حالة المخزون لقيمة غلط
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.reservation_fields and f.attname not in deferred
+            ]
         super().save(*args, **kwargs)
+        # الـ signals (pre_save/post_save) شافت القيم القديمة؛ دلوقتي الـ DB فيها الجديدة
+        self._remember_loaded_values(kwargs.get('update_fields'))
 
 
 class OrderItem(models.Model):
@@ -90,3 +171,60 @@ class OrderItem(models.Model):
         except Exception:
             sku = str(self.product_id)
         return f"{sku} x {self.quantity} @ {self.unit_price}"
+
+
+class SheetExportOutbox(models.Model):
+    """
+    صف منتظر الإرسال لـ Google Sheets (outbox).
+    بيتكتب في نفس transaction الطلب، والـ worker (manage.py export_orders_to_sheets)
+    هو اللي بيبعته على دفعات بعدين، فالـ checkout ما يستناش Google.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    order = models.ForeignKey(Order, related_name='sheet_exports', on_delete=models.CASCADE)
+    row = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"Sheet export #{self.pk} (order {self.order_id}) - {self.status}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    رد POST /api/orders/create/ محفوظ بالـ Idempotency-Key بتاع العميل (orders/idempotency.py).
+    بيتكتب في نفس transaction الطلب، فإما الطلب والمفتاح اتحفظوا مع بعض أو ولا واحد فيهم.
+    """
+    # المفتاح بيتفرد لكل مستخدم؛ الزوار كلهم scope واحد ('anon')
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    # sha256 لجسم الـ request: نفس المفتاح بـ request مختلف بيترفض بدل ما يرجع رد طلب تاني
+    request_hash = models.CharField(max_length=64)
+    order = models.ForeignKey(Order, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_key_unique')]
+        indexes = [models.Index(fields=['expires_at'], name='idempotency_key_expiry_idx')]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key} -> order {self.order_id}"
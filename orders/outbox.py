@@ -0,0 +1,89 @@
+# orders/outbox.py
+"""
+Outbox تصدير الطلبات لـ Google Sheets.
+
+- enqueue_order_export: بيتنادى جوه transaction إنشاء الطلب (INSERT واحد، بدون أي اتصال خارجي).
+- drain_sheet_outbox: بيستخدمه الـ worker (manage.py export_orders_to_sheets)،
+  بيبعت الصفوف المستحقة على دفعات بـ append_rows، ولو فشل بيأجل المحاولة بـ backoff أسي.
+"""
+import logging
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import SheetExportOutbox
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+
+
+def build_order_row(order, items):
+    """
+    الصف اللي بيتكتب في الشيت (نفس الأعمدة القديمة).
+    """
+    items_desc = []
+    for it in items:
+        prod_name = getattr(it.product, 'name', str(it.product))
+        items_desc.append(f"{prod_name} x{it.quantity} @ {it.unit_price}")
+    items_str = " | ".join(items_desc)
+
+    return [
+        str(order.id),
+        order.customer_name or '',
+        order.customer_phone or '',
+        order.customer_email or '',
+        order.customer_city or '',
+        order.customer_address or '',
+        items_str,
+        str(order.total),
+        order.created_at.strftime('%Y-%m-%d %H:%M:%S') if getattr(order, 'created_at', None) else ''
+    ]
+
+
+def enqueue_order_export(order, items):
+    return SheetExportOutbox.objects.create(order=order, row=build_order_row(order, items))
+
+
+def backoff_delay(attempts):
+    """
+    تأخير المحاولة التالية: 30s, 60s, 120s, ... بحد أقصى ساعة.
+    """
+    return timedelta(seconds=min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0)))
+
+
+def drain_sheet_outbox(worksheet, batch_size=100, max_attempts=8, now=None):
+    """
+    يبعت دفعة واحدة من الصفوف المستحقة (append_rows واحد) ويرجع (sent, failed).
+    worksheet: أي object عنده append_rows(rows) — ورقة gspread أو fake في التستات.
+    مصمم لـ worker واحد في نفس الوقت.
+    """
+    now = now or timezone.now()
+    batch = list(
+        SheetExportOutbox.objects
+        .filter(status=SheetExportOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+        .order_by('id')[:batch_size]
+    )
+    if not batch:
+        return 0, 0
+
+    ids = [entry.pk for entry in batch]
+    try:
+        worksheet.append_rows([entry.row for entry in batch])
+    except Exception as e:
+        logger.warning("Sheets export failed for %d rows: %s", len(batch), e)
+        for entry in batch:
+            entry.attempts += 1
+            entry.last_error = str(e)[:2000]
+            entry.next_attempt_at = now + backoff_delay(entry.attempts)
+            if entry.attempts >= max_attempts:
+                entry.status = SheetExportOutbox.STATUS_FAILED
+                logger.error("Giving up on sheet export #%s (order %s) after %d attempts.",
+                             entry.pk, entry.order_id, entry.attempts)
+        SheetExportOutbox.objects.bulk_update(batch, ['attempts', 'last_error', 'next_attempt_at', 'status'])
+        return 0, len(batch)
+
+    SheetExportOutbox.objects.filter(pk__in=ids).update(
+        status=SheetExportOutbox.STATUS_SENT, sent_at=now, last_error='')
+    return len(batch), 0
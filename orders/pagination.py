@@ -0,0 +1,48 @@
+# orders/pagination.py
+"""
+Pagination سجل طلبات العميل: keyset على (created_at, id) من الأحدث للأقدم.
+بدون COUNT(*) وبدون OFFSET، ومع index (user, created_at, id) الصفحة الأخيرة لعميل عنده 10k طلب
+بنفس سرعة الأولى.
+"""
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+
+from catalog.pagination import KeysetPagination
+
+
+class OrderHistoryPagination(KeysetPagination):
+    """
+    الـ cursor = آخر (created_at, id) في الصفحة، والصفحة التالية:
+        created_at <= :ts AND (created_at < :ts OR id < :id)  ORDER BY created_at DESC, id DESC
+    """
+    ordering = ('-created_at', '-id')
+
+    def decode_order_cursor(self, value):
+        created, pk = self.decode_cursor(value)
+        try:
+            created_at = parse_datetime(created)
+        except ValueError:
+            created_at = None
+        if created_at is None:
+            raise NotFound('Invalid cursor')
+        return created_at, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = self.decode_order_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lte=created_at)
+                                       & (Q(created_at__lt=created_at) | Q(id__lt=pk)))
+
+        rows = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            self.next_cursor = self.encode_cursor(last.created_at.isoformat(), last.id)
+        return rows
@@ -0,0 +1,169 @@
+# orders/reservations.py
+"""
+حجز المخزون للطلبات.
+
+المتاح للبيع = Product.stock - Product.reserved.
+- CreateOrderView بيحجز كل الكميات بـ UPDATE شرطي واحد لكل دفعة منتجات:
+  UPDATE ... SET reserved = reserved + qty WHERE stock - reserved >= qty
+  الشرط والزيادة في نفس الـ statement، فمفيش read-modify-write ولا ممكن طلبين يحجزوا نفس القطعة.
+  لو عدد الصفوف اللي اتعدلت أقل من عدد المنتجات يبقى فيه منتج ما يكفيش، والـ transaction كلها بترجع.
+- الإلغاء (أو حذف الطلب) وانتهاء مدة الحجز (release_expired_reservations) بيرجعوا الكميات.
+- التنفيذ (orders.fulfilment) بيحول الحجز لخصم: stock و reserved بينقصوا مع بعض.
+  الطلبات القديمة أو اللي حجزها اتحرر بتتحجز تاني بنفس الـ UPDATE الشرطي (reserve_orders) قبل الخصم،
+  واللي ما يكفيهوش المتاح ما بيتنفذش.
+
+انتقالات Order.stock_status بتتعمل بـ UPDATE مشروط بالحالة القديمة، فنفس الطلب ما يتحررش أو يتخصم مرتين.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from catalog.models import Product
+from .models import Order, OrderItem
+
+# كل منتج = WHEN في الـ SET و WHEN في الـ WHERE و pk في الـ IN (5 باراميترات)، تحت حد SQLite (999)
+RESERVE_CHUNK_SIZE = 150
+RELEASE_CHUNK_SIZE = 300
+
+
+class InsufficientStock(Exception):
+    def __init__(self, requested):
+        # {product_id: qty} للدفعة اللي فشلت؛ المنتجات الناقصة فعلاً بتطلع من shortages() بعد الـ rollback
+        self.requested = requested
+        super().__init__(f"insufficient stock for one of products {sorted(requested)}")
+
+
+def reservation_ttl():
+    return timedelta(minutes=getattr(settings, 'STOCK_RESERVATION_TTL_MINUTES', 30))
+
+
+def _delta(product_ids, quantities):
+    return Case(*[When(pk=pid, then=Value(quantities[pid])) for pid in product_ids],
+                default=Value(0), output_field=IntegerField())
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def reserve_stock(quantities):
+    """
+    يحجز {product_id: qty}. لازم يتنادي جوه transaction: لو منتج ما يكفيش بيرمي InsufficientStock
+    واللي اتحجز قبله بيرجع مع الـ rollback.
+    """
+    product_ids = sorted(pid for pid, qty in quantities.items() if qty > 0)
+    for chunk in _chunks(product_ids, RESERVE_CHUNK_SIZE):
+        delta = _delta(chunk, quantities)
+        updated = (Product.objects.filter(pk__in=chunk, stock__gte=F('reserved') + delta)
+                   .update(reserved=F('reserved') + delta))
+        if updated != len(chunk):
+            raise InsufficientStock({pid: quantities[pid] for pid in chunk})
+
+
+def shortages(quantities):
+    """
+    المنتجات اللي المتاح فيها أقل من المطلوب دلوقتي. للرسالة بس بعد الـ rollback (مش ضمان).
+    """
+    rows = Product.objects.filter(pk__in=list(quantities)).values_list('pk', 'stock', 'reserved')
+    return {pid: (quantities[pid], max(stock - reserved, 0))
+            for pid, stock, reserved in rows if stock - reserved < quantities[pid]}
+
+
+def order_quantities(order_ids):
+    """
+    {product_id: مجموع الكميات} لسطور الطلبات دي (query تجميعية واحدة).
+    """
+    rows = (OrderItem.objects.filter(order_id__in=order_ids)
+            .values('product_id').annotate(qty=Sum('quantity')).order_by()
+            .values_list('product_id', 'qty'))
+    return {pid: qty for pid, qty in rows if qty}
+
+
+def reserve_orders(order_ids):
+    """
+    يحجز تاني الطلبات اللي مش محجوزة (STOCK_NONE أو STOCK_RELEASED) من order_ids ويقلبها لـ STOCK_RESERVED.
+    لازم يتنادي جوه transaction. المتاح (stock - reserved) بيتقرا مقفول ويتوزع على الطلبات بالترتيب،
+    وبعدين UPDATE الحجز الشرطي العادي لمجموعهم، فعدد الـ queries ثابت مهما كان عدد الطلبات.
+    يرجع الـ ids اللي ما اتحجزتش لأن المتاح ما يكفيش (بتفضل على حالتها).
+    """
+    unreserved = (Order.STOCK_NONE, Order.STOCK_RELEASED)
+    candidates = list(Order.objects.filter(pk__in=order_ids, stock_status__in=unreserved)
+                      .select_for_update().order_by('pk').values_list('pk', flat=True))
+    if not candidates:
+        return []
+    per_order = {}
+    for order_id, pid, qty in (OrderItem.objects.filter(order_id__in=candidates)
+                               .values('order_id', 'product_id').annotate(qty=Sum('quantity')).order_by()
+                               .values_list('order_id', 'product_id', 'qty')):
+        if qty:
+            per_order.setdefault(order_id, {})[pid] = qty
+    available = {}
+    for chunk in _chunks(sorted({pid for items in per_order.values() for pid in items}), RELEASE_CHUNK_SIZE):
+        available.update(Product.objects.filter(pk__in=chunk).select_for_update()
+                         .values_list('pk', F('stock') - F('reserved')))
+
+    accepted, refused, quantities = [], [], {}
+    for order_id in candidates:
+        items = per_order.get(order_id, {})
+        if any(available.get(pid, 0) < qty for pid, qty in items.items()):
+            refused.append(order_id)
+            continue
+        for pid, qty in items.items():
+            available[pid] -= qty
+            quantities[pid] = quantities.get(pid, 0) + qty
+        accepted.append(order_id)
+    # الصفوف مقفولة فالشرط هنا ما بيفشلش، بس هو اللي بيضمن reserved <= stock
+    reserve_stock(quantities)
+    # بمدة زي الـ checkout: لو التنفيذ اترفض بعد كده (المخازن النشطة ما تكفيش) الحجز بيخلص لوحده
+    claim_orders(accepted, unreserved, Order.STOCK_RESERVED, reserved_until=timezone.now() + reservation_ttl())
+    return refused
+
+
+def claim_orders(order_ids, from_status, to_status, **extra):
+    """
+    يقلب stock_status من from_status (حالة أو tuple حالات) لـ to_status ويرجع الـ ids اللي اتقلبت فعلاً.
+    select_for_update بيقفل الصفوف على Postgres؛ على SQLite الـ transaction (IMMEDIATE) شايلة قفل الكتابة.
+    """
+    from_statuses = from_status if isinstance(from_status, tuple) else (from_status,)
+    claimed = list(Order.objects.filter(pk__in=order_ids, stock_status__in=from_statuses)
+                   .select_for_update().order_by().values_list('pk', flat=True))
+    if claimed:
+        Order.objects.filter(pk__in=claimed, stock_status__in=from_statuses).update(
+            stock_status=to_status, **extra)
+    return claimed
+
+
+@transaction.atomic
+def release_reservations(order_ids):
+    """
+    يرجع حجز الطلبات المحجوزة من order_ids للمتاح. يرجع الـ ids اللي اتحررت.
+    """
+    released = claim_orders(order_ids, Order.STOCK_RESERVED, Order.STOCK_RELEASED, reserved_until=None)
+    if not released:
+        return []
+    quantities = order_quantities(released)
+    for chunk in _chunks(sorted(quantities), RELEASE_CHUNK_SIZE):
+        Product.objects.filter(pk__in=chunk).update(
+            reserved=Greatest(F('reserved') - _delta(chunk, quantities), Value(0)))
+    return released
+
+
+def release_expired_reservations(now=None, batch_size=500):
+    """
+    الطلبات الـ pending اللي حجزها خلص وقته بتفقد الحجز (الطلب نفسه بيفضل pending، ولو اتنفذ بعد كده
+    بيتحجز تاني من المتاح زي الطلبات القديمة). يرجع عدد الطلبات اللي اتحررت.
+    """
+    now = now or timezone.now()
+    total = 0
+    while True:
+        ids = list(Order.objects.filter(stock_status=Order.STOCK_RESERVED, reserved_until__lt=now,
+                                        status=Order.STATUS_PENDING)
+                   .order_by().values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += len(release_reservations(ids))
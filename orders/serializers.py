@@ -27,10 +27,11 @@ class CreateOrderSerializer(serializers.Serializer):
         if not value:
             raise serializers.ValidationError("items must not be empty.")
         product_ids = [it['product_id'] for it in value]
-        products = Product.objects.filter(id__in=product_ids)
-        if products.count() != len(set(product_ids)):
+        # query واحدة للمنتجات، ونرجعها مع كل item علشان الـ view ما يعيدش تحميلها
+        products = Product.objects.in_bulk(product_ids)
+        if len(products) != len(set(product_ids)):
             raise serializers.ValidationError("One or more products do not exist.")
-        return value
+        return [{**it, 'product': products[it['product_id']]} for it in value]
 
     @transaction.atomic
     def create(self, validated_data):
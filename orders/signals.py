@@ -1,9 +1,10 @@
 # orders/signals.py
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_delete, pre_save
 from django.dispatch import receiver
 from django.db import transaction
 from orders.models import Order
-from catalog.models import Product  # عدل المسار لو الموديل في مكان آخر
+from orders.fulfilment import deduct_stock_for_orders
+from orders.reservations import InsufficientStock, order_quantities, release_reservations
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,35 +14,42 @@ def deduct_stock_on_fulfill(sender, instance: Order, **kwargs):
     """
     قبل حفظ Order جديد/مُحدّث: إذا الحالة اتبدلت لـ 'fulfilled' من حالة تانية،
     نقص من كل منتج الكمية المطلوبة.
-    نستخدم pre_save لمقارنة الحالة الحالية بالحالة في DB قبل التحديث.
+    نستخدم pre_save لمقارنة الحالة الحالية بالحالة المحمّلة من DB قبل التحديث.
     """
     if not instance.pk:
         # طلب جديد، لا نخصم هنا لأن الحالة عادة تكون 'pending' عند الإنشاء
         return
 
-    try:
-        previous = Order.objects.get(pk=instance.pk)
-    except Order.DoesNotExist:
-        return
-
-    prev_status = previous.status
+    # الحالة الأصلية من الـ loaded-state tracker بتاع Order (بدون SELECT إضافي)
+    prev_status = instance.previous_status
     new_status = instance.status
 
     # نتحقق إن الحالة تغيّرت إلى fulfilled
     if prev_status != 'fulfilled' and new_status == 'fulfilled':
-        # نعمل العملية داخل transaction.atomic لضمان الاتساق
+        # نفس مسار الخصم الجماعي (orders.fulfilment) بس لطلب واحد؛ لو المتاح ما يكفيش الحفظ نفسه بيترفض
         with transaction.atomic():
-            for item in instance.items.all():
-                product = item.product
-                qty = item.quantity or 0
-                # احسب الجديدة ولا تسمح بالعدد السالب
-                new_stock = (product.stock or 0) - qty
-                if new_stock < 0:
-                    # اختياري: هنا نمنع السالب ونجعلها صفر
-                    logger.warning("Order %s: product %s stock would go negative (%s). Setting to 0.",
-                                   instance.pk, product.pk, new_stock)
-                    new_stock = 0
-                # حدّث الحقل
-                product.stock = new_stock
-                product.save(update_fields=['stock'])
+            if deduct_stock_for_orders([instance.pk]):
+                raise InsufficientStock(order_quantities([instance.pk]))
             logger.info("Order %s fulfilled: stock deducted.", instance.pk)
+        instance.stock_status = Order.STOCK_DEDUCTED
+        instance.reserved_until = None
+
+
+@receiver(pre_save, sender=Order)
+def release_stock_on_cancel(sender, instance: Order, **kwargs):
+    """
+    الطلب اتلغى: الكميات المحجوزة ترجع للمتاح (مرة واحدة بس، release_reservations مشروطة بالحالة).
+    """
+    if not instance.pk or instance.stock_status != Order.STOCK_RESERVED:
+        return
+    if instance.previous_status != Order.STATUS_CANCELLED and instance.status == Order.STATUS_CANCELLED:
+        if release_reservations([instance.pk]):
+            instance.stock_status = Order.STOCK_RELEASED
+            instance.reserved_until = None
+
+
+@receiver(pre_delete, sender=Order)
+def release_stock_on_delete(sender, instance: Order, **kwargs):
+    # قبل ما الـ items تتمسح (cascade) علشان نعرف الكميات
+    if instance.stock_status == Order.STOCK_RESERVED:
+        release_reservations([instance.pk])
@@ -1,3 +1,610 @@
-from django.test import TestCase
+from decimal import Decimal
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from catalog.changes import latest_seq
+from catalog.inventory import location_drift, receive_stock, set_stock, stock_cache_drift
+from catalog.models import CatalogChange, Product, QuantityPrice, StockMovement, Warehouse
+from accounts.models import Profile
+from catalog.pricing import clear_tier_cache
+from .models import IdempotencyKey, Order, OrderItem, SheetExportOutbox
+from .fulfilment import fulfil_orders
+from .idempotency import prune_expired_keys
+from .outbox import drain_sheet_outbox
+from .reservations import RESERVE_CHUNK_SIZE, InsufficientStock, release_expired_reservations
+
+
+# عدد الـ queries هنا من غير sync كاش الشرائح (بيحصل مرة كل CATALOG_TIER_CACHE_CHECK_MS)
+@override_settings(CATALOG_TIER_CACHE_CHECK_MS=60_000)
+class CreateOrderQueryBudgetTests(APITestCase):
+    url = '/api/orders/create/'
+
+    @classmethod
+    def setUpTestData(cls):
+        products = Product.objects.bulk_create([
+            Product(sku=f'SKU-{n}', name=f'Product {n}', base_price=Decimal('10.00'), stock=100)
+            for n in range(500)
+        ])
+        QuantityPrice.objects.bulk_create([
+            QuantityPrice(product=p, min_qty=5, price=Decimal('8.00')) for p in products
+        ])
+        cls.product_ids = [p.pk for p in products]
+
+    def setUp(self):
+        clear_tier_cache()
+
+    def _payload(self, lines):
+        return {
+            'customer_name': 'Customer',
+            'customer_phone': '0100',
+            'customer_email': 'c@example.com',
+            'customer_city': 'Cairo',
+            'customer_address': 'Street 1',
+            'items': [{'product_id': pid, 'quantity': 5} for pid in self.product_ids[:lines]],
+        }
+
+    def _create(self, lines):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(self.url, self._payload(lines), format='json')
+        self.assertEqual(resp.status_code, 201, resp.data)
+        return resp, ctx.captured_queries
+
+    def test_response_built_from_in_memory_objects(self):
+        resp, _ = self._create(3)
+        self.assertEqual(resp.data['total'], '120.00')
+        self.assertEqual([it['product_name'] for it in resp.data['items']],
+                         ['Product 0', 'Product 1', 'Product 2'])
+        self.assertEqual(OrderItem.objects.filter(order_id=resp.data['id']).count(), 3)
+        self.assertEqual(Order.objects.get(pk=resp.data['id']).total, Decimal('120.00'))
+        export = SheetExportOutbox.objects.get(order_id=resp.data['id'])
+        self.assertEqual(export.row[0], str(resp.data['id']))
+        self.assertIn('Product 0 x5 @ 8.00', export.row[6])
+
+    def test_query_count_does_not_grow_with_lines(self):
+        # savepoint + منتجات + شرائح + UPDATE حجز + INSERT order + INSERT items + INSERT outbox + release
+        query_budget = 8
+        for lines in (1, 50, 500):
+            clear_tier_cache()
+            _, queries = self._create(lines)
+            # الزيادة الوحيدة المسموحة: تقسيم bulk_create حسب حد باراميترات الـ backend
+            # (SQLite: 999 باراميتر => ~199 سطر في كل INSERT)
+            batch = connection.ops.bulk_batch_size(
+                [f for f in OrderItem._meta.concrete_fields if not f.primary_key], [None] * lines)
+            extra_batches = -(-lines // batch) - 1
+            # وكمان الحجز على دفعات RESERVE_CHUNK_SIZE منتج
+            extra_batches += -(-lines // RESERVE_CHUNK_SIZE) - 1
+            sql = '\n'.join(q['sql'] for q in queries)
+            self.assertLessEqual(len(queries), query_budget + extra_batches,
+                                 f"{lines} lines used {len(queries)} queries:\n{sql}")
+
+
+class FakeWorksheet:
+    """
+    بديل محلي لورقة gspread: بيسجل الصفوف، وممكن نخليه يفشل عدد مرات محدد.
+    """
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    def append_rows(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('sheets unavailable')
+        self.calls.append(list(rows))
+
+
+class SheetOutboxTests(TestCase):
+    def setUp(self):
+        self.orders = [Order.objects.create(customer_name=f'C{n}') for n in range(5)]
+        for order in self.orders:
+            SheetExportOutbox.objects.create(order=order, row=[str(order.pk), order.customer_name])
+
+    def test_drains_in_batches_with_one_append_per_batch(self):
+        sheet = FakeWorksheet()
+        self.assertEqual(drain_sheet_outbox(sheet, batch_size=3), (3, 0))
+        self.assertEqual(drain_sheet_outbox(sheet, batch_size=3), (2, 0))
+        self.assertEqual(drain_sheet_outbox(sheet, batch_size=3), (0, 0))
+        self.assertEqual([len(c) for c in sheet.calls], [3, 2])
+        self.assertEqual(sheet.calls[0][0], [str(self.orders[0].pk), 'C0'])
+        self.assertFalse(SheetExportOutbox.objects.exclude(status=SheetExportOutbox.STATUS_SENT).exists())
+
+    def test_failure_backs_off_then_retries(self):
+        sheet = FakeWorksheet(failures=1)
+        now = timezone.now()
+        with self.assertLogs('orders.outbox', level='WARNING'):
+            self.assertEqual(drain_sheet_outbox(sheet, now=now), (0, 5))
+        # لسه ما جاش وقت المحاولة التالية
+        self.assertEqual(drain_sheet_outbox(sheet, now=now), (0, 0))
+        entry = SheetExportOutbox.objects.first()
+        self.assertEqual(entry.attempts, 1)
+        self.assertEqual(entry.next_attempt_at, now + timedelta(seconds=30))
+        self.assertEqual(drain_sheet_outbox(sheet, now=now + timedelta(seconds=31)), (5, 0))
+
+    def test_gives_up_after_max_attempts(self):
+        sheet = FakeWorksheet(failures=10)
+        now = timezone.now()
+        with self.assertLogs('orders.outbox', level='WARNING'):
+            for attempt in range(3):
+                drain_sheet_outbox(sheet, max_attempts=3, now=now + timedelta(days=attempt))
+        self.assertEqual(SheetExportOutbox.objects.filter(status=SheetExportOutbox.STATUS_FAILED).count(), 5)
+
+    def test_worker_command_reuses_one_client(self):
+        sheet = FakeWorksheet()
+        with mock.patch('orders.management.commands.export_orders_to_sheets.Command.get_worksheet',
+                        return_value=sheet) as get_worksheet:
+            call_command('export_orders_to_sheets', '--once', '--batch-size', '2', stdout=StringIO())
+        self.assertEqual(get_worksheet.call_count, 1)
+        self.assertEqual([len(c) for c in sheet.calls], [2, 2, 1])
+
+
+class FulfilmentTests(TestCase):
+    def setUp(self):
+        self.rice = Product.objects.create(sku='R', name='Rice', base_price=Decimal('1.00'), stock=100)
+        self.oil = Product.objects.create(sku='O', name='Oil', base_price=Decimal('1.00'), stock=5)
+
+    def _order(self, rice=0, oil=0, status=Order.STATUS_PENDING):
+        order = Order.objects.create(status=status)
+        for product, qty in ((self.rice, rice), (self.oil, oil)):
+            if qty:
+                OrderItem.objects.create(order=order, product=product, quantity=qty, unit_price=Decimal('1.00'))
+        return order
+
+    def test_bulk_fulfil_refuses_orders_without_available_stock(self):
+        orders = [self._order(rice=10, oil=2) for _ in range(4)]
+        # طلب منفذ قبل كده: ما يتخصمش تاني
+        self._order(rice=50, status=Order.STATUS_FULFILLED)
+        with self.assertLogs('orders.fulfilment', level='WARNING') as logs:
+            count = fulfil_orders(Order.objects.all())
+        # الزيت (5) يكفي طلبين بس؛ الباقيين بيفضلوا pending ومن غير حجز
+        self.assertEqual(count, 2)
+        self.assertIn(str([orders[2].pk, orders[3].pk]), logs.output[0])
+        self.rice.refresh_from_db()
+        self.oil.refresh_from_db()
+        self.assertEqual((self.rice.stock, self.rice.reserved, self.oil.stock, self.oil.reserved), (80, 0, 1, 0))
+        self.assertEqual(Order.objects.filter(status=Order.STATUS_FULFILLED).count(), 3)
+        self.assertEqual(set(Order.objects.filter(pk__in=[orders[2].pk, orders[3].pk])
+                             .values_list('status', 'stock_status')), {(Order.STATUS_PENDING, Order.STOCK_NONE)})
+
+    def test_fulfilment_movements_match_what_left_the_shelf(self):
+        first = self._order(oil=4)
+        second = self._order(rice=2, oil=4)
+        with self.assertLogs('orders.fulfilment', level='WARNING'):
+            fulfil_orders(Order.objects.all())
+        moves = StockMovement.objects.filter(kind=StockMovement.FULFILMENT)
+        # التاني اترفض كله (ولا حتى الرز اتخصم)
+        self.assertEqual(list(moves.values_list('reference', 'product_id', 'quantity')),
+                         [(f'order:{first.pk}', self.oil.pk, -4)])
+        self.assertEqual(Order.objects.get(pk=second.pk).status, Order.STATUS_PENDING)
+        self.assertEqual(stock_cache_drift(), {})
+
+    def test_lines_ship_from_the_customer_city_warehouse(self):
+        alex = Warehouse.objects.create(code='ALX', name='Alexandria', city='Alexandria', priority=10)
+        receive_stock({self.rice.pk: 20}, warehouse_id=alex.pk)
+        near = self._order(rice=15)
+        far = self._order(rice=15)
+        Order.objects.filter(pk=near.pk).update(customer_city='Alexandria')
+        Order.objects.filter(pk=far.pk).update(customer_city='Aswan')
+        fulfil_orders(Order.objects.filter(pk__in=[near.pk, far.pk]))
+        shipped = dict(StockMovement.objects.filter(kind=StockMovement.FULFILMENT)
+                       .values_list('reference', 'warehouse__code'))
+        self.assertEqual(shipped, {f'order:{near.pk}': 'ALX', f'order:{far.pk}': 'MAIN'})
+        self.rice.refresh_from_db()
+        self.assertEqual(self.rice.stock, 90)
+        self.assertEqual(location_drift(), {})
+
+    def test_stock_in_inactive_warehouse_is_not_shipped(self):
+        closed = Warehouse.objects.create(code='OLD', name='Closed', city='Tanta', active=False)
+        receive_stock({self.oil.pk: 10}, warehouse_id=closed.pk)
+        # الزيت 15 في المجموع، بس النشط منه 5 بس
+        order = self._order(rice=2, oil=8)
+        with self.assertLogs('orders.fulfilment', level='WARNING') as logs:
+            self.assertEqual(fulfil_orders(Order.objects.filter(pk=order.pk)), 0)
+        self.assertIn(f'Order {order.pk} refused', logs.output[-1])
+        order.refresh_from_db()
+        # الحجز فاضل ومدته بتخلص زي أي checkout
+        self.assertEqual((order.status, order.stock_status), (Order.STATUS_PENDING, Order.STOCK_RESERVED))
+        self.assertIsNotNone(order.reserved_until)
+        self.assertFalse(StockMovement.objects.filter(kind=StockMovement.FULFILMENT).exists())
+        self.assertEqual(location_drift(), {})
+
+    def test_query_count_independent_of_order_count(self):
+        # مخزون يكفي الدورتين علشان نقيس مسار الخصم مش الرفض
+        set_stock({self.oil.pk: 100})
+        for n in (2, 40):
+            Order.objects.all().delete()
+            for _ in range(n):
+                self._order(rice=1, oil=1)
+            with CaptureQueriesContext(connection) as ctx:
+                fulfil_orders(Order.objects.all())
+            if n == 2:
+                baseline = len(ctx.captured_queries)
+            self.assertEqual(len(ctx.captured_queries), baseline)
+            self.assertEqual(Order.objects.filter(status=Order.STATUS_FULFILLED).count(), n)
+
+    def test_single_order_save_uses_same_deduction(self):
+        order = self._order(rice=7, oil=1)
+        order.status = Order.STATUS_FULFILLED
+        order.save()
+        self.rice.refresh_from_db()
+        self.oil.refresh_from_db()
+        self.assertEqual((self.rice.stock, self.oil.stock), (93, 4))
+        # الحفظ مرة تانية بنفس الحالة ما يخصمش تاني
+        order.save()
+        self.rice.refresh_from_db()
+        self.assertEqual(self.rice.stock, 93)
+
+    def test_stock_deduction_lands_in_catalog_changes(self):
+        order = self._order(rice=3)
+        since = latest_seq()
+        order.status = Order.STATUS_FULFILLED
+        order.save()
+        changed = list(CatalogChange.objects.filter(seq__gt=since).values_list('product_id', flat=True))
+        self.assertEqual(changed, [self.rice.pk])
+
+
+class StockReservationTests(APITestCase):
+    url = '/api/orders/create/'
+
+    def setUp(self):
+        clear_tier_cache()
+        self.rice = Product.objects.create(sku='R', name='Rice', base_price=Decimal('1.00'), stock=10)
+        self.oil = Product.objects.create(sku='O', name='Oil', base_price=Decimal('1.00'), stock=3)
+
+    def _checkout(self, rice=0, oil=0):
+        items = [{'product_id': p.pk, 'quantity': q} for p, q in ((self.rice, rice), (self.oil, oil)) if q]
+        return self.client.post(self.url, {
+            'customer_name': 'C', 'customer_phone': '0100', 'customer_email': 'c@example.com',
+            'customer_city': 'Cairo', 'customer_address': 'Street', 'items': items,
+        }, format='json')
+
+    def _levels(self):
+        self.rice.refresh_from_db()
+        self.oil.refresh_from_db()
+        return (self.rice.stock, self.rice.reserved), (self.oil.stock, self.oil.reserved)
+
+    def test_checkout_reserves_without_touching_stock(self):
+        resp = self._checkout(rice=4, oil=3)
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.assertEqual(self._levels(), ((10, 4), (3, 3)))
+        order = Order.objects.get(pk=resp.data['id'])
+        self.assertEqual(order.stock_status, Order.STOCK_RESERVED)
+        self.assertGreater(order.reserved_until, timezone.now())
+
+    def test_shortage_is_409_and_rolls_back_everything(self):
+        self._checkout(oil=2)
+        resp = self._checkout(rice=4, oil=2)
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.data['products'], [{'product_id': self.oil.pk, 'requested': 2, 'available': 1}])
+        # حجز الرز اللي في نفس الطلب رجع، ومفيش طلب ولا outbox اتعملوا
+        self.assertEqual(self._levels(), ((10, 0), (3, 2)))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(SheetExportOutbox.objects.count(), 1)
+
+    def test_cancel_and_delete_release_once(self):
+        first = Order.objects.get(pk=self._checkout(rice=4).data['id'])
+        second = Order.objects.get(pk=self._checkout(rice=5).data['id'])
+        first.status = Order.STATUS_CANCELLED
+        first.save()
+        first.save()
+        self.assertEqual(self._levels()[0], (10, 5))
+        self.assertEqual(Order.objects.get(pk=first.pk).stock_status, Order.STOCK_RELEASED)
+        second.delete()
+        self.assertEqual(self._levels()[0], (10, 0))
+
+    def test_expired_reservations_are_released(self):
+        old = Order.objects.get(pk=self._checkout(rice=4).data['id'])
+        fresh = self._checkout(rice=2).data['id']
+        Order.objects.filter(pk=old.pk).update(reserved_until=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertEqual(release_expired_reservations(), 0)
+        self.assertEqual(self._levels()[0], (10, 2))
+        old.refresh_from_db()
+        self.assertEqual((old.status, old.stock_status), (Order.STATUS_PENDING, Order.STOCK_RELEASED))
+        self.assertEqual(Order.objects.get(pk=fresh).stock_status, Order.STOCK_RESERVED)
+
+        # الطلب اللي حجزه خلص لو اتنفذ بيتخصم مباشرة
+        fulfil_orders(Order.objects.filter(pk=old.pk))
+        self.assertEqual(self._levels()[0], (6, 2))
+
+    def test_released_order_is_reserved_again_before_deduction(self):
+        old = Order.objects.get(pk=self._checkout(rice=6).data['id'])
+        Order.objects.filter(pk=old.pk).update(reserved_until=timezone.now() - timedelta(minutes=1))
+        release_expired_reservations()
+        # المتاح اتحجز لطلب تاني بعد ما الحجز القديم اتحرر
+        self.assertEqual(self._checkout(rice=7).status_code, 201)
+        with self.assertLogs('orders.fulfilment', level='WARNING'):
+            self.assertEqual(fulfil_orders(Order.objects.filter(pk=old.pk)), 0)
+        self.assertEqual(self._levels()[0], (10, 7))
+        old.refresh_from_db()
+        self.assertEqual((old.status, old.stock_status), (Order.STATUS_PENDING, Order.STOCK_RELEASED))
+        # الحفظ الفردي بيترفض بنفس الشرط
+        old.status = Order.STATUS_FULFILLED
+        with self.assertRaises(InsufficientStock), self.assertLogs('orders.fulfilment', level='WARNING'):
+            old.save()
+        self.assertEqual(self._levels()[0], (10, 7))
+
+    def test_expiry_command(self):
+        order_id = self._checkout(oil=3).data['id']
+        Order.objects.filter(pk=order_id).update(reserved_until=timezone.now() - timedelta(minutes=1))
+        out = StringIO()
+        call_command('release_expired_reservations', '--once', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(self._levels()[1], (3, 0))
+
+    def test_fulfilment_converts_reservation_to_deduction(self):
+        reserved = self._checkout(rice=4, oil=1).data['id']
+        # طلب قديم من قبل الحجز: بيتخصم من stock بس
+        legacy = Order.objects.create()
+        OrderItem.objects.create(order=legacy, product=self.rice, quantity=3, unit_price=Decimal('1.00'))
+        self.assertEqual(fulfil_orders(Order.objects.filter(pk__in=[reserved, legacy.pk])), 2)
+        self.assertEqual(self._levels(), ((3, 0), (2, 0)))
+        self.assertEqual(set(Order.objects.values_list('stock_status', flat=True)), {Order.STOCK_DEDUCTED})
+        # تنفيذ تاني أو إلغاء بعد الخصم ما يلمسش المخزون
+        fulfil_orders(Order.objects.all())
+        order = Order.objects.get(pk=reserved)
+        order.status = Order.STATUS_CANCELLED
+        order.save()
+        self.assertEqual(self._levels(), ((3, 0), (2, 0)))
+
+    def test_single_order_save_converts_reservation(self):
+        order = Order.objects.get(pk=self._checkout(rice=4).data['id'])
+        order.status = Order.STATUS_FULFILLED
+        order.save()
+        self.assertEqual(self._levels()[0], (6, 0))
+        self.assertEqual(order.stock_status, Order.STOCK_DEDUCTED)
+
+    def test_stale_full_save_keeps_reservation_columns(self):
+        product = Product.objects.get(pk=self.rice.pk)
+        order = Order.objects.get(pk=self._checkout(rice=4).data['id'])
+        Order.objects.filter(pk=order.pk).update(stock_status=Order.STOCK_RELEASED)
+        # نسخ قديمة متحملة قبل الحجز / التحرير: الحفظ الكامل ما يرجعش القيم القديمة
+        product.name = 'Rice 5kg'
+        product.save()
+        order.customer_name = 'Renamed'
+        order.save()
+        self.assertEqual(self._levels()[0], (10, 4))
+        self.assertEqual(Order.objects.get(pk=order.pk).stock_status, Order.STOCK_RELEASED)
+
+
+class OrderHistoryTests(APITestCase):
+    url = '/api/orders/'
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(username='history', password='secret123')
+        cls.other = User.objects.create_user(username='someone-else', password='secret123')
+        cls.products = Product.objects.bulk_create([
+            Product(sku=f'HIST-{n}', name=f'History product {n}', base_price=Decimal('10.00'), stock=100)
+            for n in range(3)
+        ])
+        now = timezone.now()
+        # كل 3 طلبات ليهم نفس created_at علشان الـ cursor لازم يفرق بالـ id
+        orders = Order.objects.bulk_create([
+            Order(user=cls.user, customer_name='History', total=Decimal('10.00')) for _ in range(45)
+        ] + [Order(user=cls.other, customer_name='Other', total=Decimal('10.00'))])
+        for n, order in enumerate(orders):
+            order.created_at = now - timedelta(minutes=n // 3)
+        Order.objects.bulk_update(orders, ['created_at'])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=o, product=p, quantity=2, unit_price=Decimal('5.00')) for o in orders for p in cls.products
+        ])
+        cls.own_ids = [o.pk for o in orders[:45]]
+        cls.other_order = orders[-1]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def _walk(self, page_size):
+        ids, url, pages = [], f'{self.url}?page_size={page_size}', []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200, resp.data)
+            pages.append(len(ctx.captured_queries))
+            ids += [o['id'] for o in resp.data['results']]
+            url = resp.data['next']
+        return ids, pages
+
+    def test_pages_cover_own_orders_newest_first(self):
+        ids, _ = self._walk(7)
+        expected = list(Order.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(sorted(ids), sorted(self.own_ids))
+
+    def test_constant_queries_per_page(self):
+        _, pages = self._walk(20)
+        # query للطلبات + query للعناصر مع أسماء المنتجات
+        self.assertEqual(pages, [2, 2, 2])
+
+    def test_page_uses_user_history_index(self):
+        created_at = Order.objects.get(pk=self.own_ids[10]).created_at
+        qs = (Order.objects.filter(user=self.user, created_at__lte=created_at)
+              .order_by('-created_at', '-id')[:21])
+        plan = qs.explain()
+        self.assertIn('order_user_history_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_items_and_product_names(self):
+        resp = self.client.get(f'{self.url}?page_size=1')
+        order = resp.data['results'][0]
+        self.assertEqual([it['product_name'] for it in order['items']],
+                         [p.name for p in self.products])
+        self.assertEqual(order['total'], '10.00')
+
+    def test_detail_only_for_owner(self):
+        resp = self.client.get(f'{self.url}{self.own_ids[0]}/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data['items']), 3)
+        self.assertEqual(self.client.get(f'{self.url}{self.other_order.pk}/').status_code, 404)
+
+    def test_invalid_cursor_and_anonymous(self):
+        self.assertEqual(self.client.get(f'{self.url}?cursor=nope').status_code, 404)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class IdempotencyKeyTests(APITestCase):
+    url = '/api/orders/create/'
+
+    def setUp(self):
+        clear_tier_cache()
+        self.product = Product.objects.create(sku='IDEM-1', name='Idempotent', base_price=Decimal('10.00'), stock=10)
+        QuantityPrice.objects.create(product=self.product, min_qty=5, price=Decimal('8.00'))
+
+    def _post(self, key, quantity=2, **extra):
+        payload = {'customer_name': 'Retry', 'customer_city': 'Cairo',
+                   'items': [{'product_id': self.product.pk, 'quantity': quantity}]}
+        return self.client.post(self.url, payload, format='json', headers={'Idempotency-Key': key}, **extra)
+
+    def test_retry_replays_stored_response_without_new_order(self):
+        first = self._post('key-1')
+        self.assertEqual(first.status_code, 201, first.data)
+        with CaptureQueriesContext(connection) as ctx:
+            retry = self._post('key-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        # lookup واحد على المفتاح: لا منتجات ولا شرائح ولا outbox
+        self.assertEqual(len(ctx.captured_queries), 1, [q['sql'] for q in ctx.captured_queries])
+        self.assertNotIn('catalog_', ctx.captured_queries[0]['sql'])
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(SheetExportOutbox.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 2)
+        self.assertEqual(IdempotencyKey.objects.get().order_id, first.data['id'])
+
+    def test_same_key_with_different_request_is_rejected(self):
+        self.assertEqual(self._post('key-1').status_code, 201)
+        resp = self._post('key-1', quantity=3)
+        self.assertEqual(resp.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        user = get_user_model().objects.create_user(username='idem', password='secret123')
+        self.assertEqual(self._post('key-1').status_code, 201)
+        self.client.force_authenticate(user)
+        resp = self._post('key-1')
+        self.assertEqual(resp.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', resp.headers)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_failed_request_is_not_stored(self):
+        self.assertEqual(self._post('key-1', quantity=50).status_code, 409)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        set_stock({self.product.pk: 60})
+        self.assertEqual(self._post('key-1', quantity=50).status_code, 201)
+
+    def test_concurrent_duplicate_reuses_committed_response(self):
+        first = self._post('key-1')
+        # الـ request التاني عمل lookup قبل ما الأول يخلص، ووصل للـ INSERT بعد ما اتحفظ
+        with mock.patch('orders.views.IdempotentRequest.stored_response', return_value=None):
+            second = self._post('key-1')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 2)
+
+    def test_expired_key_runs_again_and_prune_deletes_in_batches(self):
+        self.assertEqual(self._post('key-1').status_code, 201)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self._post('key-1').status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+        now = timezone.now()
+        IdempotencyKey.objects.bulk_create([
+            IdempotencyKey(scope='anon', key=f'old-{n}', request_hash='x', expires_at=now - timedelta(hours=1))
+            for n in range(5)
+        ])
+        self.assertEqual(prune_expired_keys(batch_size=2), 5)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['key-1'])
+        out = StringIO()
+        call_command('prune_idempotency_keys', '--once', stdout=out)
+        self.assertIn('0 keys pruned', out.getvalue())
+
+    def test_invalid_key(self):
+        self.assertEqual(self._post('x' * 300).status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderStatusTrackingTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='buyer', password='secret123')
+        created = Order.objects.create(user=self.user, customer_name='Buyer', customer_phone='1',
+                                       customer_email='b@example.com', customer_city='Cairo',
+                                       customer_address='Street', total=Decimal('50.00'))
+        self.order_id = created.pk
+
+    def test_save_without_status_change_is_one_update(self):
+        order = Order.objects.get(pk=self.order_id)
+        with self.assertNumQueries(1):
+            order.save()
+
+    def test_status_change_needs_no_extra_reads(self):
+        order = Order.objects.get(pk=self.order_id)
+        order.status = Order.STATUS_CONFIRMED
+        with self.assertNumQueries(1):
+            order.save()
+        self.assertEqual(order.previous_status, Order.STATUS_CONFIRMED)
+
+    def test_cancel_updates_profile_using_loaded_status(self):
+        order = Order.objects.get(pk=self.order_id)
+        order.status = Order.STATUS_CANCELLED
+        order.save()
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual((profile.orders_count, profile.total_spent), (0, Decimal('0.00')))
+        # حفظ تاني بنفس الحالة ما يخصمش مرة تانية
+        order.save()
+        profile.refresh_from_db()
+        self.assertEqual(profile.orders_count, 0)
+
+    def test_manually_built_instance_reads_previous_status_once(self):
+        order = Order(pk=self.order_id, status=Order.STATUS_FULFILLED, customer_name='Buyer',
+                      customer_phone='1', customer_email='b@example.com', customer_city='Cairo',
+                      customer_address='Street', user_id=self.user.pk, total=Decimal('50.00'))
+        self.assertEqual(order.previous_status, Order.STATUS_PENDING)
+        with self.assertNumQueries(0):
+            order.previous_status
+
+
+class SeedBenchTests(TestCase):
+    def test_seeds_catalog_users_and_historical_orders(self):
+        out = StringIO()
+        call_command('seed_bench', '--categories', '2', '--subcategories', '3', '--products', '40',
+                     '--users', '5', '--orders', '30', '--batch-size', '7', '--days', '30', stdout=out)
+
+        self.assertEqual(Product.objects.filter(sku__startswith='SEED-').count(), 40)
+        self.assertTrue(QuantityPrice.objects.filter(product__sku__startswith='SEED-').exists())
+        self.assertEqual(CatalogChange.objects.filter(product_id__in=Product.objects.values('pk')).count(), 40)
+        self.assertEqual(Order.objects.count(), 30)
+        self.assertTrue(OrderItem.objects.exists())
+        # الطلبات متوزعة على الأيام اللي فاتت مش كلها دلوقتي
+        self.assertLess(Order.objects.order_by('created_at').first().created_at,
+                        timezone.now() - timedelta(hours=1))
+
+        # bulk_create ما بيشغلش الـ signals: الـ profiles اتعملت بإحصائياتها
+        users = get_user_model().objects.filter(username__startswith='bench-user-')
+        self.assertEqual(Profile.objects.filter(user__in=users).count(), 5)
+        for profile in Profile.objects.filter(user__in=users):
+            orders = Order.objects.filter(user_id=profile.user_id)
+            self.assertEqual(profile.orders_count, orders.count())
+            self.assertEqual(profile.total_spent, sum((o.total for o in orders), Decimal('0.00')))
+        self.assertTrue(users.first().check_password('bench-password'))
+
+        # مرة تانية بتضيف من غير ما تتخانق مع الـ sku / username الموجودين
+        call_command('seed_bench', '--categories', '1', '--products', '5', '--users', '2', '--orders', '3',
+                     stdout=StringIO())
+        self.assertEqual(Product.objects.filter(sku__startswith='SEED-').count(), 45)
@@ -1,7 +1,9 @@
 # orders/urls.py
 from django.urls import path
-from .views import CreateOrderView
+from .views import CreateOrderView, OrderDetailView, OrderListView
 
 urlpatterns = [
+    path('', OrderListView.as_view(), name='order-list'),
+    path('<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
     path('create/', CreateOrderView.as_view(), name='order-create'),
 ]
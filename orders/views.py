@@ -1,18 +1,32 @@
 from decimal import Decimal
 from django.db import transaction
-from rest_framework import status, permissions
+from django.db.models import Prefetch
+from rest_framework import generics, status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from .models import Order, OrderItem
-from catalog.models import Product
+from catalog.pricing import get_tier_tables
 from .serializers import CreateOrderSerializer, OrderReadSerializer  # تأكد من هذه الأسماء في serializers.py
+from .idempotency import IdempotentRequest, InvalidIdempotencyKey, KeyAlreadyUsed
+from .outbox import enqueue_order_export
+from .pagination import OrderHistoryPagination
+from .reservations import InsufficientStock, reservation_ttl, reserve_stock, shortages
+from django.utils import timezone
 import logging
 
-# Google Sheets helper
-from utils.google_sheets import append_order_to_sheet
-
 logger = logging.getLogger(__name__)
 
+
+def _set_prefetched_items(order, items):
+    """
+    نحط العناصر اللي اتعملت في الذاكرة ككاش prefetch لـ order.items
+    علشان OrderReadSerializer ما يعملش query تاني للعناصر ولا للمنتجات.
+    """
+    qs = order.items.all()
+    qs._result_cache = list(items)
+    qs._prefetch_done = True
+    order._prefetched_objects_cache = {'items': qs}
+
 class CreateOrderView(APIView):
     """
     POST /api/orders/create/
@@ -25,27 +39,77 @@ class CreateOrderView(APIView):
       "customer_address":"...",
       "items": [{"product_id":1, "quantity": 10}, ...]
     }
-    يقوم بإنشاء Order + OrderItem ثم يحاول يضيف صف في Google Sheet (لا يفشل الطلب لو فشل الشيت).
+    يقوم بإنشاء Order + OrderItem ويسجل صف Google Sheet في الـ outbox (الإرسال بيتم في الخلفية).
+    الكميات بتتحجز من المخزون (orders.reservations)؛ لو منتج ما يكفيش بيرجع 409 ومفيش حاجة بتتحفظ.
+    مع header Idempotency-Key الإعادة بترجع نفس الرد من غير طلب جديد (orders.idempotency).
     """
     permission_classes = [permissions.AllowAny]
 
-    @transaction.atomic
     def post(self, request, *args, **kwargs):
+        try:
+            idempotency = IdempotentRequest.from_request(request)
+        except InvalidIdempotencyKey as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if idempotency is not None:
+            stored = idempotency.stored_response()
+            if stored is not None:
+                return stored
+        try:
+            return self.create_order(request, idempotency)
+        except KeyAlreadyUsed:
+            # request تاني بنفس المفتاح اتحفظ وإحنا مستنيين قفل الكتابة
+            return idempotency.reused_response()
+        except InsufficientStock as e:
+            # الـ transaction رجعت خلاص؛ المتاح هنا للرسالة بس
+            missing = shortages(e.requested)
+            return Response({
+                'detail': 'Insufficient stock.',
+                'products': [{'product_id': pid, 'requested': requested, 'available': available}
+                             for pid, (requested, available) in sorted(missing.items())],
+            }, status=status.HTTP_409_CONFLICT)
+
+    @transaction.atomic
+    def create_order(self, request, idempotency=None):
+        # المفتاح أول حاجة: الـ request المكرر بيقف هنا قبل ما يلمس المنتجات
+        claimed = idempotency.claim() if idempotency is not None else None
+
         serializer = CreateOrderSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
 
         # إذا كان العميل مسجل دخول، استخدم بياناته من request.user
         user = request.user if request.user.is_authenticated else None
+        profile = getattr(user, 'profile', None) if user else None
 
         # استخدام بيانات العميل المسجل لتعبئة بيانات الطلب في حالة عدم إرسالها
         customer_name = data.get('customer_name', user.first_name + ' ' + user.last_name if user else '')
-        customer_phone = data.get('customer_phone', user.profile.mobile if user and user.profile else '')
+        customer_phone = data.get('customer_phone', profile.number_phone if profile else '')
         customer_email = data.get('customer_email', user.email if user else '')
         customer_city = data.get('customer_city', '')
-        customer_address = data.get('customer_address', user.profile.address if user and user.profile else '')
+        customer_address = data.get('customer_address', profile.address if profile else '')
 
-        # إنشاء الطلب مع استخدام بيانات العميل من request.user إذا كانت موجودة
+        # المنتجات اتحملت مرة واحدة في validate_items، والشرائح من كاش الأسعار (query واحدة على الأكثر)
+        items_data = data.get('items', [])
+        tables = get_tier_tables(it['product'].pk for it in items_data)
+
+        total = Decimal('0.00')
+        lines = []
+        for it in items_data:
+            product = it['product']
+            qty = int(it.get('quantity', 0))
+            if qty <= 0:
+                continue
+            unit_price = Decimal(tables[product.pk].price_for(qty, product.base_price))
+            lines.append((product, qty, unit_price))
+            total += (unit_price * qty)
+
+        # الحجز قبل أي INSERT: لو فشل مفيش حاجة اتكتبت غير اللي هيرجع مع الـ rollback
+        quantities = {}
+        for product, qty, _ in lines:
+            quantities[product.pk] = quantities.get(product.pk, 0) + qty
+        reserve_stock(quantities)
+
+        # إنشاء الطلب بالإجمالي مباشرة بدل create ثم save(update_fields=['total'])
         order = Order.objects.create(
             user=user,
             customer_name=customer_name,
@@ -54,70 +118,56 @@ class CreateOrderView(APIView):
             customer_city=customer_city,
             customer_address=customer_address,
             status='pending',
-            total=Decimal('0.00')
+            total=total,
+            stock_status=Order.STOCK_RESERVED,
+            reserved_until=timezone.now() + reservation_ttl(),
         )
 
-        total = Decimal('0.00')
-        created_items = []
+        created_items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=qty, unit_price=unit_price)
+            for product, qty, unit_price in lines
+        ])
+        _set_prefetched_items(order, created_items)
 
-        # إضافة العناصر إلى الطلب
-        items_data = data.get('items', [])
-        for it in items_data:
-            prod_id = it.get('product_id')
-            qty = int(it.get('quantity', 0))
-            if qty <= 0:
-                continue
-            try:
-                product = Product.objects.get(id=prod_id)
-            except Product.DoesNotExist:
-                transaction.set_rollback(True)
-                return Response({'detail': f'Product id {prod_id} not found'}, status=status.HTTP_400_BAD_REQUEST)
-
-            # افترض أن لديك دالة على الموديل لإرجاع سعر الوحدة حسب الكمية
-            unit_price = getattr(product, 'get_price_for_quantity', None)
-            if callable(unit_price):
-                unit_price = Decimal(unit_price(qty))
-            else:
-                unit_price = Decimal(product.base_price)
-
-            oi = OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=qty,
-                unit_price=unit_price
-            )
-            created_items.append(oi)
-            total += (unit_price * qty)
+        # صف Google Sheets بيتكتب في الـ outbox جوه نفس الـ transaction،
+        # والإرسال الفعلي بيعمله manage.py export_orders_to_sheets في الخلفية
+        enqueue_order_export(order, created_items)
 
-        # حدّث إجمالي الطلب
-        order.total = total
-        order.save(update_fields=['total'])
+        out = OrderReadSerializer(order, context={'request': request})
+        response = Response(out.data, status=status.HTTP_201_CREATED)
+        if claimed is not None:
+            idempotency.complete(claimed, order, response)
+        return response
 
-        # تجهيز صف لإرساله إلى جوجل شيت
-        try:
-            items_desc = []
-            for it in created_items:
-                prod_name = getattr(it.product, 'name', str(it.product))
-                items_desc.append(f"{prod_name} x{it.quantity} @ {it.unit_price}")
-            items_str = " | ".join(items_desc)
-
-            row = [
-                str(order.id),
-                order.customer_name or '',
-                order.customer_phone or '',
-                order.customer_email or '',
-                order.customer_city or '',
-                order.customer_address or '',
-                items_str,
-                str(order.total),
-                order.created_at.strftime('%Y-%m-%d %H:%M:%S') if getattr(order, 'created_at', None) else ''
-            ]
-            try:
-                append_order_to_sheet(row)  # إضافة البيانات إلى جوجل شيت
-            except Exception as e:
-                logger.exception("Failed to append order to Google Sheet: %s", e)
-        except Exception as ex:
-            logger.exception("Error preparing row for Google Sheets: %s", ex)
 
-        out = OrderReadSerializer(order, context={'request': request})
-        return Response(out.data, status=status.HTTP_201_CREATED)
+# الأعمدة اللي OrderReadSerializer بيقراها بس (من غير reserved_until و stock_status وغيرهم)
+ORDER_READ_FIELDS = ('id', 'user', 'created_at', 'status', 'total', 'customer_name', 'customer_phone',
+                     'customer_email', 'customer_city', 'customer_address')
+ORDER_ITEM_READ_FIELDS = ('id', 'order', 'product', 'quantity', 'unit_price', 'product__id', 'product__name')
+
+
+class CustomerOrdersMixin:
+    """
+    طلبات المستخدم الحالي بس، والعناصر مع أسماء المنتجات في query واحدة (JOIN) مهما كان عدد الطلبات:
+    الصفحة = query للطلبات + query للعناصر.
+    """
+    serializer_class = OrderReadSerializer
+
+    def get_queryset(self):
+        items = OrderItem.objects.select_related('product').only(*ORDER_ITEM_READ_FIELDS).order_by('id')
+        return (Order.objects.filter(user=self.request.user).only(*ORDER_READ_FIELDS)
+                .prefetch_related(Prefetch('items', queryset=items)))
+
+
+class OrderListView(CustomerOrdersMixin, generics.ListAPIView):
+    """
+    GET /api/orders/?cursor=...&page_size=...
+    طلبات العميل من الأحدث للأقدم بـ cursor على (created_at, id).
+    """
+    pagination_class = OrderHistoryPagination
+
+
+class OrderDetailView(CustomerOrdersMixin, generics.RetrieveAPIView):
+    """
+    GET /api/orders/<id>/ ، طلب حد تاني بيرجع 404.
+    """
@@ -0,0 +1,32 @@
+# utils/db.py
+"""
+transactions للقراية بس (snapshot الكتالوج، compaction سجل المخزون، ...).
+
+الـ settings بتفتح كل transaction على SQLite بـ BEGIN IMMEDIATE (قفل الكتابة من أولها) علشان الـ checkout
+ما ياخدش "database is locked". ده معناه إن أي atomic() طويل بيقرا بس بيوقف كل الكتابات لحد ما يخلص.
+read_only_atomic بيفتح الـ transaction بـ BEGIN DEFERRED: مع WAL ده snapshot ثابت للقراية من غير قفل الكتابة.
+على أي backend تاني، أو جوه atomic مفتوح أصلاً، هو atomic() عادي.
+"""
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def read_only_atomic(using=None):
+    connection = transaction.get_connection(using)
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+    # transaction_mode بيتقري من الـ OPTIONS وقت فتح الـ connection
+    connection.ensure_connection()
+    mode = connection.transaction_mode
+    connection.transaction_mode = 'DEFERRED'
+    try:
+        with transaction.atomic(using=using):
+            # الـ BEGIN اتبعت خلاص؛ أي atomic تاني على الـ connection ده يرجع للوضع العادي
+            connection.transaction_mode = mode
+            yield
+    finally:
+        connection.transaction_mode = mode
@@ -26,11 +26,19 @@ def get_gspread_client():
     client = gspread.authorize(creds)
     return client
 
-def append_order_to_sheet(row):
+_worksheet = None
+
+
+def get_worksheet(refresh=False):
     """
-    row: قائمة من القيم ['order_id', 'email', 'status', 'total', 'created_at', ...]
-    تضيف الصف في أول ورقة (sheet1).
+    يرجع أول ورقة (sheet1) من الشيت، مع إعادة استخدام نفس الـ client المفوض
+    بدل قراءة ملف الـ Service Account وعمل authorize مع كل طلب.
+    refresh=True يجبر إعادة الاتصال (مثلاً بعد خطأ).
     """
+    global _worksheet
+    if _worksheet is not None and not refresh:
+        return _worksheet
+
     client = get_gspread_client()
 
     # نحصل على ID الشيت من env أو settings
@@ -39,6 +47,14 @@ def append_order_to_sheet(row):
         raise RuntimeError("GOOGLE_SHEET_ID not set in environment or settings.")
 
     sh = client.open_by_key(sheet_id)
-    worksheet = sh.sheet1  # أول ورقة - ممكن تغيّرها لو عندك اسم ورقة آخر
-    worksheet.append_row(row)
+    _worksheet = sh.sheet1  # أول ورقة - ممكن تغيّرها لو عندك اسم ورقة آخر
+    return _worksheet
+
+
+def append_order_to_sheet(row):
+    """
+    row: قائمة من القيم ['order_id', 'email', 'status', 'total', 'created_at', ...]
+    تضيف الصف في أول ورقة (sheet1).
+    """
+    get_worksheet().append_row(row)
     return True
@@ -0,0 +1,35 @@
+# utils/renderers.py
+"""
+JSON renderer أسرع لـ DRF مبني على orjson، بنفس الـ bytes اللي بيطلعها JSONRenderer
+(compact، UTF-8 من غير escape، و U+2028/U+2029 متعمل لهم escape).
+اللي orjson ما بيعرفوش (Decimal، datetime، lazy strings، ...) بيروح لـ encoder بتاع DRF،
+ولو orjson مش متسطب أو فيه indent بنرجع لـ JSONRenderer العادي.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson اختياري
+    orjson = None
+
+_drf_default = JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    if orjson is not None:
+        # datetime بيعدي على DRF علشان نفس الشكل (Z بدل +00:00)
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_drf_default, option=self.options)
+        except (orjson.JSONEncodeError, TypeError):
+            # أرقام أكبر من 64 bit وغيرها: نسيب DRF يتصرف زي الأول
+            return super().render(data, accepted_media_type, renderer_context)
+        # نفس escape بتاع JSONRenderer علشان الـ JSON يفضل صالح جوه <script>
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
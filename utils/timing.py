@@ -0,0 +1,273 @@
+# utils/timing.py
+"""
+قياس وقت الـ requests: Server-Timing، log للـ requests البطيئة، و /metrics بصيغة Prometheus.
+
+- كل request بيتسجل في histogram للـ latency حسب الـ route (view_name) والـ method،
+  وده كل اللي بيحصل لو الـ sampling مقفول (perf_counter مرتين + bisect تحت lock).
+- الـ requests اللي بتتاخد sample (REQUEST_TIMING_SAMPLE_RATE) بيتقاس فيها كمان:
+  عدد ووقت الـ queries (connection.execute_wrapper)، وقت الـ serializers (BaseSerializer.data
+  و encode بتاع fastlist)، وقت الـ view والـ render، وبتطلع في header Server-Timing.
+- أي request أبطأ من REQUEST_TIMING_SLOW_MS بيتكتب JSON في logger utils.timing،
+  ولو كان متاخد sample بيبقى معاه أبطأ الـ queries.
+
+الـ histograms في ذاكرة الـ process: مع أكتر من worker كل واحد بيتعمله scrape لوحده.
+"""
+import heapq
+import json
+import logging
+import random
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+TOP_QUERIES = 5
+MAX_SQL_LENGTH = 500
+
+_current = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """
+    القياسات التفصيلية لـ request واحد متاخد sample. بيتسجل كـ execute_wrapper على الـ connections.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.top = []  # heap صغير (duration, n, sql) لأبطأ الـ queries
+        self._depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += duration
+            entry = (duration, self.queries, sql)
+            if len(self.top) < TOP_QUERIES:
+                heapq.heappush(self.top, entry)
+            elif duration > self.top[0][0]:
+                heapq.heapreplace(self.top, entry)
+
+    def top_queries(self):
+        return [{'ms': round(d * 1000, 3), 'sql': sql[:MAX_SQL_LENGTH]}
+                for d, _, sql in sorted(self.top, reverse=True)]
+
+
+@contextmanager
+def serialize_timer():
+    """
+    يضيف الوقت لـ serialize لو الـ request الحالي متاخد sample؛ من غيره مجرد ContextVar.get.
+    الـ serializers المتداخلة بتتحسب مرة واحدة.
+    """
+    timing = _current.get()
+    if timing is None or timing._depth:
+        yield
+        return
+    timing._depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.serialize_time += time.perf_counter() - start
+        timing._depth -= 1
+
+
+_serializers_instrumented = False
+
+
+def instrument_serializers():
+    """
+    يلف BaseSerializer.data (اللي Serializer.data و ListSerializer.data بيوصلوله بـ super())
+    علشان وقت الـ to_representation يتحسب. بيتعمل مرة واحدة لما الـ middleware يشتغل.
+    """
+    global _serializers_instrumented
+    if _serializers_instrumented:
+        return
+    original = BaseSerializer.data.fget
+
+    def data(self):
+        if _current.get() is None:
+            return original(self)
+        with serialize_timer():
+            return original(self)
+
+    BaseSerializer.data = property(data)
+    _serializers_instrumented = True
+
+
+class Histogram:
+    """
+    Prometheus histogram بسيط بـ labels ثابتة الترتيب.
+    """
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [عدد كل bucket (مش تراكمي)..., +Inf, sum]
+        self._lock = Lock()
+
+    def observe(self, labels, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labels, values in series:
+            base = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            cumulative += values[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{base}}} {values[-1]:.6f}')
+            lines.append(f'{self.name}_count{{{base}}} {cumulative}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Request latency by route.', ('route', 'method', 'status'), LATENCY_BUCKETS)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'DB queries per sampled request by route.', ('route', 'method'), QUERY_BUCKETS)
+METRICS = (REQUEST_DURATION, REQUEST_QUERIES)
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unmatched>'
+    return match.view_name or match.route or '<unnamed>'
+
+
+class RequestTimingMiddleware:
+    """
+    لازم يبقى أول middleware علشان total يشمل كل حاجة.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 0.0))
+        self.slow_seconds = float(getattr(settings, 'REQUEST_TIMING_SLOW_MS', 1000)) / 1000
+        if self.sample_rate > 0:
+            instrument_serializers()
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            start = time.perf_counter()
+            response = self.get_response(request)
+            total = time.perf_counter() - start
+            route = route_name(request)
+            REQUEST_DURATION.observe((route, request.method, _status_class(response)), total)
+            if total >= self.slow_seconds:
+                self.log_slow(request, response, route, {'total_ms': _ms(total)})
+            return response
+        return self.sampled(request)
+
+    def sampled(self, request):
+        timing = RequestTiming()
+        request._timing_marks = {}
+        token = _current.set(timing)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        end = time.perf_counter()
+
+        marks = request._timing_marks
+        view_start = marks.get('view', start)
+        view_end = marks.get('render', end)
+        spans = {
+            'db': timing.db_time,
+            'serialize': timing.serialize_time,
+            'view': view_end - view_start,
+            'render': end - view_end if 'render' in marks else 0.0,
+            'total': end - start,
+        }
+        route = route_name(request)
+        REQUEST_DURATION.observe((route, request.method, _status_class(response)), spans['total'])
+        REQUEST_QUERIES.observe((route, request.method), timing.queries)
+
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={duration * 1000:.2f}' + (f';desc="{timing.queries} queries"' if name == 'db' else '')
+            for name, duration in spans.items())
+        if spans['total'] >= self.slow_seconds:
+            details = {f'{name}_ms': _ms(duration) for name, duration in spans.items()}
+            details.update(queries=timing.queries, top_queries=timing.top_queries())
+            self.log_slow(request, response, route, details)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        marks = getattr(request, '_timing_marks', None)
+        if marks is not None:
+            marks['view'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF Response بيتعمله render بعد الـ hook ده على طول
+        marks = getattr(request, '_timing_marks', None)
+        if marks is not None:
+            marks['render'] = time.perf_counter()
+        return response
+
+    def log_slow(self, request, response, route, details):
+        payload = {
+            'event': 'slow_request', 'route': route, 'method': request.method,
+            'path': request.path, 'status': response.status_code, **details,
+        }
+        logger.warning(json.dumps(payload), extra={'request_timing': payload})
+
+
+def _status_class(response):
+    return f'{response.status_code // 100}xx'
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def metrics_view(request):
+    """
+    GET /metrics بصيغة Prometheus text. لو METRICS_TOKEN متحدد لازم Authorization: Bearer <token>.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')